@@ -0,0 +1,30 @@
+"""places geo_cell grid index
+
+Revision ID: 3f9c2a7d41b6
+Revises: 78d175550f86
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from models.place import GEO_CELL_SQL
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d41b6'
+down_revision: Union[str, None] = '78d175550f86'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Stored generated column: PostgreSQL заполняет его для существующих строк сам
+    op.add_column('places', sa.Column('geo_cell', sa.Integer(), sa.Computed(GEO_CELL_SQL, persisted=True), nullable=True))
+    op.create_index(op.f('ix_places_geo_cell'), 'places', ['geo_cell'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_places_geo_cell'), table_name='places')
+    op.drop_column('places', 'geo_cell')
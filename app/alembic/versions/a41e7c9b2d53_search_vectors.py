@@ -0,0 +1,38 @@
+"""users and places search_vector with GIN indexes
+
+Revision ID: a41e7c9b2d53
+Revises: 3f9c2a7d41b6
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from models.user import USER_SEARCH_VECTOR_SQL
+from models.place import PLACES_TAGS_TO_TEXT_SQL, PLACE_SEARCH_VECTOR_SQL
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41e7c9b2d53'
+down_revision: Union[str, None] = '3f9c2a7d41b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(PLACES_TAGS_TO_TEXT_SQL)
+    # Stored generated columns: PostgreSQL заполняет их для существующих строк сам
+    op.add_column('users', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(USER_SEARCH_VECTOR_SQL, persisted=True), nullable=True))
+    op.add_column('places', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(PLACE_SEARCH_VECTOR_SQL, persisted=True), nullable=True))
+    op.create_index('ix_users_search_vector', 'users', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_places_search_vector', 'places', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_places_search_vector', table_name='places', postgresql_using='gin')
+    op.drop_index('ix_users_search_vector', table_name='users', postgresql_using='gin')
+    op.drop_column('places', 'search_vector')
+    op.drop_column('users', 'search_vector')
+    op.execute("DROP FUNCTION IF EXISTS places_tags_to_text(varchar[])")
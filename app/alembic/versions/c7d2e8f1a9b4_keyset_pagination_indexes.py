@@ -0,0 +1,30 @@
+"""composite indexes for keyset pagination
+
+Revision ID: c7d2e8f1a9b4
+Revises: a41e7c9b2d53
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e8f1a9b4'
+down_revision: Union[str, None] = 'a41e7c9b2d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_messages_sender_receiver_created_at', 'messages', ['sender_id', 'receiver_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_notifications_user_created_at', 'notifications', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_places_created_at_id', 'places', ['created_at', 'id'], unique=False)
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_created_at_id', table_name='users')
+    op.drop_index('ix_places_created_at_id', table_name='places')
+    op.drop_index('ix_notifications_user_created_at', table_name='notifications')
+    op.drop_index('ix_messages_sender_receiver_created_at', table_name='messages')
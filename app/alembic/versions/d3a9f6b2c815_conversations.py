@@ -0,0 +1,91 @@
+"""conversations with canonical user pair
+
+Revision ID: d3a9f6b2c815
+Revises: c7d2e8f1a9b4
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a9f6b2c815'
+down_revision: Union[str, None] = 'c7d2e8f1a9b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Одна переписка на пару: последнее сообщение и непрочитанные для каждой стороны
+BACKFILL_CONVERSATIONS_SQL = """
+INSERT INTO conversations (
+    id, user_low_id, user_high_id, last_message_id, last_sender_id,
+    last_message_preview, last_message_at, unread_low, unread_high, created_at
+)
+SELECT gen_random_uuid(), pairs.low, pairs.high, last.id, last.sender_id,
+    left(last.content, 100), coalesce(last.created_at, now()), pairs.unread_low, pairs.unread_high, pairs.first_at
+FROM (
+    SELECT least(sender_id, receiver_id) AS low, greatest(sender_id, receiver_id) AS high,
+        count(*) FILTER (WHERE NOT coalesce(is_read, false) AND receiver_id = least(sender_id, receiver_id)) AS unread_low,
+        count(*) FILTER (WHERE NOT coalesce(is_read, false) AND receiver_id <> least(sender_id, receiver_id)) AS unread_high,
+        min(created_at) AS first_at
+    FROM messages
+    GROUP BY 1, 2
+) AS pairs
+JOIN (
+    SELECT DISTINCT ON (least(sender_id, receiver_id), greatest(sender_id, receiver_id))
+        least(sender_id, receiver_id) AS low, greatest(sender_id, receiver_id) AS high,
+        id, sender_id, content, created_at
+    FROM messages
+    ORDER BY least(sender_id, receiver_id), greatest(sender_id, receiver_id), created_at DESC NULLS LAST, id DESC
+) AS last ON last.low = pairs.low AND last.high = pairs.high
+"""
+
+BACKFILL_MESSAGES_SQL = """
+UPDATE messages SET conversation_id = conversations.id
+FROM conversations
+WHERE conversations.user_low_id = least(messages.sender_id, messages.receiver_id)
+    AND conversations.user_high_id = greatest(messages.sender_id, messages.receiver_id)
+"""
+
+
+def upgrade() -> None:
+    op.create_table('conversations',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_low_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_high_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('last_message_id', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('last_sender_id', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('last_message_preview', sa.String(length=100), nullable=True),
+    sa.Column('last_message_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('unread_low', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('unread_high', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.CheckConstraint('user_low_id <= user_high_id', name='ck_conversations_pair_order'),
+    sa.ForeignKeyConstraint(['user_low_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_high_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_low_id', 'user_high_id', name='uq_conversations_pair')
+    )
+    op.add_column('messages', sa.Column('conversation_id', postgresql.UUID(as_uuid=True), nullable=True))
+
+    op.execute(BACKFILL_CONVERSATIONS_SQL)
+    op.execute(BACKFILL_MESSAGES_SQL)
+
+    op.alter_column('messages', 'conversation_id', nullable=False)
+    op.create_foreign_key('messages_conversation_id_fkey', 'messages', 'conversations', ['conversation_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_conversations_low_last_message', 'conversations', ['user_low_id', 'last_message_at', 'id'], unique=False)
+    op.create_index('ix_conversations_high_last_message', 'conversations', ['user_high_id', 'last_message_at', 'id'], unique=False)
+    op.create_index('ix_messages_conversation_created_at', 'messages', ['conversation_id', 'created_at', 'id'], unique=False)
+    op.drop_index('ix_messages_sender_receiver_created_at', table_name='messages')
+
+
+def downgrade() -> None:
+    op.create_index('ix_messages_sender_receiver_created_at', 'messages', ['sender_id', 'receiver_id', 'created_at', 'id'], unique=False)
+    op.drop_index('ix_messages_conversation_created_at', table_name='messages')
+    op.drop_constraint('messages_conversation_id_fkey', 'messages', type_='foreignkey')
+    op.drop_column('messages', 'conversation_id')
+    op.drop_index('ix_conversations_high_last_message', table_name='conversations')
+    op.drop_index('ix_conversations_low_last_message', table_name='conversations')
+    op.drop_table('conversations')
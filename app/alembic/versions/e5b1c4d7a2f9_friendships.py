@@ -0,0 +1,51 @@
+"""symmetric friendships adjacency table
+
+Revision ID: e5b1c4d7a2f9
+Revises: d3a9f6b2c815
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1c4d7a2f9'
+down_revision: Union[str, None] = 'd3a9f6b2c815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# По строке на каждое направление принятой заявки
+BACKFILL_FRIENDSHIPS_SQL = """
+INSERT INTO friendships (user_id, friend_id, created_at)
+SELECT user_id, friend_id, min(created_at)
+FROM (
+    SELECT sender_id AS user_id, receiver_id AS friend_id, coalesce(updated_at, created_at, now()) AS created_at
+    FROM friend_requests WHERE status = 'ACCEPTED'
+    UNION ALL
+    SELECT receiver_id, sender_id, coalesce(updated_at, created_at, now())
+    FROM friend_requests WHERE status = 'ACCEPTED'
+) AS pairs
+WHERE user_id <> friend_id
+GROUP BY user_id, friend_id
+"""
+
+
+def upgrade() -> None:
+    op.create_table('friendships',
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('friend_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['friend_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'friend_id')
+    )
+    op.create_index('ix_friendships_user_created_at', 'friendships', ['user_id', 'created_at', 'friend_id'], unique=False)
+    op.execute(BACKFILL_FRIENDSHIPS_SQL)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_friendships_user_created_at', table_name='friendships')
+    op.drop_table('friendships')
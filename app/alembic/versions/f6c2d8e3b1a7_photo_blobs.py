@@ -0,0 +1,42 @@
+"""content-addressed photo blobs
+
+Revision ID: f6c2d8e3b1a7
+Revises: e5b1c4d7a2f9
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6c2d8e3b1a7'
+down_revision: Union[str, None] = 'e5b1c4d7a2f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Хешей у существующих фото нет: они остаются без blob
+    op.create_table('photo_blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('object_name', sa.String(length=255), nullable=False),
+    sa.Column('thumbnail_object_name', sa.String(length=255), nullable=False),
+    sa.Column('content_type', sa.String(length=50), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('phash', sa.BigInteger(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    op.add_column('photos', sa.Column('blob_sha256', sa.String(length=64), nullable=True))
+    op.create_foreign_key('photos_blob_sha256_fkey', 'photos', 'photo_blobs', ['blob_sha256'], ['sha256'])
+    op.create_index(op.f('ix_photos_blob_sha256'), 'photos', ['blob_sha256'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_photos_blob_sha256'), table_name='photos')
+    op.drop_constraint('photos_blob_sha256_fkey', 'photos', type_='foreignkey')
+    op.drop_column('photos', 'blob_sha256')
+    op.drop_table('photo_blobs')
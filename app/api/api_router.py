@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from api.endpoints import auth, users, places, friends, messages, search
+from api.endpoints import auth, users, places, friends, messages, search, notifications, websocket
 # from api.endpoints import two_factor
 
 api_router = APIRouter()
@@ -10,4 +10,6 @@ api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(places.router, prefix="/places", tags=["places"])
 api_router.include_router(friends.router, prefix="/friends", tags=["friends"])
 api_router.include_router(messages.router, prefix="/messages", tags=["messages"])
-api_router.include_router(search.router, prefix="/search", tags=["search"])
\ No newline at end of file
+api_router.include_router(search.router, prefix="/search", tags=["search"])
+api_router.include_router(notifications.router, prefix="/notifications", tags=["notifications"])
+api_router.include_router(websocket.router, prefix="/ws", tags=["websocket"])
\ No newline at end of file
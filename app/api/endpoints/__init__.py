@@ -5,6 +5,7 @@ from .friends import router as friends_router
 from .messages import router as messages_router
 from .search import router as search_router
 from .notifications import router as notifications_router
+from .websocket import router as websocket_router
 
 __all__ = [
     "auth_router",
@@ -13,5 +14,6 @@ __all__ = [
     "friends_router",
     "messages_router",
     "search_router",
-    "notifications_router"
+    "notifications_router",
+    "websocket_router"
 ]
\ No newline at end of file
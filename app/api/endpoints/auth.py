@@ -13,11 +13,13 @@ from services.auth_service import (
     authenticate_user, 
     authenticate_user_by_username,
     create_access_token,
+    delete_user,
     get_current_user,
-    hash_password,
+    hash_password_async,
     generate_salt
 )
 from services.email_service import send_verification_email
+from services.principal_cache import principal_cache
 
 router = APIRouter()
 
@@ -46,7 +48,7 @@ async def register(
     
     # Генерируем соль и хешируем пароль
     salt = generate_salt()
-    password_hash = hash_password(user_data.password, salt)
+    password_hash = await hash_password_async(user_data.password, salt)
     
     # Создаем пользователя
     db_user = User(
@@ -100,6 +102,7 @@ async def login_for_access_token(
     # Update last login
     user.last_login = datetime.now(timezone.utc)
     await db.commit()
+    await principal_cache.invalidate(user.id)
 
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
@@ -141,6 +144,7 @@ async def login(
     # Обновляем время последнего входа
     user.last_login = datetime.now(timezone.utc)
     await db.commit()
+    await principal_cache.invalidate(user.id)
     
     # Создаем токены
     access_token = create_access_token(data={"sub": str(user.id)})
@@ -173,6 +177,7 @@ async def oauth_login(
         # Обновляем данные пользователя
         user.last_login = datetime.now(timezone.utc)
         await db.commit()
+        await principal_cache.invalidate(user.id)
     else:
         # Создаем нового пользователя через OAuth
         db_user = User(
@@ -220,7 +225,6 @@ async def delete_account(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated"
         )
-    # Удаляем текущего пользователя из базы данных
-    await db.delete(current_user)
-    await db.commit()
+    # Удаляем текущего пользователя и его данные из базы данных
+    await delete_user(db, current_user.id)
     return
\ No newline at end of file
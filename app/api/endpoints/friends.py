@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 from uuid import UUID
+from datetime import datetime
 
-from core.database import get_db
+from core.database import get_db, get_read_db
+from core.pagination import decode_cursor, paginate, set_next_cursor
 from models.notification import NotificationType
 from models.user import User
 from models.friend import FriendRequest, FriendStatus
@@ -11,13 +13,21 @@ from schemas.notification import NotificationCreate
 from schemas.user import UserResponse
 from schemas.friend import FriendRequestCreate, FriendRequestResponse, FriendRequestUpdate
 from services.auth_service import get_current_user
-from services.notification_service import create_notification
+from services.notification_service import enqueue_notification
+from services.friend_service import (
+    add_friendship,
+    are_friends,
+    get_friends as get_friend_page,
+    lock_friend_pair,
+    remove_friendship,
+    sync_friendship_cache,
+)
 
 router = APIRouter()
 
 @router.get("/requests", response_model=List[FriendRequestResponse])
 async def get_friend_requests(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     from sqlalchemy import select
@@ -44,17 +54,25 @@ async def send_friend_request(
     if not receiver:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Check if request already exists
+    # Check if request already exists. Встречная заявка тоже считается:
+    # иначе пару связали бы две принятые заявки
+    await lock_friend_pair(db, current_user.id, request_data.receiver_id)
     result = await db.execute(
         select(FriendRequest).where(
-            (FriendRequest.sender_id == current_user.id) & 
-            (FriendRequest.receiver_id == request_data.receiver_id)
+            ((FriendRequest.sender_id == current_user.id) & 
+            (FriendRequest.receiver_id == request_data.receiver_id))
+            | ((FriendRequest.sender_id == request_data.receiver_id) &
+            (FriendRequest.receiver_id == current_user.id))
         )
     )
     existing_request = result.scalars().first()
     
     if existing_request:
-        raise HTTPException(status_code=400, detail="Friend request already sent")
+        detail = (
+            "Friend request already sent" if existing_request.sender_id == current_user.id
+            else "Friend request already received"
+        )
+        raise HTTPException(status_code=400, detail=detail)
     
     # Create new request
     db_request = FriendRequest(
@@ -74,7 +92,7 @@ async def send_friend_request(
         related_entity_id=current_user.id,
         metadata={"request_id": str(db_request.id)}
     )
-    await create_notification(db, notification_data)
+    enqueue_notification(notification_data)
 
     return db_request
 
@@ -96,10 +114,22 @@ async def update_friend_request(
     
     if not friend_request:
         raise HTTPException(status_code=404, detail="Friend request not found")
+    # Статус перечитывается под блокировкой пары
+    await lock_friend_pair(db, friend_request.sender_id, friend_request.receiver_id)
+    await db.refresh(friend_request)
     
+    was_accepted = friend_request.status == FriendStatus.ACCEPTED
+    is_accepted = request_data.status == FriendStatus.ACCEPTED
     friend_request.status = request_data.status
+    # Таблица смежности меняется в той же транзакции, что и статус заявки
+    if is_accepted and not was_accepted:
+        await add_friendship(db, friend_request.sender_id, friend_request.receiver_id)
+    elif was_accepted and not is_accepted:
+        await remove_friendship(db, friend_request.sender_id, friend_request.receiver_id)
     await db.commit()
     await db.refresh(friend_request)
+    if was_accepted != is_accepted:
+        await sync_friendship_cache(friend_request.sender_id, friend_request.receiver_id)
 
     if request_data.status == FriendStatus.ACCEPTED:
         # Создаем уведомление для отправителя
@@ -111,39 +141,30 @@ async def update_friend_request(
             related_entity_type="user",
             related_entity_id=current_user.id
         )
-        await create_notification(db, notification_data)
+        enqueue_notification(notification_data)
 
     return friend_request
 
 @router.get("/friends", response_model=List[UserResponse])
 async def get_friends(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    after = decode_cursor(cursor, (datetime, UUID)) if cursor else None
+    rows = await get_friend_page(db, current_user.id, skip, limit + 1, after)
+    rows, next_cursor = paginate(rows, limit, lambda row: (row.created_at, row.User.id))
+    set_next_cursor(response, next_cursor)
+    return [row.User for row in rows]
+
+@router.get("/friends/{user_id}")
+async def check_friendship(
+    user_id: UUID,
+    # Основная БД: при промахе множество друзей прогревается, и отставание реплики закрепилось бы в нем
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    from sqlalchemy import select, or_
-    # Get all accepted friend requests where current user is either sender or receiver
-    result = await db.execute(
-        select(FriendRequest).where(
-            (FriendRequest.status == FriendStatus.ACCEPTED) &
-            (
-                (FriendRequest.sender_id == current_user.id) |
-                (FriendRequest.receiver_id == current_user.id)
-            )
-        )
-    )
-    friend_requests = result.scalars().all()
-    
-    friend_ids = []
-    for req in friend_requests:
-        if req.sender_id == current_user.id:
-            friend_ids.append(req.receiver_id)
-        else:
-            friend_ids.append(req.sender_id)
-    
-    # Get user objects for friend IDs
-    if not friend_ids:
-        return []
-    
-    result = await db.execute(select(User).where(User.id.in_(friend_ids)))
-    friends = result.scalars().all()
-    return friends
\ No newline at end of file
+    return {"is_friend": await are_friends(db, current_user.id, user_id)}
@@ -1,25 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 from uuid import UUID
+from datetime import datetime
 
-from core.database import get_db
-from models.notification import NotificationType
+from core.database import get_db, get_read_db
+from core.pagination import decode_cursor, paginate, set_next_cursor
 from models.user import User
 from models.message import Message
-from schemas.message import MessageCreate, MessageResponse
-from schemas.notification import NotificationCreate
+from schemas.message import MessageCreate, MessageResponse, ConversationResponse
 from services.auth_service import get_current_user
-from services.notification_service import create_notification
+from services.notification_service import enqueue_notification
+from services.message_service import (
+    get_conversation_messages,
+    get_conversations,
+    mark_conversation_read,
+    mark_message_read,
+    new_message_notification,
+    record_messages,
+)
+from services.websocket_manager import manager as websocket_manager
 
 router = APIRouter()
 
+# Объявлен до /{user_id}, иначе "conversations" разбирается как user_id
+@router.get("/conversations", response_model=List[ConversationResponse])
+async def get_inbox(
+    response: Response,
+    skip: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    after = decode_cursor(cursor, (datetime, UUID)) if cursor else None
+    conversations = await get_conversations(db, current_user.id, skip, limit + 1, after)
+    conversations, next_cursor = paginate(
+        conversations, limit, lambda conversation: (conversation.last_message_at, conversation.id)
+    )
+    set_next_cursor(response, next_cursor)
+    return [
+        ConversationResponse(
+            id=conversation.id,
+            peer_id=conversation.peer_of(current_user.id),
+            last_message_id=conversation.last_message_id,
+            last_sender_id=conversation.last_sender_id,
+            last_message_preview=conversation.last_message_preview,
+            last_message_at=conversation.last_message_at,
+            unread_count=conversation.unread_for(current_user.id),
+        )
+        for conversation in conversations
+    ]
+
 @router.get("/{user_id}", response_model=List[MessageResponse])
 async def get_messages(
     user_id: UUID,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     # Check if user exists
@@ -31,18 +71,10 @@ async def get_messages(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get messages between current user and the other user
-    result = await db.execute(
-        select(Message).where(
-            (
-                (Message.sender_id == current_user.id) & 
-                (Message.receiver_id == user_id)
-            ) | (
-                (Message.sender_id == user_id) & 
-                (Message.receiver_id == current_user.id)
-            )
-        ).order_by(Message.created_at.desc()).offset(skip).limit(limit)
-    )
-    messages = result.scalars().all()
+    after = decode_cursor(cursor, (datetime, UUID)) if cursor else None
+    messages = await get_conversation_messages(db, current_user.id, user_id, skip, limit + 1, after)
+    messages, next_cursor = paginate(messages, limit, lambda message: (message.created_at, message.id))
+    set_next_cursor(response, next_cursor)
     return messages
 
 @router.post("/{user_id}", response_model=MessageResponse)
@@ -68,20 +100,12 @@ async def send_message(
         receiver_id=user_id,
         content=message_data.content
     )
-    db.add(db_message)
-    await db.commit()
+    await record_messages(db, [db_message])
     await db.refresh(db_message)
 
-    notification_data = NotificationCreate(
-        user_id=user_id,
-        type=NotificationType.NEW_MESSAGE,
-        title="Новое сообщение",
-        message=f"У вас новое сообщение от {current_user.first_name} {current_user.last_name}",
-        related_entity_type="message",
-        related_entity_id=db_message.id,
-        metadata={"preview": message_data.content[:100]}  # Первые 100 символов
-    )
-    await create_notification(db, notification_data)
+    enqueue_notification(new_message_notification(db_message, current_user))
+    # Получатель, подключенный по WebSocket, видит сообщение сразу
+    await websocket_manager.send_personal_message(db_message)
 
     return db_message
 
@@ -103,6 +127,14 @@ async def mark_message_as_read(
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     
-    message.is_read = True
-    await db.commit()
-    return {"status": "message marked as read"}
\ No newline at end of file
+    await mark_message_read(db, message)
+    return {"status": "message marked as read"}
+
+@router.post("/{user_id}/read")
+async def mark_messages_as_read(
+    user_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    count = await mark_conversation_read(db, current_user.id, user_id)
+    return {"status": "messages marked as read", "count": count}
\ No newline at end of file
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 from uuid import UUID
+from datetime import datetime
 
-from core.database import get_db
+from core.database import get_db, get_read_db
+from core.pagination import decode_cursor, paginate, set_next_cursor
 from models.notification import Notification
 from models.user import User
 from schemas.notification import NotificationResponse, NotificationUpdate
@@ -11,22 +13,30 @@ from services.auth_service import get_current_user
 from services.notification_service import (
     get_user_notifications,
     mark_notification_as_read,
-    mark_all_notifications_as_read
+    mark_all_notifications_as_read,
+    get_unread_count as get_unread_notifications_count
 )
 
 router = APIRouter()
 
 @router.get("/", response_model=List[NotificationResponse])
 async def get_notifications(
+    response: Response,
     unread_only: bool = False,
     skip: int = 0,
     limit: int = 50,
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
+    after = decode_cursor(cursor, (datetime, UUID)) if cursor else None
     notifications = await get_user_notifications(
-        db, current_user.id, skip, limit, unread_only
+        db, current_user.id, skip, limit + 1, unread_only, after
+    )
+    notifications, next_cursor = paginate(
+        notifications, limit, lambda notification: (notification.created_at, notification.id)
     )
+    set_next_cursor(response, next_cursor)
     return notifications
 
 @router.patch("/{notification_id}/read")
@@ -50,15 +60,9 @@ async def mark_all_read(
 
 @router.get("/unread-count")
 async def get_unread_count(
+    # Основная БД: при промахе счетчик прогревается, и отставание реплики закрепилось бы в нем
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    from sqlalchemy import select, func
-    result = await db.execute(
-        select(func.count(Notification.id)).where(
-            (Notification.user_id == current_user.id) &
-            (Notification.is_read == False)
-        )
-    )
-    count = result.scalar()
+    count = await get_unread_notifications_count(db, current_user.id)
     return {"unread_count": count}
\ No newline at end of file
@@ -1,33 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Response, status, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from uuid import UUID
+from uuid import UUID, uuid4
+from datetime import datetime, timedelta
+import secrets
 
-from core.database import get_db
+from core.config import settings
+from core.database import get_db, get_read_db
+from core.pagination import after_cursor, decode_cursor, paginate, set_next_cursor
 from models.user import User
 from models.place import Place
 from models.photo import Photo
 from schemas.place import PlaceCreate, PlaceResponse, PlaceUpdate
-from schemas.photo import PhotoResponse
+from schemas.photo import PhotoConfirm, PhotoResponse, PhotoUploadRequest, PhotoUploadResponse
 from services.auth_service import get_current_user
-from services.image_service import process_and_upload_image
+from services.geo_service import get_nearby_places
+from services.image_service import (
+    IMAGE_CONTENT_TYPES, VARIANT_WIDTHS, blob_photo_fields, generate_photo_thumbnail, get_photo_variant,
+    process_and_upload_image
+)
+from services.minio_service import minio_client
+from services.photo_service import delete_photo
 
 router = APIRouter()
 
 @router.get("/", response_model=List[PlaceResponse])
 async def get_places(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    latitude: Optional[float] = None,
-    longitude: Optional[float] = None,
-    radius: Optional[float] = None,
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = None,
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    radius: Optional[float] = Query(None, gt=0, le=500, description="Радиус поиска в км"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    # TODO: Implement location-based filtering
-    # For now, return all public places
+    location = (latitude, longitude, radius)
+    if any(value is not None for value in location):
+        if any(value is None for value in location):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="latitude, longitude and radius must be provided together"
+            )
+        # Ближайшие места первыми, курсор по (расстояние, id)
+        after = decode_cursor(cursor, (float, UUID)) if cursor else None
+        rows = await get_nearby_places(db, latitude, longitude, radius, skip, limit + 1, after)
+        rows, next_cursor = paginate(rows, limit, lambda row: (row[1], row[0].id))
+        set_next_cursor(response, next_cursor)
+        return [place for place, _ in rows]
+
+    # Новые места первыми, курсор по (created_at, id)
     from sqlalchemy import select
-    result = await db.execute(select(Place).where(Place.is_public == True).offset(skip).limit(limit))
-    places = result.scalars().all()
+    after = decode_cursor(cursor, (datetime, UUID)) if cursor else None
+    query = select(Place).where(Place.is_public == True)
+    condition = after_cursor((Place.created_at, Place.id), after)
+    if condition is not None:
+        query = query.where(condition)
+    result = await db.execute(
+        query.order_by(Place.created_at.desc(), Place.id.desc()).offset(skip).limit(limit + 1)
+    )
+    places, next_cursor = paginate(result.scalars().all(), limit, lambda place: (place.created_at, place.id))
+    set_next_cursor(response, next_cursor)
     return places
 
 @router.post("/", response_model=PlaceResponse)
@@ -42,13 +75,7 @@ async def create_place(
     await db.refresh(db_place)
     return db_place
 
-@router.post("/{place_id}/photos", response_model=PhotoResponse)
-async def upload_place_photo(
-    place_id: UUID,
-    file: UploadFile = File(...),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+async def _check_photo_access(db: AsyncSession, place_id: UUID, user: User):
     # Check if place exists and user has access
     from sqlalchemy import select
     result = await db.execute(select(Place).where(Place.id == place_id))
@@ -57,30 +84,166 @@ async def upload_place_photo(
     if not place:
         raise HTTPException(status_code=404, detail="Place not found")
     
-    if place.created_by != current_user.id and not place.is_public:
+    if place.created_by != user.id and not place.is_public:
         raise HTTPException(status_code=403, detail="Not authorized to add photos to this place")
+
+def _upload_prefix(place_id: UUID, user_id: UUID) -> str:
+    return f"uploads/{place_id}/{user_id}/"
+
+@router.post("/{place_id}/photos", response_model=PhotoResponse)
+async def upload_place_photo(
+    place_id: UUID,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    await _check_photo_access(db, place_id, current_user)
     
-    # Process and upload image
-    image_data = await process_and_upload_image(file, str(current_user.id))
+    # Process and upload image (дубликат ссылается на уже сохраненный файл)
+    blob = await process_and_upload_image(db, file)
     
     # Create photo record
+    db_photo = Photo(place_id=place_id, user_id=current_user.id, **blob_photo_fields(blob))
+    
+    db.add(db_photo)
+    await db.commit()
+    await db.refresh(db_photo)
+    return db_photo
+
+@router.post("/{place_id}/photos/upload-url", response_model=PhotoUploadResponse)
+async def create_photo_upload_url(
+    place_id: UUID,
+    upload: PhotoUploadRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Выдает presigned URL: клиент загружает файл прямо в хранилище (PUT),
+    минуя API, а затем подтверждает загрузку
+    """
+    await _check_photo_access(db, place_id, current_user)
+    
+    # Префикс привязывает объект к месту и пользователю: подтвердить чужую загрузку нельзя
+    object_name = (
+        f"{_upload_prefix(place_id, current_user.id)}"
+        f"{secrets.token_hex(16)}.{IMAGE_CONTENT_TYPES[upload.content_type]}"
+    )
+    upload_url = await minio_client.presigned_upload_url(
+        object_name, timedelta(seconds=settings.PHOTO_UPLOAD_URL_EXPIRES)
+    )
+    return PhotoUploadResponse(
+        upload_url=upload_url,
+        object_name=object_name,
+        expires_in=settings.PHOTO_UPLOAD_URL_EXPIRES
+    )
+
+@router.post("/{place_id}/photos/confirm", response_model=PhotoResponse, status_code=status.HTTP_201_CREATED)
+async def confirm_photo_upload(
+    place_id: UUID,
+    confirm: PhotoConfirm,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Регистрирует загруженный напрямую файл; превью строится в фоне"""
+    await _check_photo_access(db, place_id, current_user)
+    
+    object_name = confirm.object_name
+    if not object_name.startswith(_upload_prefix(place_id, current_user.id)) or ".." in object_name:
+        raise HTTPException(status_code=400, detail="Invalid object name")
+    extension = object_name.rsplit(".", 1)[-1]
+    if extension not in IMAGE_CONTENT_TYPES.values():
+        raise HTTPException(status_code=400, detail="Invalid object name")
+    
+    size = await minio_client.get_object_size(object_name)
+    if size is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if size > settings.MAX_IMAGE_UPLOAD_BYTES:
+        await minio_client.delete_image(object_name)
+        raise HTTPException(status_code=413, detail="Image file is too large")
+    
+    # По presigned URL объект можно перезаписать до истечения ссылки, поэтому
+    # дальше работаем с копией под ключом, который клиенту не выдавался.
+    # Загрузка удаляется: повторное подтверждение того же имени вернет 404
+    photo_id = uuid4()
+    stored_name = f"photos/{photo_id}.{extension}"
+    size = await minio_client.copy_object(object_name, stored_name)
+    await minio_client.delete_image(object_name)
+    if size is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if size > settings.MAX_IMAGE_UPLOAD_BYTES:
+        # Объект подменили между проверкой размера и копированием
+        await minio_client.delete_image(stored_name)
+        raise HTTPException(status_code=413, detail="Image file is too large")
+    
     db_photo = Photo(
+        id=photo_id,
         place_id=place_id,
         user_id=current_user.id,
-        filename=image_data["original_filename"],
-        original_url=image_data["original_url"],
-        thumbnail_url=image_data["thumbnail_url"]
+        filename=stored_name,
+        original_url=minio_client.object_url(stored_name),
+        description=confirm.description,
+        is_public=confirm.is_public
     )
-    
     db.add(db_photo)
     await db.commit()
     await db.refresh(db_photo)
+    
+    background_tasks.add_task(generate_photo_thumbnail, db_photo.id, stored_name)
     return db_photo
 
+@router.delete("/{place_id}/photos/{photo_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_place_photo(
+    place_id: UUID,
+    photo_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Удаляет свое фото; файлы удаляются, когда на них не остается ссылок"""
+    from sqlalchemy import select
+    result = await db.execute(select(Photo).where(Photo.id == photo_id, Photo.place_id == place_id))
+    photo = result.scalars().first()
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    if photo.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to delete this photo")
+    
+    await delete_photo(db, photo)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+# Вариант фото определяется (photo_id, ширина, Accept) и больше не меняется
+VARIANT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{place_id}/photos/{photo_id}/variant")
+async def get_photo_variant_image(
+    place_id: UUID,
+    photo_id: UUID,
+    width: int = Query(VARIANT_WIDTHS[2], ge=1, description="Округляется вверх до ближайшей из VARIANT_WIDTHS"),
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Уменьшенная копия публичного фото в WebP/AVIF, если клиент их принимает"""
+    from sqlalchemy import select
+    result = await db.execute(
+        select(Photo)
+        .join(Place, Place.id == Photo.place_id)
+        .where(Photo.id == photo_id, Photo.place_id == place_id, Photo.is_public == True, Place.is_public == True)
+    )
+    photo = result.scalars().first()
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    data, content_type = await get_photo_variant(photo, width, accept)
+    return Response(
+        content=data,
+        media_type=content_type,
+        headers={"Cache-Control": VARIANT_CACHE_CONTROL, "Vary": "Accept"}
+    )
+
 @router.get("/{place_id}", response_model=PlaceResponse)
 async def get_place(
     place_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     from sqlalchemy import select
     result = await db.execute(select(Place).where(Place.id == place_id))
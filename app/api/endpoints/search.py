@@ -1,15 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from uuid import UUID
 
-from core.database import get_db
+from core.database import get_read_db
+from core.pagination import set_next_cursor
 from models.user import User
 from models.place import Place
 from schemas.user import UserResponse
 from schemas.place import PlaceResponse
 from services.auth_service import get_current_user
-from services.search_service import search_users, search_places, global_search
+from services.search_service import search_users_payload, search_places_payload, global_search_payload
 
 router = APIRouter()
 
@@ -18,7 +19,7 @@ async def search_global(
     q: str,
     skip: int = 0,
     limit: int = 50,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
     if not q or len(q) < 2:
@@ -28,15 +29,16 @@ async def search_global(
         )
     
     current_user_id = current_user.id if current_user else None
-    results = await global_search(db, q, current_user_id, skip, limit)
-    return results
+    payload = await global_search_payload(db, q, current_user_id, skip, limit)
+    return Response(content=payload, media_type="application/json")
 
 @router.get("/users", response_model=List[UserResponse])
 async def search_users_endpoint(
     q: str,
     skip: int = 0,
     limit: int = 50,
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
     if not q or len(q) < 2:
@@ -46,18 +48,23 @@ async def search_users_endpoint(
         )
     
     current_user_id = current_user.id if current_user else None
-    users = await search_users(db, q, skip, limit, current_user_id)
-    return users
+    # Payload уже сериализован по UserResponse, повторная валидация не нужна
+    payload, next_cursor = await search_users_payload(db, q, skip, limit, current_user_id, cursor)
+    response = Response(content=payload, media_type="application/json")
+    set_next_cursor(response, next_cursor)
+    return response
 
 @router.get("/places", response_model=List[PlaceResponse])
 async def search_places_endpoint(
     q: str,
-    lat: Optional[float] = None,
-    lng: Optional[float] = None,
-    radius_km: Optional[float] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    # Как в GET /places: радиус ограничен, иначе число ячеек сетки не ограничено
+    radius_km: Optional[float] = Query(None, gt=0, le=500, description="Радиус поиска в км"),
     skip: int = 0,
     limit: int = 50,
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
     if not q or len(q) < 2:
         raise HTTPException(
@@ -65,5 +72,7 @@ async def search_places_endpoint(
             detail="Search query must be at least 2 characters long"
         )
     
-    places = await search_places(db, q, lat, lng, radius_km, skip, limit)
-    return places
\ No newline at end of file
+    payload, next_cursor = await search_places_payload(db, q, lat, lng, radius_km, skip, limit, cursor)
+    response = Response(content=payload, media_type="application/json")
+    set_next_cursor(response, next_cursor)
+    return response
\ No newline at end of file
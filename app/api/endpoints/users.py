@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from typing import List, Optional
 from uuid import UUID
+from datetime import datetime
 
-from core.database import get_db
+from core.database import get_read_db
+from core.pagination import after_cursor, decode_cursor, paginate, set_next_cursor
 from models.user import User
 from schemas.user import UserResponse  # Используем схему
 from services.auth_service import get_current_user
@@ -13,13 +15,24 @@ router = APIRouter()
 
 @router.get("/", response_model=List[UserResponse])  # UserResponse вместо User
 async def get_users(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    result = await db.execute(select(User).offset(skip).limit(limit))
-    users = result.scalars().all()
+    # Новые пользователи первыми, курсор по (created_at, id)
+    after = decode_cursor(cursor, (datetime, UUID)) if cursor else None
+    query = select(User)
+    condition = after_cursor((User.created_at, User.id), after)
+    if condition is not None:
+        query = query.where(condition)
+    result = await db.execute(
+        query.order_by(User.created_at.desc(), User.id.desc()).offset(skip).limit(limit + 1)
+    )
+    users, next_cursor = paginate(result.scalars().all(), limit, lambda user: (user.created_at, user.id))
+    set_next_cursor(response, next_cursor)
     return users
 
 @router.get("/me", response_model=UserResponse)
@@ -29,7 +42,7 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 @router.get("/{user_id}", response_model=UserResponse)  # UserResponse вместо User
 async def get_user(
     user_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     result = await db.execute(select(User).where(User.id == user_id))
@@ -6,6 +6,7 @@ from uuid import UUID
 from core.database import get_db
 from models.user import User
 from services.auth_service import get_current_user
+from services.principal_cache import principal_cache
 
 router = APIRouter()
 
@@ -33,6 +34,7 @@ async def verify_email(
     
     user.is_verified = True
     await db.commit()
+    await principal_cache.invalidate(user.id)
     
     return {"message": "Email successfully verified"}
 
@@ -1,32 +1,77 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID
+
+from core.database import get_db
+from models.message import Message
 from services.auth_service import get_current_user_ws
-from services.websocket_manager import ConnectionManager
+from services.message_service import message_writer, new_message_notification
+from services.notification_service import enqueue_notification
+from services.websocket_manager import ClientConnection, manager
 
 router = APIRouter()
-manager = ConnectionManager()
+
+async def handle_chat_message(connection: ClientConnection, current_user, receiver_id: UUID, data: dict):
+    """
+    Сохраняет сообщение через буфер записи, затем подтверждает его отправителю
+    (ack с id и временем сервера) и отправляет push получателю
+    """
+    client_id = data.get("client_id")
+    content = data.get("message")
+    if not isinstance(content, str) or not content:
+        connection.send({"type": "error", "client_id": client_id, "detail": "Empty message"})
+        return
+    
+    try:
+        message = await message_writer.submit(
+            Message(sender_id=current_user.id, receiver_id=receiver_id, content=content)
+        )
+    except Exception:
+        connection.send({"type": "error", "client_id": client_id, "detail": "Message not saved"})
+        return
+    
+    connection.send({
+        "type": "ack",
+        "client_id": client_id,
+        "id": str(message.id),
+        "timestamp": message.created_at.isoformat()
+    })
+    await manager.send_personal_message(message)
+    enqueue_notification(new_message_notification(message, current_user))
 
 @router.websocket("/ws")
 async def websocket_endpoint(
     websocket: WebSocket,
     token: str,
-    current_user = Depends(get_current_user_ws)
+    db: AsyncSession = Depends(get_db)
 ):
-    await manager.connect(websocket, current_user.id)
+    current_user = await get_current_user_ws(token, db)
+    # Соединение живет долго: сессию БД на все это время не держим
+    await db.close()
+    if current_user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    connection = await manager.connect(websocket, current_user.id)
     try:
         while True:
             data = await websocket.receive_json()
+            try:
+                receiver_id = UUID(data["receiver_id"])
+            except (KeyError, TypeError, ValueError):
+                # Все исходящие кадры идут через очередь соединения
+                connection.send({"type": "error", "detail": "Invalid receiver_id"})
+                continue
             # Handle different types of messages
-            if data["type"] == "chat_message":
-                await manager.send_personal_message(
-                    data["message"], 
-                    data["receiver_id"],
-                    current_user.id
-                )
-            elif data["type"] == "typing":
+            if data.get("type") == "chat_message":
+                await handle_chat_message(connection, current_user, receiver_id, data)
+            elif data.get("type") == "typing":
                 await manager.broadcast_typing(
-                    data["receiver_id"],
+                    receiver_id,
                     current_user.id,
-                    data["is_typing"]
+                    bool(data.get("is_typing"))
                 )
     except WebSocketDisconnect:
-        manager.disconnect(websocket, current_user.id)
\ No newline at end of file
+        pass
+    finally:
+        await manager.disconnect(connection)
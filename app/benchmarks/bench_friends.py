@@ -0,0 +1,166 @@
+"""
+Бенчмарк списка друзей и проверки дружбы для пользователя с 5 000 друзей.
+
+Запуск из каталога app против отдельной БД с примененными миграциями:
+    DB_NAME=bench_db TESTING=True python -m benchmarks.bench_friends
+
+При первом запуске создает пользователя с --friends друзьями и фоновые
+дружбы между остальными (заявки ACCEPTED плюс строки friendships, как их
+создает update_friend_request). Сравнивает прежний путь через friend_requests
+(OR по обоим направлениям, цикл в Python и второй запрос IN) с таблицей
+смежности. Если Redis доступен, меряет и проверку через множество.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from redis import RedisError
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.config import settings
+from models.friend import FriendRequest, FriendStatus, Friendship
+from models.user import User
+from services.friend_service import get_friends
+from services.redis_service import redis_client
+
+SEED_USERS_SQL = """
+INSERT INTO users (id, username, is_active, is_verified, is_superuser)
+SELECT gen_random_uuid(), 'friends_bench_' || lpad(n::text, 6, '0'), true, false, false
+FROM generate_series(0, :friends) AS n
+"""
+
+# Пользователь 0 дружит со всеми, остальные - случайные пары (фоновый шум)
+SEED_REQUESTS_SQL = """
+WITH bench_users AS (
+    SELECT array_agg(id ORDER BY username) AS ids FROM users WHERE username LIKE 'friends_bench_%'
+)
+INSERT INTO friend_requests (id, sender_id, receiver_id, status, created_at, updated_at)
+SELECT gen_random_uuid(),
+    CASE WHEN n % 2 = 0 THEN ids[1] ELSE ids[n + 1] END,
+    CASE WHEN n % 2 = 0 THEN ids[n + 1] ELSE ids[1] END,
+    'ACCEPTED'::friendstatus, now(), timestamp '2026-01-01' + n * interval '1 minute'
+FROM bench_users, generate_series(1, :friends) AS n
+UNION ALL
+SELECT gen_random_uuid(), ids[2 + floor(random() * :friends)::int], ids[2 + floor(random() * :friends)::int],
+    'ACCEPTED'::friendstatus, now(), now()
+FROM bench_users, generate_series(1, :noise)
+"""
+
+SEED_FRIENDSHIPS_SQL = """
+INSERT INTO friendships (user_id, friend_id, created_at)
+SELECT sender_id, receiver_id, updated_at FROM friend_requests WHERE sender_id <> receiver_id
+UNION
+SELECT receiver_id, sender_id, updated_at FROM friend_requests WHERE sender_id <> receiver_id
+ON CONFLICT DO NOTHING
+"""
+
+
+async def seed(session: AsyncSession, friends: int, noise: int):
+    users = (await session.execute(
+        select(User).where(User.username.like("friends_bench_%")).order_by(User.username).limit(2)
+    )).scalars().all()
+    if users:
+        return users
+
+    print(f"Seeding a user with {friends} friends and {noise} background friendships...")
+    await session.execute(text(SEED_USERS_SQL), {"friends": friends})
+    await session.execute(text(SEED_REQUESTS_SQL), {"friends": friends, "noise": noise})
+    await session.execute(text(SEED_FRIENDSHIPS_SQL))
+    await session.commit()
+    await session.execute(text("ANALYZE friend_requests"))
+    await session.execute(text("ANALYZE friendships"))
+    return await seed(session, friends, noise)
+
+
+async def legacy_friends(session: AsyncSession, user_id):
+    """Прежняя реализация friends.get_friends"""
+    result = await session.execute(
+        select(FriendRequest).where(
+            (FriendRequest.status == FriendStatus.ACCEPTED) &
+            ((FriendRequest.sender_id == user_id) | (FriendRequest.receiver_id == user_id))
+        )
+    )
+    friend_ids = [
+        request.receiver_id if request.sender_id == user_id else request.sender_id
+        for request in result.scalars().all()
+    ]
+    result = await session.execute(select(User).where(User.id.in_(friend_ids)))
+    return result.scalars().all()
+
+
+async def legacy_are_friends(session: AsyncSession, user_id, friend_id):
+    result = await session.execute(
+        select(FriendRequest.id).where(
+            (FriendRequest.status == FriendStatus.ACCEPTED) & (
+                ((FriendRequest.sender_id == user_id) & (FriendRequest.receiver_id == friend_id))
+                | ((FriendRequest.sender_id == friend_id) & (FriendRequest.receiver_id == user_id))
+            )
+        ).limit(1)
+    )
+    return result.first() is not None
+
+
+async def friendship_exists(session: AsyncSession, user_id, friend_id):
+    result = await session.execute(
+        select(Friendship.user_id).where(Friendship.user_id == user_id, Friendship.friend_id == friend_id)
+    )
+    return result.first() is not None
+
+
+async def timed(coro_factory, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        await coro_factory()
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+async def main(friends: int, noise: int, limit: int, repeat: int):
+    engine = create_async_engine(settings.DATABASE_URI)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_maker() as session:
+        hub, friend = await seed(session, friends, noise)
+        results = [
+            ("list: friend_requests + IN (all)", await timed(lambda: legacy_friends(session, hub.id), repeat)),
+            (f"list: friendships page of {limit}", await timed(lambda: get_friends(session, hub.id, limit=limit), repeat)),
+            ("check: friend_requests", await timed(lambda: legacy_are_friends(session, hub.id, friend.id), repeat)),
+            ("check: friendships PK", await timed(lambda: friendship_exists(session, hub.id, friend.id), repeat)),
+        ]
+        session.expunge_all()
+
+        try:
+            friend_ids = (await session.execute(
+                select(Friendship.friend_id).where(Friendship.user_id == hub.id)
+            )).scalars().all()
+            await redis_client.set_friend_ids(
+                str(hub.id), [str(i) for i in friend_ids], 60, await redis_client.get_friends_version(str(hub.id))
+            )
+            results.append(("check: Redis SMISMEMBER", await timed(
+                lambda: redis_client.is_friend(str(hub.id), str(friend.id)), repeat
+            )))
+            results.append(("list: Redis SMEMBERS (all)", await timed(
+                lambda: redis_client.get_friend_ids(str(hub.id)), repeat
+            )))
+        except (RedisError, OSError) as e:
+            print(f"Redis unavailable, skipping cache timings: {e}")
+
+    for name, seconds in results:
+        print(f"{name:>36} {seconds * 1000:>9.2f}ms")
+
+    await redis_client.close()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--friends", type=int, default=5_000)
+    parser.add_argument("--noise", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.friends, args.noise, args.limit, args.repeat))
@@ -0,0 +1,92 @@
+"""
+Бенчмарк обработки загружаемых изображений.
+
+Запуск из каталога app:
+    TESTING=True python -m benchmarks.bench_images
+
+Генерирует JPEG на 12 Мп и прогоняет --uploads параллельных загрузок двумя
+способами: как раньше (декодирование, copy, thumbnail и два save прямо в
+event loop) и через create_thumbnail (пул процессов, draft для JPEG, оригинал
+без перекодирования). Для каждого выводит пропускную способность и
+максимальную задержку event loop - насколько запаздывал тикер с шагом 10 мс.
+"""
+import argparse
+import asyncio
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from core.config import settings
+from services.image_service import create_thumbnail, shutdown_image_executor
+
+TICK = 0.01
+
+
+def make_jpeg(width: int, height: int) -> bytes:
+    # Градиент вместо сплошной заливки, чтобы JPEG был похож на фото по размеру
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+async def legacy_process(data: bytes):
+    """Старый process_and_upload_image без загрузки в MinIO"""
+    image = Image.open(BytesIO(data))
+    thumbnail = image.copy()
+    thumbnail.thumbnail((300, 300))
+    original_bytes = BytesIO()
+    thumbnail_bytes = BytesIO()
+    image.save(original_bytes, format=image.format)
+    thumbnail.save(thumbnail_bytes, format=image.format)
+
+
+async def pooled_process(data: bytes):
+    await create_thumbnail(data)
+
+
+async def run(process, data: bytes, uploads: int):
+    max_lag = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal max_lag
+        while not done.is_set():
+            expected = time.perf_counter() + TICK
+            await asyncio.sleep(TICK)
+            max_lag = max(max_lag, time.perf_counter() - expected)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    start_time = time.perf_counter()
+    await asyncio.gather(*(process(data) for _ in range(uploads)))
+    elapsed = time.perf_counter() - start_time
+    done.set()
+    await ticker_task
+    return elapsed, max_lag
+
+
+async def main(uploads: int):
+    data = make_jpeg(4000, 3000)
+    print(f"{uploads} uploads of a 12 MP JPEG ({len(data) / 1024:.0f} KiB), "
+          f"{settings.IMAGE_PROCESS_WORKERS} worker processes")
+
+    # Прогрев: запуск процессов пула не должен попадать в замер
+    await asyncio.gather(*(pooled_process(data) for _ in range(settings.IMAGE_PROCESS_WORKERS)))
+
+    print(f"{'mode':>8} {'uploads/s':>10} {'max loop lag':>14}")
+    for name, process in (("inline", legacy_process), ("pool", pooled_process)):
+        elapsed, max_lag = await run(process, data, uploads)
+        print(f"{name:>8} {uploads / elapsed:>10.1f} {max_lag * 1000:>12.0f}ms")
+
+    shutdown_image_executor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=20)
+    args = parser.parse_args()
+    # Очередь из всех загрузок не должна упираться в таймаут слота
+    settings.IMAGE_PROCESS_QUEUE_TIMEOUT = 600
+    asyncio.run(main(args.uploads))
@@ -0,0 +1,48 @@
+"""
+Микробенчмарк кеша проверенных JWT.
+
+Запуск из каталога app:
+    TESTING=True python -m benchmarks.bench_jwt_decode
+
+Сравнивает jwt.decode с полной проверкой подписи и decode_access_token
+с прогретым кешем и пересчитывает разницу в CPU-время на 5k RPS.
+"""
+import time
+from datetime import timedelta
+
+from jose import jwt
+
+from core.config import settings
+from services.auth_service import create_access_token, decode_access_token
+
+ITERATIONS = 20_000
+TARGET_RPS = 5_000
+
+
+def bench(func, token: str) -> float:
+    """Среднее время одного вызова в секундах"""
+    start_time = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func(token)
+    return (time.perf_counter() - start_time) / ITERATIONS
+
+
+def main():
+    token = create_access_token(data={"sub": "benchmark"}, expires_delta=timedelta(minutes=30))
+
+    def full_decode(value: str):
+        return jwt.decode(value, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+    decode_access_token(token)
+
+    uncached = bench(full_decode, token)
+    cached = bench(decode_access_token, token)
+    saved = (uncached - cached) * TARGET_RPS
+
+    print(f"jwt.decode:          {uncached * 1e6:8.1f} us/call")
+    print(f"decode_access_token: {cached * 1e6:8.1f} us/call (cache hit)")
+    print(f"CPU saved at {TARGET_RPS} RPS: {saved * 1000:.0f} ms per second ({saved:.1%} of one core)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Бенчмарк offset- и keyset-пагинации переписки.
+
+Запуск из каталога app против отдельной БД с примененными миграциями:
+    DB_NAME=bench_db TESTING=True python -m benchmarks.bench_pagination
+
+При первом запуске создает переписку из --rows сообщений между двумя
+пользователями (плюс фоновые сообщения других пользователей) и сравнивает
+время получения страницы на глубине 10, 1 000 и 100 000 сообщений.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.config import settings
+from models.conversation import Conversation
+from models.message import Message
+from models.user import User
+from services.message_service import get_conversation_messages
+
+DEPTHS = (10, 1_000, 100_000)
+
+SEED_USERS_SQL = """
+INSERT INTO users (id, username, is_active, is_verified, is_superuser)
+SELECT gen_random_uuid(), 'pagination_bench_' || n, true, false, false
+FROM generate_series(1, 100) AS n
+"""
+
+# Первые два пользователя переписываются между собой, остальные - фоновый шум
+GENERATED_MESSAGES_SQL = """
+WITH bench_users AS (
+    SELECT array_agg(id ORDER BY username) AS ids FROM users WHERE username LIKE 'pagination_bench_%'
+), generated AS (
+    SELECT CASE WHEN n % 2 = 0 THEN ids[1] ELSE ids[2] END AS sender_id,
+        CASE WHEN n % 2 = 0 THEN ids[2] ELSE ids[1] END AS receiver_id,
+        'message ' || n AS content, timestamp '2026-01-01' + n * interval '1 second' AS created_at
+    FROM bench_users, generate_series(1, :rows) AS n
+    UNION ALL
+    SELECT ids[3 + n % 98], ids[3 + (n + 1) % 98], 'noise ' || n,
+        timestamp '2026-01-01' + n * interval '1 second'
+    FROM bench_users, generate_series(1, :rows) AS n
+)
+"""
+
+SEED_CONVERSATIONS_SQL = GENERATED_MESSAGES_SQL + """
+INSERT INTO conversations (id, user_low_id, user_high_id, last_message_at)
+SELECT gen_random_uuid(), least(sender_id, receiver_id), greatest(sender_id, receiver_id), max(created_at)
+FROM generated
+GROUP BY 2, 3
+"""
+
+SEED_MESSAGES_SQL = GENERATED_MESSAGES_SQL + """
+INSERT INTO messages (id, conversation_id, sender_id, receiver_id, content, is_read, created_at)
+SELECT gen_random_uuid(), conversations.id, sender_id, receiver_id, content, false, generated.created_at
+FROM generated
+JOIN conversations ON conversations.user_low_id = least(sender_id, receiver_id)
+    AND conversations.user_high_id = greatest(sender_id, receiver_id)
+"""
+
+
+async def seed(session: AsyncSession, rows: int):
+    users = (await session.execute(
+        select(User).where(User.username.like("pagination_bench_%")).order_by(User.username).limit(2)
+    )).scalars().all()
+    if len(users) == 2:
+        return users
+
+    print(f"Seeding {rows} conversation messages...")
+    await session.execute(text(SEED_USERS_SQL))
+    await session.execute(text(SEED_CONVERSATIONS_SQL), {"rows": rows})
+    await session.execute(text(SEED_MESSAGES_SQL), {"rows": rows})
+    await session.commit()
+    await session.execute(text("ANALYZE conversations"))
+    await session.execute(text("ANALYZE messages"))
+    return await seed(session, rows)
+
+
+async def timed(coro_factory, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        await coro_factory()
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+async def main(rows: int, limit: int, repeat: int):
+    engine = create_async_engine(settings.DATABASE_URI)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_maker() as session:
+        me, peer = await seed(session, rows)
+
+        print(f"{'depth':>8} {'offset':>10} {'cursor':>10}")
+        for depth in DEPTHS:
+            # Курсор строки на нужной глубине - то, что клиент получил бы с предыдущей страницей
+            row = (await session.execute(
+                select(Message.created_at, Message.id)
+                .join(Conversation, Conversation.id == Message.conversation_id)
+                .where(Conversation.user_low_id == min(me.id, peer.id), Conversation.user_high_id == max(me.id, peer.id))
+                .order_by(Message.created_at.desc(), Message.id.desc())
+                .offset(depth - 1).limit(1)
+            )).one()
+            after = (row.created_at, row.id)
+
+            offset_time = await timed(
+                lambda: get_conversation_messages(session, me.id, peer.id, skip=depth, limit=limit), repeat
+            )
+            cursor_time = await timed(
+                lambda: get_conversation_messages(session, me.id, peer.id, limit=limit, after=after), repeat
+            )
+            session.expunge_all()
+            print(f"{depth:>8} {offset_time * 1000:>8.2f}ms {cursor_time * 1000:>8.2f}ms")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.limit, args.repeat))
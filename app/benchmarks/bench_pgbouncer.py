@@ -0,0 +1,122 @@
+"""
+Бенчмарк пропускной способности API напрямую к PostgreSQL и через PgBouncer.
+
+Нужен PgBouncer в режиме transaction pooling перед той же БД, например
+сервис pgbouncer из compose/docker-compose.test.yml.
+Запуск из каталога app против отдельной БД с примененными миграциями:
+    DB_NAME=bench_db TESTING=True PGBOUNCER_HOST=localhost python -m benchmarks.bench_pgbouncer
+
+Гоняет смесь запросов к messages/notifications (--requests запросов,
+--concurrency одновременно) через профиль direct и через профиль pgbouncer
+с обоими режимами имен prepared statements и выводит RPS.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.config import settings
+from core.database import get_db, get_read_db, get_engine_options
+from main import app
+from models.user import User
+from services.auth_service import create_access_token
+
+
+def make_engine(**overrides):
+    config = settings.model_copy(update=overrides)
+    return create_async_engine(config.DATABASE_URI, **get_engine_options(config))
+
+
+async def ensure_users(session_maker):
+    """Отправитель и получатель, создаются при первом запуске"""
+    async with session_maker() as db:
+        users = []
+        for username in ("pgbouncer_bench_sender", "pgbouncer_bench_receiver"):
+            user = (await db.execute(select(User).where(User.username == username))).scalars().first()
+            if user is None:
+                user = User(email=f"{username}@example.com", username=username)
+                db.add(user)
+                await db.commit()
+            users.append(user)
+        return users
+
+
+async def run_workload(engine, token: str, peer_id, requests: int, concurrency: int) -> float:
+    """Гоняет смесь запросов к messages/notifications, возвращает RPS"""
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    headers = {"Authorization": f"Bearer {token}"}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def one(i: int):
+                async with semaphore:
+                    if i % 4 == 0:
+                        response = await client.post(
+                            f"/api/v1/messages/{peer_id}",
+                            json={"receiver_id": str(peer_id), "content": f"message {i}"},
+                            headers=headers,
+                        )
+                    elif i % 4 == 1:
+                        response = await client.get(f"/api/v1/messages/{peer_id}", headers=headers)
+                    elif i % 4 == 2:
+                        response = await client.get("/api/v1/notifications/", headers=headers)
+                    else:
+                        response = await client.get("/api/v1/notifications/unread-count", headers=headers)
+                    response.raise_for_status()
+
+            start_time = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests)))
+            return requests / (time.perf_counter() - start_time)
+    finally:
+        app.dependency_overrides.clear()
+
+
+async def main(requests: int, concurrency: int):
+    pgbouncer_host = os.getenv("PGBOUNCER_HOST")
+    if not pgbouncer_host:
+        raise SystemExit("PGBOUNCER_HOST is not set")
+    pgbouncer_port = os.getenv("PGBOUNCER_PORT", "6432")
+
+    engines = {"direct": make_engine(DB_ENGINE_PROFILE="direct")}
+    for names in ("unique", "disabled"):
+        engines[f"pgbouncer ({names})"] = make_engine(
+            DB_HOST=pgbouncer_host,
+            DB_PORT=pgbouncer_port,
+            DB_ENGINE_PROFILE="pgbouncer",
+            DB_PREPARED_STATEMENT_NAMES=names,
+        )
+
+    try:
+        sender, receiver = await ensure_users(
+            sessionmaker(engines["direct"], class_=AsyncSession, expire_on_commit=False)
+        )
+        token = create_access_token(data={"sub": str(sender.id)})
+        print(f"{requests} requests, concurrency {concurrency}")
+        for name, engine in engines.items():
+            rps = await run_workload(engine, token, receiver.id, requests, concurrency)
+            print(f"{name:>20}: {rps:8.0f} rps")
+    finally:
+        for engine in engines.values():
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
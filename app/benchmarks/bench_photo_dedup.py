@@ -0,0 +1,86 @@
+"""
+Бенчмарк дедупликации загружаемых фото.
+
+Запуск из каталога app против отдельной БД с примененными миграциями:
+    DB_NAME=bench_db TESTING=True python -m benchmarks.bench_photo_dedup
+
+Загружает --unique разных 12-мегапиксельных JPEG, каждый --copies раз, через
+process_and_upload_image и сравнивает медианное время первой загрузки и
+повторной (дубликата). Выводит, сколько байт не пришлось хранить.
+С TESTING=True запись в MinIO заглушена, поэтому время первой загрузки не
+включает передачу оригинала в хранилище - в реальности разница больше.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from io import BytesIO
+
+from fastapi import UploadFile
+from PIL import Image
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.config import settings
+from models.photo import PhotoBlob
+from services.image_service import process_and_upload_image, shutdown_image_executor
+
+
+def make_jpeg(seed: int, width: int = 4000, height: int = 3000) -> bytes:
+    # Шум с разной амплитудой: разные файлы, размер близок к реальному фото
+    image = Image.effect_noise((width, height), 32 + seed % 64).convert("RGB")
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+async def timed_upload(session_maker, data: bytes) -> float:
+    async with session_maker() as db:
+        start_time = time.perf_counter()
+        await process_and_upload_image(db, UploadFile(BytesIO(data), filename="photo.jpg"))
+        await db.commit()
+        return time.perf_counter() - start_time
+
+
+async def main(unique: int, copies: int):
+    engine = create_async_engine(settings.DATABASE_URI)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    # Очередь на пул не должна упираться в таймаут слота
+    settings.IMAGE_PROCESS_QUEUE_TIMEOUT = 600
+
+    images = [make_jpeg(seed) for seed in range(unique)]
+    # Прогрев пула процессов на файле, который в замер не входит
+    await timed_upload(session_maker, make_jpeg(unique + time.time_ns() % 1000, 400, 300))
+
+    async with session_maker() as db:
+        before = await db.scalar(select(func.count()).select_from(PhotoBlob))
+
+    new_timings, duplicate_timings = [], []
+    saved = 0
+    for data in images:
+        new_timings.append(await timed_upload(session_maker, data))
+        for _ in range(copies - 1):
+            duplicate_timings.append(await timed_upload(session_maker, data))
+            saved += len(data)
+
+    async with session_maker() as db:
+        after = await db.scalar(select(func.count()).select_from(PhotoBlob))
+    shutdown_image_executor()
+    await engine.dispose()
+
+    total = sum(len(data) for data in images) * copies
+    print(f"{unique} images x {copies} uploads, {total / 1024 / 1024:.1f} MiB uploaded")
+    print(f"new blobs: {after - before}")
+    print(f"new upload:       {statistics.median(new_timings) * 1000:8.1f} ms (median)")
+    if duplicate_timings:
+        print(f"duplicate upload: {statistics.median(duplicate_timings) * 1000:8.1f} ms (median)")
+    print(f"storage saved: {saved / 1024 / 1024:.1f} MiB ({saved / total:.0%} of uploaded bytes)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--unique", type=int, default=5)
+    parser.add_argument("--copies", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.unique, args.copies))
@@ -0,0 +1,113 @@
+"""
+Бенчмарк поиска мест по радиусу на 1M записей.
+
+Запуск из каталога app против отдельной БД с примененными миграциями:
+    DB_NAME=bench_db TESTING=True python -m benchmarks.bench_places_nearby
+
+При первом запуске засевает places до --rows записей: половина равномерно
+по миру, половина вокруг Москвы и Санкт-Петербурга. Сравнивает запрос
+по ячейкам geo_cell (индекс) с фильтром по bbox широты/долготы без индекса.
+"""
+import argparse
+import asyncio
+import math
+import random
+import statistics
+import time
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.config import settings
+from models.place import Place
+from services.geo_service import KM_PER_DEGREE_LAT, distance_km, within_radius
+
+CITIES = [(55.7558, 37.6173), (59.9343, 30.3351)]
+
+SEED_SQL = """
+INSERT INTO places (id, name, latitude, longitude, created_by, is_public, is_verified)
+SELECT gen_random_uuid(), 'place ' || n, lat, lon, :user_id, true, false
+FROM (
+    SELECT n,
+        CASE WHEN n % 2 = 0 THEN asin(2 * random() - 1) * 180 / pi()
+             ELSE CASE WHEN n % 4 = 1 THEN 55.7558 ELSE 59.9343 END + (random() - 0.5)
+        END AS lat,
+        CASE WHEN n % 2 = 0 THEN random() * 360 - 180
+             ELSE CASE WHEN n % 4 = 1 THEN 37.6173 ELSE 30.3351 END + (random() - 0.5) * 2
+        END AS lon
+    FROM generate_series(1, :count) AS n
+) AS points
+"""
+
+
+async def seed(conn, rows: int):
+    existing = (await conn.execute(select(func.count()).select_from(Place))).scalar()
+    if existing >= rows:
+        return
+
+    user_id = (await conn.execute(text(
+        "INSERT INTO users (id, username, is_active, is_verified, is_superuser) "
+        "VALUES (gen_random_uuid(), 'bench_' || floor(random() * 1e9), true, false, false) RETURNING id"
+    ))).scalar()
+    print(f"Seeding {rows - existing} places...")
+    await conn.execute(text(SEED_SQL), {"user_id": user_id, "count": rows - existing})
+    await conn.execute(text("ANALYZE places"))
+
+
+def bbox_filter(latitude: float, longitude: float, radius_km: float):
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    lon_delta = lat_delta / max(math.cos(math.radians(abs(latitude) + lat_delta)), 1e-6)
+    return (
+        Place.latitude.between(latitude - lat_delta, latitude + lat_delta)
+        & Place.longitude.between(longitude - lon_delta, longitude + lon_delta)
+        & (distance_km(latitude, longitude) <= radius_km)
+    )
+
+
+async def measure(conn, build_filter, points, radius_km: float, limit: int):
+    timings = []
+    for latitude, longitude in points:
+        stmt = select(Place.id).where(
+            Place.is_public == True,
+            build_filter(latitude, longitude, radius_km)
+        ).order_by(distance_km(latitude, longitude)).limit(limit)
+
+        start_time = time.perf_counter()
+        await conn.execute(stmt)
+        timings.append(time.perf_counter() - start_time)
+
+    timings.sort()
+    return statistics.mean(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+async def main(rows: int, queries: int, limit: int):
+    engine = create_async_engine(settings.DATABASE_URI)
+    async with engine.begin() as conn:
+        await seed(conn, rows)
+
+    random.seed(42)
+    points = [
+        (lat + random.uniform(-0.3, 0.3), lon + random.uniform(-0.6, 0.6))
+        for lat, lon in random.choices(CITIES, k=queries)
+    ]
+
+    print(f"{'radius':>7} {'geo_cell avg':>13} {'p95':>8} {'bbox avg':>10} {'p95':>8}")
+    async with engine.connect() as conn:
+        for radius_km in (1, 5, 20):
+            cell_avg, cell_p95 = await measure(conn, within_radius, points, radius_km, limit)
+            bbox_avg, bbox_p95 = await measure(conn, bbox_filter, points, radius_km, limit)
+            print(
+                f"{radius_km:>5}km {cell_avg * 1000:>11.2f}ms {cell_p95 * 1000:>6.2f}ms "
+                f"{bbox_avg * 1000:>8.2f}ms {bbox_p95 * 1000:>6.2f}ms"
+            )
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.queries, args.limit))
@@ -0,0 +1,78 @@
+"""
+Бенчмарк формата кеша результатов поиска.
+
+Запуск из каталога app:
+    TESTING=True python -m benchmarks.bench_search_cache
+
+Сравнивает прежнюю схему (JSON со словарями, на попадании - json.loads и
+валидация response_model) с готовым JSON по UserResponse, сжатым zlib для
+больших страниц. Время сети до Redis одинаково и здесь не учитывается.
+"""
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+from pydantic import TypeAdapter
+
+from core.config import settings
+from models.user import User
+from schemas.user import UserResponse
+from services.redis_service import encode_payload, decode_payload
+from services.search_service import serialize_users
+
+ITERATIONS = 2_000
+PAGE_SIZES = (10, 50, 200)
+
+_adapter = TypeAdapter(List[UserResponse])
+
+
+def make_users(count: int) -> List[User]:
+    now = datetime.now(timezone.utc)
+    return [
+        User(
+            id=uuid.uuid4(),
+            email=f"user{i}@example.com",
+            username=f"user{i}",
+            first_name="Анна",
+            last_name="Петрова",
+            phone=f"+7900{i:07d}",
+            is_active=True,
+            is_verified=True,
+            avatar_url=f"http://minio/avatars/{uuid.uuid4()}.jpg",
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def bench(func) -> float:
+    start_time = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func()
+    return (time.perf_counter() - start_time) / ITERATIONS
+
+
+def main():
+    print(f"{'page':>5} {'dict json':>10} {'response':>10} {'stored':>10} {'hit dict':>10} {'hit payload':>12}")
+    for size in PAGE_SIZES:
+        users = make_users(size)
+
+        legacy = json.dumps(_adapter.dump_python(_adapter.validate_python(users, from_attributes=True), mode="json"))
+        payload = serialize_users(users)
+        stored = encode_payload(payload, settings.SEARCH_CACHE_COMPRESS_MIN_BYTES)
+
+        # Прежний путь попадания: разбор JSON, валидация response_model, сериализация ответа
+        legacy_hit = bench(lambda: _adapter.dump_json(_adapter.validate_python(json.loads(legacy))))
+        payload_hit = bench(lambda: decode_payload(stored))
+
+        print(
+            f"{size:>5} {len(legacy.encode()):>9}B {len(payload):>9}B {len(stored):>9}B "
+            f"{legacy_hit * 1e6:>8.0f}us {payload_hit * 1e6:>10.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Бенчмарк полнотекстового поиска мест на 1M записей.
+
+Запуск из каталога app против отдельной БД (UTF8) с примененными миграциями:
+    DB_NAME=bench_db TESTING=True python -m benchmarks.bench_search_fts
+
+При первом запуске засевает places до --rows записей из словаря с
+неравномерной частотой слов: от редких (~0.03% строк) до встречающихся
+почти везде. Сравнивает поиск по search_vector (GIN-индекс) с вычислением
+to_tsvector для каждой строки, как было бы без колонки.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.config import settings
+from models.place import Place, PLACE_SEARCH_VECTOR_SQL
+
+WORDS = [
+    "кофейня", "парк", "музей", "театр", "библиотека", "набережная", "галерея", "собор",
+    "площадь", "сквер", "рынок", "пекарня", "ресторан", "бульвар", "усадьба", "фонтан",
+    "мост", "выставка", "планетарий", "зоопарк", "стадион", "каток", "пруд", "оранжерея",
+    "маяк", "крепость", "монастырь", "обсерватория", "дворец", "консерватория",
+]
+
+SYLLABLES = ["ка", "ро", "ми", "ла", "ту", "не", "со", "вы", "за", "ги", "по", "ре", "да", "лу", "фе", "ши"]
+
+# w() - слово словаря WORDS с индексом floor(random()^3 * N): первые слова
+# встречаются в большинстве строк. rare() - одно из 4096 слов из трех слогов,
+# каждое встречается в названиях примерно 250 раз на 1M строк
+SEED_FUNCTIONS_SQL = [
+    "CREATE OR REPLACE FUNCTION pg_temp.w() RETURNS text LANGUAGE sql VOLATILE AS "
+    "$$ SELECT (ARRAY[{words}])[1 + floor(power(random(), 3) * {count})::int] $$",
+    "CREATE OR REPLACE FUNCTION pg_temp.rare() RETURNS text LANGUAGE sql VOLATILE AS "
+    "$$ SELECT s[1 + floor(random() * 16)::int] || s[1 + floor(random() * 16)::int] || s[1 + floor(random() * 16)::int] "
+    "FROM (SELECT ARRAY[{syllables}] AS s) AS syllables $$",
+]
+
+SEED_SQL = """
+INSERT INTO places (id, name, description, address, tags, latitude, longitude, created_by, is_public, is_verified)
+SELECT gen_random_uuid(),
+    initcap(pg_temp.rare()) || ' ' || pg_temp.w(),
+    pg_temp.w() || ' рядом с ' || pg_temp.w() || ', ' || pg_temp.w() || ' и ' || pg_temp.w(),
+    'улица ' || pg_temp.w() || ', ' || n,
+    ARRAY[pg_temp.w(), pg_temp.w()]::varchar[],
+    55 + random(), 37 + random(), :user_id, true, false
+FROM generate_series(1, :count) AS n
+"""
+
+
+def quoted(values) -> str:
+    return ", ".join(f"'{value}'" for value in values)
+
+
+async def seed(conn, rows: int):
+    existing = (await conn.execute(select(func.count()).select_from(Place))).scalar()
+    if existing >= rows:
+        return
+
+    for sql in SEED_FUNCTIONS_SQL:
+        await conn.execute(text(sql.format(
+            words=quoted(WORDS), count=len(WORDS), syllables=quoted(SYLLABLES)
+        )))
+    user_id = (await conn.execute(text(
+        "INSERT INTO users (id, username, is_active, is_verified, is_superuser) "
+        "VALUES (gen_random_uuid(), 'bench_' || floor(random() * 1e9), true, false, false) RETURNING id"
+    ))).scalar()
+    print(f"Seeding {rows - existing} places...")
+    await conn.execute(text(SEED_SQL), {"user_id": user_id, "count": rows - existing})
+    await conn.execute(text("ANALYZE places"))
+
+
+async def measure(conn, vector, query: str, repeat: int, limit: int):
+    search_query = func.plainto_tsquery('russian', query)
+    stmt = select(Place.id).where(
+        vector.op('@@')(search_query),
+        Place.is_public == True
+    ).order_by(func.ts_rank_cd(vector, search_query).desc(), Place.id).limit(limit)
+
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        await conn.execute(stmt)
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+async def main(rows: int, repeat: int, limit: int):
+    engine = create_async_engine(settings.DATABASE_URI)
+    async with engine.begin() as conn:
+        await seed(conn, rows)
+
+    on_the_fly = literal_column(f"({PLACE_SEARCH_VECTOR_SQL})", type_=TSVECTOR)
+    print(f"{'query':>28} {'matches':>9} {'GIN column':>11} {'to_tsvector per row':>20}")
+    async with engine.connect() as conn:
+        rare = SYLLABLES[0] + SYLLABLES[1] + SYLLABLES[2]
+        for query in (rare, f"{rare} {WORDS[0]}", WORDS[-1], WORDS[0]):
+            matches = (await conn.execute(
+                select(func.count()).select_from(Place).where(
+                    Place.search_vector.op('@@')(func.plainto_tsquery('russian', query))
+                )
+            )).scalar()
+            indexed = await measure(conn, Place.search_vector, query, repeat, limit)
+            computed = await measure(conn, on_the_fly, query, 1, limit)
+            print(f"{query:>28} {matches:>9} {indexed * 1000:>9.1f}ms {computed * 1000:>18.0f}ms")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat, args.limit))
@@ -0,0 +1,138 @@
+"""
+Бенчмарк индикатора набора: 10 000 одновременно печатающих пользователей.
+
+Запуск из каталога app:
+    TESTING=True python -m benchmarks.bench_typing
+
+Каждый отправитель шлет событие typing на каждое нажатие (--rate в секунду)
+в течение --seconds секунд; половина в конце присылает is_typing=false,
+остальные просто замолкают. Сравнивает прежнюю обработку (кадр на каждое
+событие, списки typing_users) с TypingState: число кадров получателям,
+процессорное время и время отключения всех отправителей.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+from uuid import UUID, uuid4
+
+from core.config import settings
+from services.websocket_manager import ConnectionManager
+from services.ws_backplane import InMemoryBackplane
+
+
+class CountingWebSocket:
+    def __init__(self):
+        self.frames = 0
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        self.frames += 1
+
+    async def close(self, code=1000):
+        pass
+
+
+class LegacyTypingManager:
+    """Прежний ConnectionManager.broadcast_typing/disconnect"""
+
+    def __init__(self):
+        self.active_connections: Dict[UUID, CountingWebSocket] = {}
+        self.typing_users: Dict[UUID, List[UUID]] = {}
+
+    def disconnect(self, user_id: UUID):
+        self.active_connections.pop(user_id, None)
+        for receiver_id, typing_list in self.typing_users.items():
+            if user_id in typing_list:
+                typing_list.remove(user_id)
+
+    async def broadcast_typing(self, receiver_id: UUID, sender_id: UUID, is_typing: bool):
+        if receiver_id in self.active_connections:
+            websocket = self.active_connections[receiver_id]
+            if is_typing:
+                if receiver_id not in self.typing_users:
+                    self.typing_users[receiver_id] = []
+                if sender_id not in self.typing_users[receiver_id]:
+                    self.typing_users[receiver_id].append(sender_id)
+            else:
+                if receiver_id in self.typing_users and sender_id in self.typing_users[receiver_id]:
+                    self.typing_users[receiver_id].remove(sender_id)
+            await websocket.send_json({
+                "type": "typing",
+                "user_id": str(sender_id),
+                "is_typing": is_typing,
+                "typing_users": [str(uid) for uid in self.typing_users.get(receiver_id, [])]
+            })
+
+
+async def simulate(broadcast, pairs, rate: int, seconds: float):
+    ticks = int(rate * seconds)
+    for _ in range(ticks):
+        for sender_id, receiver_id in pairs:
+            await broadcast(receiver_id, sender_id, True)
+        await asyncio.sleep(1 / rate)
+    for sender_id, receiver_id in pairs[::2]:
+        await broadcast(receiver_id, sender_id, False)
+    return ticks * len(pairs) + len(pairs[::2])
+
+
+async def run_legacy(pairs, receivers, rate, seconds):
+    manager = LegacyTypingManager()
+    sockets = {user_id: CountingWebSocket() for user_id in receivers + [sender for sender, _ in pairs]}
+    manager.active_connections.update(sockets)
+
+    cpu = time.process_time()
+    events = await simulate(manager.broadcast_typing, pairs, rate, seconds)
+    cpu = time.process_time() - cpu
+
+    start_time = time.perf_counter()
+    for sender_id, _ in pairs:
+        manager.disconnect(sender_id)
+    disconnect_time = time.perf_counter() - start_time
+    return events, sum(sockets[r].frames for r in receivers), cpu, disconnect_time
+
+
+async def run_coalesced(pairs, receivers, rate, seconds):
+    manager = ConnectionManager(InMemoryBackplane())
+    sockets = {}
+    connections = {}
+    for user_id in receivers + [sender for sender, _ in pairs]:
+        sockets[user_id] = CountingWebSocket()
+        connections[user_id] = await manager.connect(sockets[user_id], user_id)
+
+    cpu = time.process_time()
+    events = await simulate(manager.broadcast_typing, pairs, rate, seconds)
+    # Дожидаемся последней склейки и истечения отметок замолчавших
+    await asyncio.sleep(settings.WS_TYPING_TTL + 2 * settings.WS_TYPING_FLUSH_INTERVAL)
+    cpu = time.process_time() - cpu
+
+    start_time = time.perf_counter()
+    for sender_id, _ in pairs:
+        await manager.disconnect(connections[sender_id])
+    disconnect_time = time.perf_counter() - start_time
+    frames = sum(sockets[r].frames for r in receivers)
+    await manager.close()
+    return events, frames, cpu, disconnect_time
+
+
+async def main(typists: int, receivers_count: int, rate: int, seconds: float):
+    receivers = [uuid4() for _ in range(receivers_count)]
+    pairs = [(uuid4(), receivers[i % receivers_count]) for i in range(typists)]
+
+    print(f"{typists} typists -> {receivers_count} receivers, {rate} events/s for {seconds}s")
+    print(f"{'':>10} {'events':>9} {'frames':>9} {'cpu':>9} {'disconnect all':>15}")
+    for name, run in (("legacy", run_legacy), ("coalesced", run_coalesced)):
+        events, frames, cpu, disconnect_time = await run(pairs, receivers, rate, seconds)
+        print(f"{name:>10} {events:>9} {frames:>9} {cpu:>8.2f}s {disconnect_time * 1000:>13.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--typists", type=int, default=10_000)
+    parser.add_argument("--receivers", type=int, default=2_000)
+    parser.add_argument("--rate", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.typists, args.receivers, args.rate, args.seconds))
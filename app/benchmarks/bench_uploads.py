@@ -0,0 +1,102 @@
+"""
+Бенчмарк затрат API-процесса на одну загрузку фото.
+
+Нужен локальный MinIO, например:
+    docker run -d -p 9000:9000 -e MINIO_ROOT_USER=minioadmin \
+        -e MINIO_ROOT_PASSWORD=minioadmin minio/minio server /data
+
+Запуск из каталога app (без TESTING, иначе клиент MinIO отключен):
+    MINIO_ENDPOINT=localhost:9000 python -m benchmarks.bench_uploads
+
+Сравнивает CPU-время и пик памяти (tracemalloc) API-процесса на загрузку:
+  proxy   - файл проходит через API: upload_image оригинала в MinIO;
+  direct  - presigned URL + проверка размера при подтверждении, сам PUT
+            выполняет клиент и в замер не входит;
+  thumb   - фоновое превью после direct (чтение объекта и загрузка превью;
+            декодирование идет в пуле процессов и в CPU API не входит).
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from datetime import timedelta
+from io import BytesIO
+
+import httpx
+from PIL import Image
+
+from services.image_service import IMAGE_MIME_TYPES, create_thumbnail, shutdown_image_executor
+from services.minio_service import minio_client
+
+
+def make_jpeg(width: int, height: int) -> bytes:
+    # Шум сжимается плохо, поэтому размер файла близок к реальному фото
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+class Meter:
+    """Суммирует CPU-время процесса и пик памяти по замеренным участкам"""
+    def __init__(self):
+        self.cpu = 0.0
+        self.peak = 0
+
+    async def measure(self, coro):
+        tracemalloc.reset_peak()
+        start_cpu = time.process_time()
+        result = await coro
+        self.cpu += time.process_time() - start_cpu
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        return result
+
+
+async def proxy_upload(meter: Meter, data: bytes, http: httpx.Client, index: int):
+    await meter.measure(minio_client.upload_image(BytesIO(data), "photo.jpg", "image/jpeg"))
+
+
+async def direct_upload(meter: Meter, data: bytes, http: httpx.Client, index: int):
+    object_name = f"bench/{index}.jpg"
+    upload_url = await meter.measure(minio_client.presigned_upload_url(object_name, timedelta(minutes=5)))
+    # Загрузку выполняет клиент, не API: вне замера
+    http.put(upload_url, content=data).raise_for_status()
+    await meter.measure(minio_client.get_object_size(object_name))
+    return object_name
+
+
+async def thumbnail(meter: Meter, object_name: str):
+    async def build():
+        thumbnail_data, image_format, _ = await create_thumbnail(await minio_client.get_object_bytes(object_name))
+        await minio_client.upload_image(BytesIO(thumbnail_data), "thumb.jpg", IMAGE_MIME_TYPES[image_format])
+
+    await meter.measure(build())
+
+
+async def main(uploads: int):
+    if minio_client.client is None:
+        raise SystemExit("MinIO client is disabled (TESTING=True)")
+
+    data = make_jpeg(4000, 3000)
+    print(f"{uploads} uploads of a 12 MP JPEG ({len(data) / 1024 / 1024:.1f} MiB)")
+
+    tracemalloc.start()
+    results = {"proxy": Meter(), "direct": Meter(), "thumb": Meter()}
+    with httpx.Client(timeout=60) as http:
+        for index in range(uploads):
+            await proxy_upload(results["proxy"], data, http, index)
+            object_name = await direct_upload(results["direct"], data, http, index)
+            await thumbnail(results["thumb"], object_name)
+    tracemalloc.stop()
+    shutdown_image_executor()
+
+    print(f"{'mode':>8} {'cpu/upload':>12} {'peak memory':>12}")
+    for name, meter in results.items():
+        print(f"{name:>8} {meter.cpu / uploads * 1000:>10.1f}ms {meter.peak / 1024 / 1024:>10.1f}MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.uploads))
@@ -1,15 +1,18 @@
 from .config import settings
-from .database import Base, engine, AsyncSessionLocal, get_db
+from .database import Base, engine, read_engine, AsyncSessionLocal, AsyncReadSessionLocal, get_db, get_read_db
 from .logging import setup_logging
-from .monitoring import metrics_middleware, metrics_endpoint
+from .monitoring import PrometheusMiddleware, metrics_endpoint
 
 __all__ = [
     "settings",
     "Base",
     "engine",
+    "read_engine",
     "AsyncSessionLocal",
+    "AsyncReadSessionLocal",
     "get_db",
+    "get_read_db",
     "setup_logging",
-    "metrics_middleware",
+    "PrometheusMiddleware",
     "metrics_endpoint"
 ]
\ No newline at end of file
@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar
+
+from .monitoring import BATCH_WRITER_SIZE, BATCH_WRITER_FLUSH_LATENCY, BATCH_WRITER_FAILURES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class BatchWriter(Generic[T, R]):
+    """
+    Write-behind буфер: копит элементы не дольше max_delay секунд (или до
+    max_batch_size) и записывает их одним вызовом flush_batch(items), который
+    возвращает результаты в том же порядке. Исключение на месте результата
+    означает ошибку только этого элемента.
+    Рассчитан на использование из одного event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush_batch: Callable[[List[T]], Awaitable[List[R]]],
+        max_delay: float,
+        max_batch_size: int,
+    ):
+        self.name = name
+        self.max_delay = max_delay
+        self.max_batch_size = max_batch_size
+        self._flush_batch = flush_batch
+        self._pending: List[Tuple[T, Optional[asyncio.Future]]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: Set[asyncio.Task] = set()
+
+    def add(self, item: T) -> None:
+        """Ставит элемент в очередь без ожидания записи; ошибки только логируются"""
+        self._enqueue(item, None)
+
+    async def submit(self, item: T) -> R:
+        """Ставит элемент в очередь и дожидается записи его пачки"""
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(item, future)
+        return await future
+
+    async def flush(self) -> None:
+        """Записывает накопленное и дожидается всех начатых записей (при остановке)"""
+        self._start_write()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _enqueue(self, item: T, future: Optional[asyncio.Future]) -> None:
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size or self.max_delay <= 0:
+            self._start_write()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._start_write)
+
+    def _start_write(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        # Пустой контекст: запись пачки общая для нескольких запросов и не должна
+        # наследовать контекст того, кто ее запустил (например, счетчик SQL-запросов)
+        task = asyncio.get_running_loop().create_task(self._write(batch), context=contextvars.Context())
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: List[Tuple[T, Optional[asyncio.Future]]]) -> None:
+        BATCH_WRITER_SIZE.labels(writer=self.name).observe(len(batch))
+        start_time = time.perf_counter()
+        try:
+            results = await self._flush_batch([item for item, _ in batch])
+        except Exception as e:
+            BATCH_WRITER_FAILURES.labels(writer=self.name).inc()
+            logger.exception(f"Failed to write batch of {len(batch)} to {self.name}")
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            BATCH_WRITER_FLUSH_LATENCY.labels(writer=self.name).observe(time.perf_counter() - start_time)
+
+        for (item, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                if future is not None and not future.done():
+                    future.set_exception(result)
+                else:
+                    logger.warning(f"Failed to write {item!r} to {self.name}: {result}")
+            elif future is not None and not future.done():
+                future.set_result(result)
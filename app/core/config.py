@@ -18,6 +18,22 @@ class Settings(BaseSettings):
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
     
+    # Кеш проверенных JWT: digest токена -> claims. Запись живет не дольше exp токена
+    JWT_DECODE_CACHE_TTL: float = float(os.getenv("JWT_DECODE_CACHE_TTL", 300))
+    JWT_DECODE_CACHE_MAXSIZE: int = int(os.getenv("JWT_DECODE_CACHE_MAXSIZE", 10000))
+    
+    # Хеширование паролей (bcrypt) в отдельном пуле потоков
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    # Сколько секунд запрос может ждать свободный слот, прежде чем получит 503
+    PASSWORD_HASH_QUEUE_TIMEOUT: float = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", 2))
+    
+    # Обработка изображений (декодирование, превью) в пуле процессов
+    IMAGE_PROCESS_WORKERS: int = int(os.getenv("IMAGE_PROCESS_WORKERS", 2))
+    IMAGE_PROCESS_QUEUE_TIMEOUT: float = float(os.getenv("IMAGE_PROCESS_QUEUE_TIMEOUT", 5))
+    # Лимиты загрузки: размер файла в байтах и число пикселей (защита от decompression bomb)
+    MAX_IMAGE_UPLOAD_BYTES: int = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", 20 * 1024 * 1024))
+    MAX_IMAGE_PIXELS: int = int(os.getenv("MAX_IMAGE_PIXELS", 50_000_000))
+    
     # CORS
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
     
@@ -34,7 +50,41 @@ class Settings(BaseSettings):
     DB_USER: str = os.getenv("DB_USER", "test_user")
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "test_password")
     DB_NAME: str = os.getenv("DB_NAME", "test_db")
-    
+
+    # Пул соединений: "queue" - постоянный пул, "null" - новое соединение на каждый checkout
+    DB_POOL_MODE: str = os.getenv("DB_POOL_MODE", "queue")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))  # секунды
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 5))  # ожидание свободного соединения, секунды
+
+    # Профиль движка: "direct" - прямое подключение к PostgreSQL,
+    # "pgbouncer" - через PgBouncer в режиме transaction pooling
+    DB_ENGINE_PROFILE: str = os.getenv("DB_ENGINE_PROFILE", "direct")
+    # Имена prepared statements в профиле pgbouncer: "unique" - uuid-имена,
+    # "disabled" - безымянные statements без кеширования
+    DB_PREPARED_STATEMENT_NAMES: str = os.getenv("DB_PREPARED_STATEMENT_NAMES", "unique")
+    # Размер кеша prepared statements на соединение (0 - без кеша).
+    # За PgBouncer кеш работает только при max_prepared_statements > 0 (PgBouncer >= 1.21)
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", 100))
+
+    # Read-реплика: если DB_READ_HOST не задан, чтение идет через основную БД.
+    # Пустые DB_READ_PORT/USER/PASSWORD берутся из настроек основной БД
+    DB_READ_HOST: str = os.getenv("DB_READ_HOST", "")
+    DB_READ_PORT: str = os.getenv("DB_READ_PORT", "")
+    DB_READ_USER: str = os.getenv("DB_READ_USER", "")
+    DB_READ_PASSWORD: str = os.getenv("DB_READ_PASSWORD", "")
+    # Сколько секунд после записи чтения пользователя идут в основную БД (0 - выключено)
+    DB_READ_STICKY_SECONDS: float = float(os.getenv("DB_READ_STICKY_SECONDS", 5))
+
+    # Запросы дольше DB_SLOW_QUERY_SECONDS пишутся в лог с параметрами (0 - выключено);
+    # DB_SLOW_QUERY_EXPLAIN добавляет к записи план SELECT (EXPLAIN без ANALYZE)
+    DB_SLOW_QUERY_SECONDS: float = float(os.getenv("DB_SLOW_QUERY_SECONDS", 0.5))
+    DB_SLOW_QUERY_EXPLAIN: bool = os.getenv("DB_SLOW_QUERY_EXPLAIN", "False").lower() == "true"
+    # Ленивая загрузка связей бросает исключение вместо скрытого N+1 (включается в тестах)
+    DB_STRICT_LAZY_LOAD: bool = os.getenv("DB_STRICT_LAZY_LOAD", "False").lower() == "true"
+
     # Убираем DATABASE_URI из полей, будем вычислять его динамически
     # через property чтобы избежать проблем с валидацией
     
@@ -42,13 +92,62 @@ class Settings(BaseSettings):
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
     REDIS_PASSWORD: str = os.getenv("REDIS_PASSWORD", "")
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", 1))  # секунды
     
+    # Кеш аутентифицированных пользователей (principal cache).
+    # Локальный TTL ограничивает устаревание данных на других воркерах после инвалидации,
+    # Redis TTL - устаревание при изменениях, которые явно не инвалидируют кеш
+    PRINCIPAL_CACHE_LOCAL_TTL: float = float(os.getenv("PRINCIPAL_CACHE_LOCAL_TTL", 30))
+    PRINCIPAL_CACHE_LOCAL_MAXSIZE: int = int(os.getenv("PRINCIPAL_CACHE_LOCAL_MAXSIZE", 10000))
+    PRINCIPAL_CACHE_REDIS_TTL: int = int(os.getenv("PRINCIPAL_CACHE_REDIS_TTL", 300))
+
+    # Кеш результатов поиска: TTL в секундах и размер JSON, начиная с которого он сжимается zlib (0 - не сжимать)
+    SEARCH_CACHE_TTL: int = int(os.getenv("SEARCH_CACHE_TTL", 300))
+    SEARCH_CACHE_COMPRESS_MIN_BYTES: int = int(os.getenv("SEARCH_CACHE_COMPRESS_MIN_BYTES", 2048))
+
+    # Счетчики непрочитанных уведомлений в Redis: TTL ключа и период сверки с БД в секундах
+    UNREAD_COUNTER_TTL: int = int(os.getenv("UNREAD_COUNTER_TTL", 86400))
+    UNREAD_COUNTER_RECONCILE_INTERVAL: float = float(os.getenv("UNREAD_COUNTER_RECONCILE_INTERVAL", 300))
+
+    # Буфер создания уведомлений: задержка накопления пачки в секундах (0 - писать сразу) и ее предельный размер
+    NOTIFICATION_BATCH_DELAY: float = float(os.getenv("NOTIFICATION_BATCH_DELAY", 0.005))
+    NOTIFICATION_BATCH_MAX_SIZE: int = int(os.getenv("NOTIFICATION_BATCH_MAX_SIZE", 500))
+    # То же для сообщений из WebSocket
+    MESSAGE_BATCH_DELAY: float = float(os.getenv("MESSAGE_BATCH_DELAY", 0.005))
+    MESSAGE_BATCH_MAX_SIZE: int = int(os.getenv("MESSAGE_BATCH_MAX_SIZE", 500))
+
+    # TTL множеств друзей в Redis в секундах
+    FRIENDS_CACHE_TTL: int = int(os.getenv("FRIENDS_CACHE_TTL", 3600))
+
+    # Доставка событий WebSocket между воркерами: redis (pub/sub) или memory (один процесс)
+    WS_BACKPLANE: str = os.getenv("WS_BACKPLANE", "redis")
+    # Очередь исходящих кадров на сокет и таймаут отправки одного кадра в секундах.
+    # При переполнении сначала теряются typing, затем по WS_SLOW_CONSUMER_POLICY:
+    # disconnect - закрыть сокет (клиент переподключится), drop - отбросить кадр
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+    WS_SEND_TIMEOUT: float = float(os.getenv("WS_SEND_TIMEOUT", 10))
+    WS_SLOW_CONSUMER_POLICY: str = os.getenv("WS_SLOW_CONSUMER_POLICY", "disconnect")
+    # Отметка "печатает" снимается через WS_TYPING_TTL секунд без обновлений;
+    # изменения набора уходят получателю не чаще раза в WS_TYPING_FLUSH_INTERVAL
+    WS_TYPING_TTL: float = float(os.getenv("WS_TYPING_TTL", 6))
+    WS_TYPING_FLUSH_INTERVAL: float = float(os.getenv("WS_TYPING_FLUSH_INTERVAL", 0.25))
+
     # MinIO
     MINIO_ENDPOINT: str = os.getenv("MINIO_ENDPOINT", "localhost:9000")
     MINIO_ROOT_USER: str = os.getenv("MINIO_ROOT_USER", "minioadmin")
     MINIO_ROOT_PASSWORD: str = os.getenv("MINIO_ROOT_PASSWORD", "minioadmin")
     MINIO_BUCKET: str = os.getenv("MINIO_BUCKET", "places-social")
     MINIO_SECURE: bool = os.getenv("MINIO_SECURE", "False").lower() == "true"
+    MINIO_REGION: str = os.getenv("MINIO_REGION", "us-east-1")
+    # Адрес хранилища, видимый клиентам (для presigned URL и ссылок на файлы)
+    MINIO_PUBLIC_ENDPOINT: str = os.getenv("MINIO_PUBLIC_ENDPOINT", MINIO_ENDPOINT)
+    MINIO_PUBLIC_SECURE: bool = os.getenv("MINIO_PUBLIC_SECURE", str(MINIO_SECURE)).lower() == "true"
+    # Загрузка через приложение: размер части multipart (не меньше 5 MiB) и число частей параллельно
+    MINIO_PART_SIZE: int = int(os.getenv("MINIO_PART_SIZE", 10 * 1024 * 1024))
+    MINIO_PARALLEL_UPLOADS: int = int(os.getenv("MINIO_PARALLEL_UPLOADS", 4))
+    # Время жизни presigned URL для прямой загрузки фото, в секундах
+    PHOTO_UPLOAD_URL_EXPIRES: int = int(os.getenv("PHOTO_UPLOAD_URL_EXPIRES", 300))
     
     # Email
     SMTP_HOST: str = os.getenv("SMTP_HOST", "")
@@ -60,13 +159,29 @@ class Settings(BaseSettings):
     @property
     def DATABASE_URI(self) -> str:
         """Динамически генерируем DATABASE_URI"""
-        user_escaped = quote_plus(self.DB_USER)
-        password_escaped = quote_plus(self.DB_PASSWORD) if self.DB_PASSWORD else ""
-        
+        return self._build_database_uri(self.DB_USER, self.DB_PASSWORD, self.DB_HOST, self.DB_PORT)
+
+    @property
+    def DATABASE_READ_URI(self) -> Optional[str]:
+        """DSN read-реплики или None, если реплика не настроена"""
+        if not self.DB_READ_HOST:
+            return None
+
+        return self._build_database_uri(
+            self.DB_READ_USER or self.DB_USER,
+            self.DB_READ_PASSWORD or self.DB_PASSWORD,
+            self.DB_READ_HOST,
+            self.DB_READ_PORT or self.DB_PORT,
+        )
+
+    def _build_database_uri(self, user: str, password: str, host: str, port: str) -> str:
+        user_escaped = quote_plus(user)
+        password_escaped = quote_plus(password) if password else ""
+
         if password_escaped:
-            return f"postgresql+asyncpg://{user_escaped}:{password_escaped}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+            return f"postgresql+asyncpg://{user_escaped}:{password_escaped}@{host}:{port}/{self.DB_NAME}"
         else:
-            return f"postgresql+asyncpg://{user_escaped}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+            return f"postgresql+asyncpg://{user_escaped}@{host}:{port}/{self.DB_NAME}"
     
     model_config = SettingsConfigDict(
         case_sensitive=True,
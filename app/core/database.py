@@ -1,7 +1,30 @@
+import functools
+import hashlib
+import logging
+import re
+import time
+import uuid
+from typing import Optional
+from sqlalchemy import event, exc
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.pool import NullPool
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import ORMExecuteState, Session, sessionmaker, declarative_base
+from starlette.requests import HTTPConnection
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from .cache import TTLCache
 from .config import settings
+from .monitoring import (
+    DB_POOL_SIZE,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_OVERFLOW,
+    DB_POOL_ACQUIRE_LATENCY,
+    DB_POOL_TIMEOUTS,
+    DB_STATEMENT_LATENCY,
+    DB_SLOW_QUERIES,
+    request_query_counter,
+)
+
+logger = logging.getLogger(__name__)
 
 # Определяем Base
 Base = declarative_base()
@@ -12,22 +35,318 @@ database_url = settings.DATABASE_URI
 if not database_url:
     raise ValueError("DATABASE_URI is not set in the configuration.")
 
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, который публикует метрики занятости и времени ожидания"""
+
+    pool_label = "primary"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        DB_POOL_SIZE.labels(pool=self.pool_label).set(self.size())
+
+    def connect(self):
+        start_time = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(pool=self.pool_label).inc()
+            raise
+        finally:
+            DB_POOL_ACQUIRE_LATENCY.labels(pool=self.pool_label).observe(time.perf_counter() - start_time)
+        self._update_gauges()
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        DB_POOL_CHECKED_OUT.labels(pool=self.pool_label).set(self.checkedout())
+        # До заполнения пула overflow() отрицательный
+        DB_POOL_OVERFLOW.labels(pool=self.pool_label).set(max(self.overflow(), 0))
+
+
+@functools.lru_cache(maxsize=None)
+def _labeled_pool_class(pool_label: str):
+    """Подкласс пула с собственной меткой в метриках (переживает engine.dispose())"""
+    return type(f"{pool_label.title()}QueuePool", (InstrumentedQueuePool,), {"pool_label": pool_label})
+
+
+def _unique_statement_name() -> str:
+    return f"__asyncpg_{uuid.uuid4()}__"
+
+
+def _unnamed_statement() -> str:
+    # Пустое имя - безымянный statement, живет только в текущей транзакции
+    return ""
+
+
+def get_connect_args(config=settings) -> dict:
+    """Аргументы asyncpg в зависимости от DB_ENGINE_PROFILE"""
+    if config.DB_ENGINE_PROFILE == "direct":
+        return {"prepared_statement_cache_size": config.DB_PREPARED_STATEMENT_CACHE_SIZE}
+
+    if config.DB_ENGINE_PROFILE != "pgbouncer":
+        raise ValueError(f"Unknown DB_ENGINE_PROFILE: {config.DB_ENGINE_PROFILE}")
+
+    # В transaction pooling соседние транзакции попадают на разные серверные
+    # соединения, поэтому имена statements не должны пересекаться,
+    # а собственный кеш asyncpg отключаем
+    connect_args = {"statement_cache_size": 0}
+
+    if config.DB_PREPARED_STATEMENT_NAMES == "unique":
+        connect_args["prepared_statement_name_func"] = _unique_statement_name
+        connect_args["prepared_statement_cache_size"] = config.DB_PREPARED_STATEMENT_CACHE_SIZE
+    elif config.DB_PREPARED_STATEMENT_NAMES == "disabled":
+        connect_args["prepared_statement_name_func"] = _unnamed_statement
+        connect_args["prepared_statement_cache_size"] = 0
+    else:
+        raise ValueError(f"Unknown DB_PREPARED_STATEMENT_NAMES: {config.DB_PREPARED_STATEMENT_NAMES}")
+
+    return connect_args
+
+
+def get_engine_options(config=settings, pool_label: str = "primary") -> dict:
+    """Параметры create_async_engine в зависимости от DB_POOL_MODE и DB_ENGINE_PROFILE"""
+    connect_args = get_connect_args(config)
+
+    if config.DB_POOL_MODE == "null":
+        return {"poolclass": NullPool, "connect_args": connect_args}
+
+    if config.DB_POOL_MODE != "queue":
+        raise ValueError(f"Unknown DB_POOL_MODE: {config.DB_POOL_MODE}")
+
+    return {
+        "poolclass": _labeled_pool_class(pool_label),
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "connect_args": connect_args,
+    }
+
+
+# Первая таблица, с которой работает запрос, по операции
+_STATEMENT_TABLE_PATTERNS = {
+    "select": re.compile(r"\bfrom\s+([\w.\"]+)", re.IGNORECASE),
+    "with": re.compile(r"\bfrom\s+([\w.\"]+)", re.IGNORECASE),
+    "insert": re.compile(r"^\s*insert\s+into\s+([\w.\"]+)", re.IGNORECASE),
+    "update": re.compile(r"^\s*update\s+([\w.\"]+)", re.IGNORECASE),
+    "delete": re.compile(r"^\s*delete\s+from\s+([\w.\"]+)", re.IGNORECASE),
+}
+
+# Сколько символов параметров попадает в лог медленного запроса
+SLOW_QUERY_PARAMETERS_LIMIT = 1000
+
+
+@functools.lru_cache(maxsize=2048)
+def normalize_statement(statement: str) -> str:
+    """
+    Метка запроса для метрик: операция и первая таблица ("select users").
+    Число меток ограничено операциями и таблицами и не зависит от значений
+    """
+    words = statement.split(None, 1)
+    operation = words[0].lower() if words else ""
+    if not operation.isalpha():
+        return "other"
+    pattern = _STATEMENT_TABLE_PATTERNS.get(operation)
+    match = pattern.search(statement) if pattern is not None else None
+    if match is None:
+        return operation
+    table = match.group(1).replace('"', "").lower()
+    return f"{operation} {table}"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Стек, а не одно значение: запрос может выполняться внутри обработчика другого
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start_time"].pop()
+    label = normalize_statement(statement)
+    DB_STATEMENT_LATENCY.labels(statement=label).observe(duration)
+
+    query_counter = request_query_counter.get()
+    if query_counter is not None:
+        query_counter.count += 1
+
+    if 0 < settings.DB_SLOW_QUERY_SECONDS <= duration:
+        DB_SLOW_QUERIES.labels(statement=label).inc()
+        _log_slow_query(conn, statement, parameters, context, executemany, duration)
+
+
+def _handle_error(exception_context):
+    # Запрос упал: after_cursor_execute не вызовется, снимаем его время со стека
+    if exception_context.cursor is not None and exception_context.connection is not None:
+        start_times = exception_context.connection.info.get("query_start_time")
+        if start_times:
+            start_times.pop()
+
+
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    """
+    План запроса без выполнения (EXPLAIN без ANALYZE). Идет через отдельный курсор
+    DBAPI мимо событий движка, в точке сохранения: ошибка не ломает транзакцию
+    """
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(f"EXPLAIN {statement}", parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            plan = f"EXPLAIN failed: {e}"
+        cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+    except Exception:
+        logger.exception("Failed to explain slow query")
+        return None
+    finally:
+        cursor.close()
+
+
+def _log_slow_query(conn, statement, parameters, context, executemany, duration):
+    parameters_repr = repr(parameters)
+    if len(parameters_repr) > SLOW_QUERY_PARAMETERS_LIMIT:
+        parameters_repr = parameters_repr[:SLOW_QUERY_PARAMETERS_LIMIT] + "..."
+    message = f"Slow query ({duration * 1000:.1f} ms): {statement}\nParameters: {parameters_repr}"
+
+    # Планируем только одиночные SELECT: executemany и серверные курсоры
+    # (stream) нельзя безопасно повторить на том же соединении
+    stream_results = context is not None and context.execution_options.get("stream_results", False)
+    if (
+        settings.DB_SLOW_QUERY_EXPLAIN
+        and not executemany
+        and not stream_results
+        and normalize_statement(statement).split(" ", 1)[0] in ("select", "with")
+    ):
+        plan = _explain(conn, statement, parameters)
+        if plan is not None:
+            message += f"\nPlan:\n{plan}"
+    logger.warning(message)
+
+
+def instrument_engine(target: Engine) -> None:
+    """Подключает к движку метрики запросов и лог медленных запросов"""
+    if event.contains(target, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+    event.listen(target, "handle_error", _handle_error)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _guard_lazy_load(orm_execute_state: ORMExecuteState):
+    """
+    В строгом режиме (DB_STRICT_LAZY_LOAD, тесты) ленивая загрузка связи - ошибка:
+    в async она либо падает с MissingGreenlet, либо молча делает N+1.
+    Связи нужно загружать явно (selectinload/joinedload)
+    """
+    if not settings.DB_STRICT_LAZY_LOAD or not orm_execute_state.is_select:
+        return
+    state = orm_execute_state.lazy_loaded_from
+    if state is not None:
+        raise exc.InvalidRequestError(
+            f"Lazy load from {state.class_.__name__} is disabled (DB_STRICT_LAZY_LOAD); "
+            "load the relationship explicitly"
+        )
+
+
 engine = create_async_engine(
     database_url,
     echo=False,
     future=True,
-    poolclass=NullPool,
+    **get_engine_options(),
 )
 
+
+instrument_engine(engine.sync_engine)
+
+
+class PrimarySession(Session):
+    """Сессия основной БД: после коммита включает read-your-writes для автора записи"""
+
+
 AsyncSessionLocal = sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
+    engine, class_=AsyncSession, expire_on_commit=False, sync_session_class=PrimarySession
 )
 
-async def get_db():
+# Read-реплика. Без DB_READ_HOST чтение идет через основной движок
+read_database_url = settings.DATABASE_READ_URI
+
+if read_database_url:
+    read_engine = create_async_engine(
+        read_database_url,
+        echo=False,
+        future=True,
+        **get_engine_options(pool_label="replica"),
+    )
+    instrument_engine(read_engine.sync_engine)
+else:
+    read_engine = engine
+
+AsyncReadSessionLocal = sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+# Ключи клиентов, недавно писавших в основную БД. Хранятся в памяти процесса,
+# поэтому между воркерами read-your-writes не гарантируется
+_recent_writers = TTLCache(maxsize=100_000, ttl=settings.DB_READ_STICKY_SECONDS)
+
+
+def get_sticky_key(connection: HTTPConnection) -> Optional[str]:
+    """Идентификатор клиента для read-your-writes: хеш заголовка Authorization"""
+    authorization = connection.headers.get("authorization")
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _remember_writer(session):
+    sticky_key = session.info.get("sticky_key")
+    if sticky_key:
+        _recent_writers.set(sticky_key, True)
+
+
+def get_read_sessionmaker(sticky_key: Optional[str] = None):
+    """Реплика, если она настроена и клиент недавно не писал в основную БД"""
+    if read_engine is engine:
+        return AsyncSessionLocal
+    if sticky_key and sticky_key in _recent_writers:
+        return AsyncSessionLocal
+    return AsyncReadSessionLocal
+
+
+async def get_db(connection: HTTPConnection):
     async with AsyncSessionLocal() as session:
+        session.info["sticky_key"] = get_sticky_key(connection)
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+async def get_read_db(connection: HTTPConnection):
+    """Сессия для read-only эндпоинтов: read-реплика с учетом read-your-writes"""
+    session_maker = get_read_sessionmaker(get_sticky_key(connection))
+    async with session_maker() as session:
         try:
             yield session
         finally:
             await session.close()
 
-__all__ = ["Base", "engine", "AsyncSessionLocal", "get_db"]
\ No newline at end of file
+__all__ = [
+    "Base",
+    "engine",
+    "read_engine",
+    "AsyncSessionLocal",
+    "AsyncReadSessionLocal",
+    "get_db",
+    "get_read_db",
+    "instrument_engine",
+]
@@ -20,5 +20,7 @@ def setup_logging():
     )
 
     logging.getLogger('sqlalchemy').setLevel(logging.WARNING)
+    # Собственные классы пулов логируют под именем своего модуля
+    logging.getLogger('core.database').setLevel(logging.WARNING)
     logging.getLogger('uvicorn').setLevel(logging.INFO)
     logging.getLogger('fastapi').setLevel(logging.INFO)
\ No newline at end of file
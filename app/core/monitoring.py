@@ -1,6 +1,10 @@
-from prometheus_client import Counter, Histogram, generate_latest, REGISTRY
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, REGISTRY
 from prometheus_client.openmetrics.exposition import CONTENT_TYPE_LATEST
 from fastapi import Request, Response
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from contextvars import ContextVar
+from typing import Optional
 import time
 
 # Метрики для HTTP запросов
@@ -16,6 +20,19 @@ REQUEST_LATENCY = Histogram(
     ['method', 'endpoint']
 )
 
+REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress',
+    'Number of HTTP requests currently being processed',
+    ['method']
+)
+
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'HTTP response body size in bytes',
+    ['method', 'endpoint'],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+)
+
 # Метрики для бизнес-логики
 USER_REGISTRATION_COUNT = Counter(
     'user_registrations_total',
@@ -32,25 +49,262 @@ MESSAGE_SENT_COUNT = Counter(
     'Total number of messages sent'
 )
 
+# Метрики пула соединений с БД
+DB_POOL_SIZE = Gauge(
+    'db_pool_size',
+    'Configured size of the database connection pool',
+    ['pool']
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out_connections',
+    'Number of database connections currently checked out of the pool',
+    ['pool']
+)
+
+DB_POOL_OVERFLOW = Gauge(
+    'db_pool_overflow_connections',
+    'Number of overflow connections currently open above the pool size',
+    ['pool']
+)
+
+DB_POOL_ACQUIRE_LATENCY = Histogram(
+    'db_pool_acquire_duration_seconds',
+    'Time spent waiting for a database connection from the pool',
+    ['pool'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+DB_POOL_TIMEOUTS = Counter(
+    'db_pool_acquire_timeouts_total',
+    'Total number of times acquiring a database connection timed out',
+    ['pool']
+)
+
+# Метрики SQL-запросов (события движка, см. core.database)
+DB_STATEMENT_LATENCY = Histogram(
+    'db_statement_duration_seconds',
+    'Database statement execution time by normalized statement',
+    ['statement'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+DB_SLOW_QUERIES = Counter(
+    'db_slow_queries_total',
+    'Total number of statements slower than DB_SLOW_QUERY_SECONDS',
+    ['statement']
+)
+
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request',
+    'Number of database statements executed per HTTP request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+
+# Метрики кеша аутентифицированных пользователей
+PRINCIPAL_CACHE_REQUESTS = Counter(
+    'principal_cache_requests_total',
+    'Principal cache lookups by tier and result',
+    ['tier', 'result']
+)
+
+# Метрики кеша проверенных JWT
+JWT_DECODE_CACHE_REQUESTS = Counter(
+    'jwt_decode_cache_requests_total',
+    'Verified JWT cache lookups by result',
+    ['result']
+)
+
+# Метрики хеширования паролей
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    'password_hash_queue_depth',
+    'Number of requests waiting for a free password hashing slot'
+)
+
+PASSWORD_HASH_LATENCY = Histogram(
+    'password_hash_duration_seconds',
+    'Time spent hashing or verifying a password in the executor',
+    ['operation'],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0)
+)
+
+PASSWORD_HASH_REJECTED = Counter(
+    'password_hash_rejected_total',
+    'Requests rejected because no password hashing slot freed up before the deadline'
+)
+
+# Метрики обработки изображений
+IMAGE_PROCESSING_QUEUE_DEPTH = Gauge(
+    'image_processing_queue_depth',
+    'Number of uploads waiting for a free image processing slot'
+)
+
+IMAGE_PROCESSING_LATENCY = Histogram(
+    'image_processing_duration_seconds',
+    'Time spent decoding an image and building its thumbnail in the process pool',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+IMAGE_REJECTED = Counter(
+    'image_rejected_total',
+    'Image uploads rejected before upload to storage',
+    ['reason']
+)
+
+PHOTO_UPLOADS = Counter(
+    'photo_uploads_total',
+    'Processed photo uploads: new content or a duplicate of an already stored file',
+    ['result']
+)
+
+PHOTO_UPLOAD_LATENCY = Histogram(
+    'photo_upload_duration_seconds',
+    'Time to store a photo uploaded through the API, by new or duplicate content',
+    ['result'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+PHOTO_DEDUP_SAVED_BYTES = Counter(
+    'photo_dedup_saved_bytes_total',
+    'Bytes not stored because an upload duplicated an existing file'
+)
+
+IMAGE_VARIANT_REQUESTS = Counter(
+    'image_variant_requests_total',
+    'Photo variant requests by outcome: hit (already stored), rendered, coalesced (waited for a render in progress)',
+    ['result']
+)
+
+# Метрики счетчиков непрочитанных уведомлений
+UNREAD_COUNTER_REQUESTS = Counter(
+    'unread_counter_requests_total',
+    'Unread notification counter reads by result',
+    ['result']
+)
+
+UNREAD_COUNTER_CORRECTIONS = Counter(
+    'unread_counter_corrections_total',
+    'Unread notification counters corrected by reconciliation with the database'
+)
+
+# Метрики write-behind буферов (BatchWriter)
+BATCH_WRITER_SIZE = Histogram(
+    'batch_writer_batch_size',
+    'Number of items written per batch',
+    ['writer'],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+BATCH_WRITER_FLUSH_LATENCY = Histogram(
+    'batch_writer_flush_duration_seconds',
+    'Time spent writing one batch',
+    ['writer'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+BATCH_WRITER_FAILURES = Counter(
+    'batch_writer_failures_total',
+    'Batches that failed to be written',
+    ['writer']
+)
+
+# Метрики WebSocket
+WS_CONNECTIONS = Gauge(
+    'websocket_connections',
+    'Open WebSocket connections on this worker'
+)
+
+WS_SEND_QUEUE_FRAMES = Gauge(
+    'websocket_send_queue_frames',
+    'Outbound frames waiting in WebSocket send queues on this worker'
+)
+
+WS_DROPPED_FRAMES = Counter(
+    'websocket_dropped_frames_total',
+    'Outbound WebSocket frames dropped because of a slow consumer',
+    ['type', 'reason']
+)
+
+WS_SLOW_CONSUMER_DISCONNECTS = Counter(
+    'websocket_slow_consumer_disconnects_total',
+    'WebSocket connections closed because the client could not keep up'
+)
+
 # Middleware для сбора метрик
-async def metrics_middleware(request: Request, call_next):
-    start_time = time.time()
-    method = request.method
-    endpoint = request.url.path
-    
-    try:
-        response = await call_next(request)
-        status_code = response.status_code
-    except Exception as e:
+# Метка для запросов, не совпавших ни с одним маршрутом (404, сканеры):
+# иначе каждый случайный путь стал бы отдельным временным рядом
+UNMATCHED_ENDPOINT = "unmatched"
+
+def _route_template(scope: Scope) -> str:
+    """Шаблон совпавшего маршрута (/api/v1/places/{place_id}), а не сам путь"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "endpoint" not in scope:
+        return UNMATCHED_ENDPOINT
+    # Маршруты Starlette (/metrics, /docs) не кладут себя в scope: ищем по списку
+    app = scope.get("app")
+    for candidate in getattr(app, "routes", ()):
+        match, _ = candidate.matches(scope)
+        if match != Match.NONE:
+            return candidate.path
+    return UNMATCHED_ENDPOINT
+
+class QueryCounter:
+    """Счетчик SQL-запросов текущего HTTP-запроса"""
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+# Устанавливается middleware на время запроса; события движка выполняются
+# в том же контексте, что и код, вызвавший запрос к БД
+request_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("request_query_counter", default=None)
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware для метрик HTTP-запросов. В отличие от @app.middleware("http")
+    не оборачивает запрос и ответ в объекты Starlette и не буферизует тело
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
         status_code = 500
-        raise e
-    finally:
-        latency = time.time() - start_time
-        REQUEST_COUNT.labels(method=method, endpoint=endpoint, http_status=status_code).inc()
-        REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(latency)
-    
-    return response
+        response_size = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method=method)
+        in_progress.inc()
+        query_counter = QueryCounter()
+        counter_token = request_query_counter.set(query_counter)
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            latency = time.perf_counter() - start_time
+            in_progress.dec()
+            request_query_counter.reset(counter_token)
+            # Маршрут известен только после обработки: роутер дописывает его в scope
+            endpoint = _route_template(scope)
+            REQUEST_COUNT.labels(method=method, endpoint=endpoint, http_status=status_code).inc()
+            REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(latency)
+            RESPONSE_SIZE.labels(method=method, endpoint=endpoint).observe(response_size)
+            DB_QUERIES_PER_REQUEST.labels(endpoint=endpoint).observe(query_counter.count)
 
 # Эндпоинт для сбора метрик
-async def metrics_endpoint():
+async def metrics_endpoint(request: Request):
     return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
@@ -0,0 +1,77 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import tuple_
+
+# Заголовок с курсором следующей страницы; отсутствует на последней странице
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+_DECODERS = {
+    datetime: datetime.fromisoformat,
+    UUID: UUID,
+    float: float,
+    int: int,
+    str: str,
+}
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Непрозрачный курсор из значений ключа сортировки последней строки"""
+    raw = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Tuple:
+    """Разбирает курсор, приводя значения к types; 400 при некорректном курсоре"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("cursor arity mismatch")
+        return tuple(_DECODERS[value_type](value) for value_type, value in zip(types, values))
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def after_cursor(columns: Sequence[Any], values: Optional[Sequence[Any]], descending: bool = True):
+    """
+    Условие keyset-пагинации: строки строго после курсора при сортировке
+    по columns (по умолчанию по убыванию). None, если курсора нет
+    """
+    if values is None:
+        return None
+    if descending:
+        return tuple_(*columns) < tuple_(*values)
+    return tuple_(*columns) > tuple_(*values)
+
+
+def paginate(items: Sequence[Any], limit: int, key: Callable[[Any], Sequence[Any]]) -> Tuple[List[Any], Optional[str]]:
+    """
+    Обрезает выборку из limit + 1 строк до limit и возвращает курсор
+    следующей страницы (None, если строк больше нет)
+    """
+    items = list(items)
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(key(items[-1]))
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]) -> None:
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
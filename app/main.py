@@ -1,23 +1,47 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from core.monitoring import metrics_middleware, metrics_endpoint
+from core.monitoring import PrometheusMiddleware, metrics_endpoint
 from core.config import settings
+from core.pagination import NEXT_CURSOR_HEADER
 from api import api_router
 from core.logging import setup_logging
 from sqlalchemy import text
 from fastapi import HTTPException
-from core.database import engine
+from core.database import engine, read_engine, AsyncSessionLocal
+from services.auth_service import shutdown_password_executor
+from services.image_service import shutdown_image_executor
+from services.message_service import message_writer
+from services.notification_service import notification_writer, run_unread_counter_reconciler
+from services.redis_service import redis_client
+from services.websocket_manager import manager as websocket_manager
 
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 setup_logging()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup logic
+    reconciler = asyncio.create_task(
+        run_unread_counter_reconciler(AsyncSessionLocal, settings.UNREAD_COUNTER_RECONCILE_INTERVAL)
+    )
     yield
     # Shutdown logic
+    reconciler.cancel()
+    with suppress(asyncio.CancelledError):
+        await reconciler
+    # Дописываем буферы записи, пока движок БД еще открыт. Сообщения первыми:
+    # их запись ставит в очередь уведомления
+    await message_writer.flush()
+    await notification_writer.flush()
+    await websocket_manager.close()
+    shutdown_password_executor()
+    shutdown_image_executor()
+    await redis_client.close()
     await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
 
 app = FastAPI(
     title="Urban Places Social App",
@@ -36,12 +60,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
-# Metrics middleware
-@app.middleware("http")
-async def metrics_middleware_wrapper(request, call_next):
-    return await metrics_middleware(request, call_next)
+# Metrics middleware (добавлен последним - внешний, учитывает и ответы CORS)
+app.add_middleware(PrometheusMiddleware)
 app.add_route("/metrics", metrics_endpoint)
 
 # Include API routes
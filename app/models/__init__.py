@@ -2,17 +2,18 @@ from core.database import Base
 from .user import User
 from .place import Place
 from .review import Review
-from .photo import Photo
+from .photo import Photo, PhotoBlob
 from .route import Route
 from .collection import Collection, CollectionRoute
 from .reaction import Reaction
-from .friend import FriendRequest, FriendStatus
+from .friend import FriendRequest, FriendStatus, Friendship
 from .message import Message
+from .conversation import Conversation
 from .notification import Notification, NotificationType
 
 __all__ = [
-    "Base", "User", "Place", "Review", "Photo", 
+    "Base", "User", "Place", "Review", "Photo", "PhotoBlob",
     "Route", "Collection", "CollectionRoute", "Reaction",
-    "FriendRequest", "FriendStatus", "Message", 
+    "FriendRequest", "FriendStatus", "Friendship", "Message", "Conversation",
     "Notification", "NotificationType"
 ]
\ No newline at end of file
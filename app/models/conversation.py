@@ -0,0 +1,48 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, func, Index, UniqueConstraint, CheckConstraint
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+from core.database import Base
+
+class Conversation(Base):
+    """
+    Переписка двух пользователей. Пара хранится в каноническом порядке
+    (user_low_id <= user_high_id), поэтому у каждой пары ровно одна строка
+    """
+    __tablename__ = "conversations"
+    __table_args__ = (
+        UniqueConstraint("user_low_id", "user_high_id", name="uq_conversations_pair"),
+        CheckConstraint("user_low_id <= user_high_id", name="ck_conversations_pair_order"),
+        # Inbox каждого из участников, последние переписки первыми
+        Index("ix_conversations_low_last_message", "user_low_id", "last_message_at", "id"),
+        Index("ix_conversations_high_last_message", "user_high_id", "last_message_at", "id"),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_low_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_high_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    
+    # Последнее сообщение, чтобы inbox не читал таблицу messages
+    last_message_id = Column(UUID(as_uuid=True))
+    last_sender_id = Column(UUID(as_uuid=True))
+    last_message_preview = Column(String(100))
+    last_message_at = Column(DateTime, server_default=func.now(), nullable=False)
+    
+    # Непрочитанные сообщения для каждого из участников
+    unread_low = Column(Integer, default=0, server_default="0", nullable=False)
+    unread_high = Column(Integer, default=0, server_default="0", nullable=False)
+    
+    created_at = Column(DateTime, server_default=func.now())
+    
+    @staticmethod
+    def pair(user_a, user_b):
+        """Канонический порядок пары пользователей"""
+        return (user_a, user_b) if user_a < user_b else (user_b, user_a)
+    
+    def peer_of(self, user_id):
+        return self.user_high_id if user_id == self.user_low_id else self.user_low_id
+    
+    def unread_for(self, user_id) -> int:
+        return self.unread_low if user_id == self.user_low_id else self.unread_high
+    
+    def __repr__(self):
+        return f"<Conversation {self.user_low_id} <-> {self.user_high_id}>"
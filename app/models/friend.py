@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, func, Boolean, Enum
+from sqlalchemy import Column, String, DateTime, ForeignKey, func, Boolean, Enum, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -26,4 +26,22 @@ class FriendRequest(Base):
     receiver = relationship("User", foreign_keys=[receiver_id], backref="received_requests")
     
     def __repr__(self):
-        return f"<FriendRequest {self.sender_id} -> {self.receiver_id}: {self.status}>"
\ No newline at end of file
+        return f"<FriendRequest {self.sender_id} -> {self.receiver_id}: {self.status}>"
+
+class Friendship(Base):
+    """
+    Симметричная таблица смежности друзей: на каждую пару две строки
+    (user_id -> friend_id и обратно), поэтому список друзей - диапазон по индексу
+    """
+    __tablename__ = "friendships"
+    __table_args__ = (
+        # Список друзей, новые первыми (keyset-пагинация)
+        Index("ix_friendships_user_created_at", "user_id", "created_at", "friend_id"),
+    )
+    
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    friend_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<Friendship {self.user_id} -> {self.friend_id}>"
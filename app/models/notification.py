@@ -1,4 +1,4 @@
-from sqlalchemy import JSON, Column, String, DateTime, ForeignKey, func, Boolean, Text, Enum
+from sqlalchemy import JSON, Column, String, DateTime, ForeignKey, func, Boolean, Text, Enum, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 import uuid
@@ -15,6 +15,9 @@ class NotificationType(enum.Enum):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_created_at", "user_id", "created_at", "id"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
@@ -1,27 +1,50 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, func, Boolean
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, ForeignKey, func, Boolean
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
 from core.database import Base
 
+class PhotoBlob(Base):
+    """
+    Загруженный файл, общий для всех фото с одинаковым содержимым (по SHA-256).
+    ref_count - число ссылающихся фото; при нуле объекты удаляются из хранилища
+    """
+    __tablename__ = "photo_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    object_name = Column(String(255), nullable=False)
+    thumbnail_object_name = Column(String(255), nullable=False)
+    content_type = Column(String(50), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    # Перцептивный хеш (dHash превью): близок у пережатых копий одного снимка
+    phash = Column(BigInteger)
+    ref_count = Column(Integer, nullable=False, default=1)
+
+    created_at = Column(DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"<PhotoBlob {self.sha256[:12]} refs={self.ref_count}>"
+
 class Photo(Base):
     __tablename__ = "photos"
-    
+
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     place_id = Column(UUID(as_uuid=True), ForeignKey("places.id"), nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    
+    # NULL у фото, загруженных до дедупликации, и у прямых загрузок до обработки
+    blob_sha256 = Column(String(64), ForeignKey("photo_blobs.sha256"), index=True)
+
     filename = Column(String(255), nullable=False)
     original_url = Column(String(500), nullable=False)
     thumbnail_url = Column(String(500))
     description = Column(String(500))
     is_public = Column(Boolean, default=True)
-    
+
     created_at = Column(DateTime, server_default=func.now())
-    
+
     # Relationships
     place = relationship("Place", back_populates="photos")
     user = relationship("User", backref="photos")
-    
+
     def __repr__(self):
-        return f"<Photo {self.filename}>"
\ No newline at end of file
+        return f"<Photo {self.filename}>"
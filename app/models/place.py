@@ -1,11 +1,38 @@
-from sqlalchemy import JSON, Column, String, Text, Boolean, DateTime, ForeignKey, func, ARRAY, Float
-from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy import JSON, Column, String, Text, Boolean, DateTime, ForeignKey, func, ARRAY, Float, Integer, Computed, Index, DDL, event
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 import uuid
 from core.database import Base
 
+# Сетка для пространственного индекса: ячейки GEO_CELL_SIZE градусов,
+# номер ячейки = строка (широта) * GEO_CELL_COLUMNS + столбец (долгота)
+GEO_CELLS_PER_DEGREE = 10
+GEO_CELL_ROWS = 180 * GEO_CELLS_PER_DEGREE
+GEO_CELL_COLUMNS = 360 * GEO_CELLS_PER_DEGREE
+GEO_CELL_SQL = (
+    f"least(floor((latitude + 90) * {GEO_CELLS_PER_DEGREE}), {GEO_CELL_ROWS - 1})::integer * {GEO_CELL_COLUMNS}"
+    f" + least(floor((longitude + 180) * {GEO_CELLS_PER_DEGREE}), {GEO_CELL_COLUMNS - 1})::integer"
+)
+
+# array_to_string помечена STABLE, а выражение generated column должно быть
+# IMMUTABLE, поэтому теги склеиваются через собственную функцию
+PLACES_TAGS_TO_TEXT_SQL = (
+    "CREATE OR REPLACE FUNCTION places_tags_to_text(tags varchar[]) RETURNS text "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$ SELECT array_to_string(tags, ' ') $$"
+)
+PLACE_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(places_tags_to_text(tags), '')), 'B') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(description, '')), 'C') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(address, '')), 'D')"
+)
+
 class Place(Base):
     __tablename__ = "places"
+    __table_args__ = (
+        Index("ix_places_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_places_created_at_id", "created_at", "id"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(255), nullable=False)
@@ -13,6 +40,8 @@ class Place(Base):
     address = Column(String(500))
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+    # Вычисляется PostgreSQL из координат, см. services/geo_service.py
+    geo_cell = Column(Integer, Computed(GEO_CELL_SQL, persisted=True), index=True)
     type = Column(String(100))  # restaurant, park, museum, etc.
     tags = Column(ARRAY(String(100)))
     metadata_info = Column(JSONB().with_variant(JSON, 'sqlite'))  # additional flexible data
@@ -20,6 +49,9 @@ class Place(Base):
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     is_public = Column(Boolean, default=True)
     is_verified = Column(Boolean, default=False)  # admin verified
+
+    # Вычисляется PostgreSQL; не загружается вместе с местом
+    search_vector = deferred(Column(TSVECTOR, Computed(PLACE_SEARCH_VECTOR_SQL, persisted=True)))
     
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -30,4 +62,6 @@ class Place(Base):
     photos = relationship("Photo", back_populates="place", cascade="all, delete")
     
     def __repr__(self):
-        return f"<Place {self.name}>"
\ No newline at end of file
+        return f"<Place {self.name}>"
+
+event.listen(Place.__table__, "before_create", DDL(PLACES_TAGS_TO_TEXT_SQL).execute_if(dialect="postgresql"))
\ No newline at end of file
@@ -1,10 +1,21 @@
-from sqlalchemy import JSON, Column, String, Boolean, DateTime, func, Text
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import JSON, Column, String, Boolean, DateTime, func, Text, Computed, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
+from sqlalchemy.orm import deferred
 import uuid
 from core.database import Base
 
+# Полнотекстовый поиск: username весомее имени и фамилии
+USER_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(username, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(first_name, '') || ' ' || coalesce(last_name, '')), 'B')"
+)
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = Column(String(255), unique=True, nullable=True)  # Может быть null для OAuth
@@ -39,6 +50,9 @@ class User(Base):
     privacy_policy_accepted = Column(Boolean, default=False)
     marketing_consent = Column(Boolean, default=False)
 
+    # Вычисляется PostgreSQL; не загружается вместе с пользователем
+    search_vector = deferred(Column(TSVECTOR, Computed(USER_SEARCH_VECTOR_SQL, persisted=True)))
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # Убедимся, что Boolean поля имеют значения по умолчанию
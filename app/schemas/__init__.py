@@ -15,7 +15,7 @@ from .friend import (
     FriendRequestResponse,
     FriendRequestUpdate
 )
-from .message import MessageBase, MessageCreate, MessageResponse
+from .message import MessageBase, MessageCreate, MessageResponse, ConversationResponse
 from .notification import (
     NotificationBase,
     NotificationCreate,
@@ -45,6 +45,7 @@ __all__ = [
     "MessageBase",
     "MessageCreate",
     "MessageResponse",
+    "ConversationResponse",
     "NotificationBase",
     "NotificationCreate",
     "NotificationResponse",
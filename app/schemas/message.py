@@ -18,4 +18,13 @@ class MessageResponse(BaseModel):
     is_read: bool
     created_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class ConversationResponse(BaseModel):
+    id: UUID
+    peer_id: UUID
+    last_message_id: Optional[UUID] = None
+    last_sender_id: Optional[UUID] = None
+    last_message_preview: Optional[str] = None
+    last_message_at: datetime
+    unread_count: int
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
 from typing import Optional, Any
 from uuid import UUID
 from datetime import datetime
@@ -17,6 +17,8 @@ class NotificationCreate(NotificationBase):
 
 class NotificationResponse(NotificationBase):
     id: UUID
+    # В модели колонка metadata_info: атрибут metadata у нее - MetaData декларативной базы
+    metadata: Optional[dict] = Field(default=None, validation_alias=AliasChoices("metadata_info", "metadata"))
     user_id: UUID
     is_read: bool
     created_at: datetime
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import Literal, Optional
 from uuid import UUID
 from datetime import datetime
 
@@ -19,4 +19,15 @@ class PhotoResponse(PhotoBase):
     thumbnail_url: Optional[str] = None
     created_at: datetime
     
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class PhotoUploadRequest(BaseModel):
+    content_type: Literal["image/jpeg", "image/png", "image/webp", "image/gif"]
+
+class PhotoUploadResponse(BaseModel):
+    upload_url: str
+    object_name: str
+    expires_in: int
+
+class PhotoConfirm(PhotoBase):
+    object_name: str
@@ -1,7 +1,10 @@
 from .auth_service import (
     verify_password,
     hash_password,
+    verify_password_async,
+    hash_password_async,
     generate_salt,
+    decode_access_token,
     authenticate_user,
     authenticate_user_by_username,
     create_access_token,
@@ -15,20 +18,25 @@ from .minio_service import MinioClient, minio_client
 from .image_service import process_and_upload_image
 from .notification_service import (
     create_notification,
+    create_notifications,
+    enqueue_notification,
     get_user_notifications,
     mark_notification_as_read,
     mark_all_notifications_as_read
 )
 from .search_service import (
-    search_users,
-    search_places,
-    global_search
+    search_users_payload,
+    search_places_payload,
+    global_search_payload
 )
 
 __all__ = [
     # Auth
     "verify_password",
     "hash_password",
+    "verify_password_async",
+    "hash_password_async",
+    "decode_access_token",
     "generate_salt",
     "authenticate_user",
     "authenticate_user_by_username",
@@ -48,12 +56,14 @@ __all__ = [
     
     # Notifications
     "create_notification",
+    "create_notifications",
+    "enqueue_notification",
     "get_user_notifications",
     "mark_notification_as_read",
     "mark_all_notifications_as_read",
     
     # Search
-    "search_users",
-    "search_places",
-    "global_search"
+    "search_users_payload",
+    "search_places_payload",
+    "global_search_payload"
 ]
\ No newline at end of file
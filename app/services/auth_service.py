@@ -1,16 +1,40 @@
+import asyncio
+import hashlib
 import string
 import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
+from uuid import UUID
 from jose import JWTError, jwt, ExpiredSignatureError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 import bcrypt
-from sqlalchemy import select
+from sqlalchemy import delete, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from core.cache import TTLCache
 from core.database import get_db
 from core.config import settings
+from core.monitoring import (
+    JWT_DECODE_CACHE_REQUESTS,
+    PASSWORD_HASH_QUEUE_DEPTH,
+    PASSWORD_HASH_LATENCY,
+    PASSWORD_HASH_REJECTED,
+)
+from models.collection import Collection, CollectionRoute
+from models.friend import FriendRequest, Friendship
+from models.message import Message
+from models.notification import Notification
+from models.photo import Photo
+from models.place import Place
+from models.reaction import Reaction
+from models.review import Review
+from models.route import Route
 from models.user import User
+from services.friend_service import sync_friendship_cache
+from services.photo_service import delete_photo_objects, detach_photos
+from services.principal_cache import principal_cache
 
 
 
@@ -39,6 +63,98 @@ def verify_password(plain_password: str, hashed_password: str, salt: str) -> boo
     except ValueError:
         return False
 
+# bcrypt отпускает GIL, поэтому хватает пула потоков. Размер пула ограничен,
+# а запросы сверх него ждут слот в event loop не дольше PASSWORD_HASH_QUEUE_TIMEOUT
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_slots: Optional[asyncio.Semaphore] = None
+_password_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _get_password_executor() -> ThreadPoolExecutor:
+    global _password_executor
+    if _password_executor is None:
+        _password_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash",
+        )
+    return _password_executor
+
+def _get_password_slots() -> asyncio.Semaphore:
+    # Семафор привязан к event loop, поэтому создаем его для текущего
+    global _password_slots, _password_slots_loop
+    loop = asyncio.get_running_loop()
+    if _password_slots is None or _password_slots_loop is not loop:
+        _password_slots = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS)
+        _password_slots_loop = loop
+    return _password_slots
+
+async def _run_password_job(operation: str, func, *args):
+    slots = _get_password_slots()
+
+    PASSWORD_HASH_QUEUE_DEPTH.inc()
+    try:
+        async with asyncio.timeout(settings.PASSWORD_HASH_QUEUE_TIMEOUT):
+            await slots.acquire()
+    except TimeoutError:
+        PASSWORD_HASH_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again later",
+            headers={"Retry-After": "1"},
+        )
+    finally:
+        PASSWORD_HASH_QUEUE_DEPTH.dec()
+
+    start_time = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_password_executor(), func, *args)
+    finally:
+        PASSWORD_HASH_LATENCY.labels(operation=operation).observe(time.perf_counter() - start_time)
+        slots.release()
+
+async def hash_password_async(password: str, salt: str) -> str:
+    """hash_password без блокировки event loop"""
+    return await _run_password_job("hash", hash_password, password, salt)
+
+async def verify_password_async(plain_password: str, hashed_password: str, salt: str) -> bool:
+    """verify_password без блокировки event loop"""
+    return await _run_password_job("verify", verify_password, plain_password, hashed_password, salt)
+
+def shutdown_password_executor():
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=False, cancel_futures=True)
+        _password_executor = None
+
+# Клиенты переиспользуют один access token до его истечения, поэтому
+# результат проверки подписи кешируем по sha256 токена (сам токен не храним)
+_decoded_tokens = TTLCache(
+    maxsize=settings.JWT_DECODE_CACHE_MAXSIZE,
+    ttl=settings.JWT_DECODE_CACHE_TTL,
+)
+
+def decode_access_token(token: str) -> dict:
+    """
+    jwt.decode с проверкой подписи и кешированием успешных результатов.
+    Ошибки (JWTError, ExpiredSignatureError) не кешируются.
+    Возвращаемый словарь общий для всех запросов с этим токеном - не изменять.
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = _decoded_tokens.get(digest)
+    if payload is not None:
+        JWT_DECODE_CACHE_REQUESTS.labels(result="hit").inc()
+        return payload
+
+    JWT_DECODE_CACHE_REQUESTS.labels(result="miss").inc()
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+    ttl = None
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        ttl = exp - datetime.now(timezone.utc).timestamp()
+    _decoded_tokens.set(digest, payload, ttl=ttl)
+    return payload
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
 async def get_current_user(
@@ -55,7 +171,7 @@ async def get_current_user(
     )
     
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_access_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(
@@ -76,19 +192,17 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Ищем пользователя в базе данных
+    # Ищем пользователя в кеше, затем в базе данных
     try:
-        # Assuming user_id is a UUID string, but we pass it as is, sqlalchemy handles conversion if mapped to UUID
-        from uuid import UUID
         user_uuid = UUID(user_id)
-        result = await db.execute(select(User).where(User.id == user_uuid))
-        user = result.scalars().first()
     except ValueError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid user_id format in token",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    user = await get_user_by_id(db, user_uuid)
     
     if user is None:
         raise HTTPException(
@@ -99,6 +213,56 @@ async def get_current_user(
     
     return user
 
+async def get_user_by_id(db: AsyncSession, user_id: UUID) -> Optional[User]:
+    """
+    Загружает пользователя для аутентификации через principal cache.
+    При промахе делает SELECT и кладет результат в кеш.
+    """
+    user = await principal_cache.get(db, user_id)
+    if user is not None:
+        return user
+
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalars().first()
+    if user is not None:
+        await principal_cache.set(user)
+    return user
+
+async def delete_user(db: AsyncSession, user_id: UUID):
+    """
+    Удаляет пользователя вместе с его данными. ON DELETE CASCADE есть только у
+    friendships и conversations (с сообщениями), поэтому остальные зависимые
+    строки удаляются запросами от листьев к users. Места пользователя удаляются
+    вместе с чужими отзывами и фото на них. Файлы фото и кеши - после коммита
+    """
+    places = select(Place.id).where(Place.created_by == user_id)
+    reviews = select(Review.id).where(or_(Review.user_id == user_id, Review.place_id.in_(places)))
+    collections = select(Collection.id).where(Collection.user_id == user_id)
+    routes = select(Route.id).where(Route.created_by == user_id)
+    friend_ids = (await db.execute(select(Friendship.friend_id).where(Friendship.user_id == user_id))).scalars().all()
+
+    await db.execute(delete(Reaction).where(or_(Reaction.user_id == user_id, Reaction.review_id.in_(reviews))))
+    await db.execute(delete(Review).where(Review.id.in_(reviews)))
+    released, photos = await detach_photos(db, or_(Photo.user_id == user_id, Photo.place_id.in_(places)))
+    await db.execute(delete(Place).where(Place.created_by == user_id))
+    await db.execute(delete(CollectionRoute).where(
+        or_(CollectionRoute.collection_id.in_(collections), CollectionRoute.route_id.in_(routes))
+    ))
+    await db.execute(delete(Collection).where(Collection.user_id == user_id))
+    await db.execute(delete(Route).where(Route.created_by == user_id))
+    await db.execute(delete(FriendRequest).where(or_(FriendRequest.sender_id == user_id, FriendRequest.receiver_id == user_id)))
+    await db.execute(delete(Message).where(or_(Message.sender_id == user_id, Message.receiver_id == user_id)))
+    await db.execute(delete(Notification).where(Notification.user_id == user_id))
+    # Запросом, а не db.delete(): ORM перед удалением загрузила бы каждую
+    # обратную связь User (N+1)
+    await db.execute(delete(User).where(User.id == user_id))
+    await db.commit()
+
+    await delete_photo_objects(db, released, photos)
+    for friend_id in friend_ids:
+        await sync_friendship_cache(user_id, friend_id)
+    await principal_cache.invalidate(user_id)
+
 # Аутентификация пользователя по email и паролю
 async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
     result = await db.execute(select(User).where(User.email == email))
@@ -107,7 +271,7 @@ async def authenticate_user(db: AsyncSession, email: str, password: str) -> Opti
     if not user or not user.password_hash or not user.password_salt:
         return None
     
-    if not verify_password(password, user.password_hash, user.password_salt):
+    if not await verify_password_async(password, user.password_hash, user.password_salt):
         return None
     
     return user
@@ -120,7 +284,7 @@ async def authenticate_user_by_username(db: AsyncSession, username: str, passwor
     if not user or not user.password_hash or not user.password_salt:
         return None
     
-    if not verify_password(password, user.password_hash, user.password_salt):
+    if not await verify_password_async(password, user.password_hash, user.password_salt):
         return None
     
     return user
@@ -138,17 +302,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 # Добавляем функцию для WebSocket аутентификации
 async def get_current_user_ws(token: str, db: AsyncSession):
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_access_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             return None
         
-        from uuid import UUID
         user_uuid = UUID(user_id)
     except (JWTError, ValueError):
         return None
     
-    from sqlalchemy import select
-    result = await db.execute(select(User).where(User.id == user_uuid))
-    user = result.scalars().first()
-    return user
\ No newline at end of file
+    return await get_user_by_id(db, user_uuid)
\ No newline at end of file
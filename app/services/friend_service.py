@@ -0,0 +1,145 @@
+import logging
+from typing import Optional, Set, Tuple
+from uuid import UUID
+
+from redis import RedisError
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.pagination import after_cursor
+from models.friend import FriendRequest, FriendStatus, Friendship
+from models.user import User
+from services.redis_service import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Первый ключ pg_advisory_xact_lock (см. BLOB_LOCK_NAMESPACE в photo_service)
+FRIEND_PAIR_LOCK_NAMESPACE = 2
+
+def _pair_condition(columns, user_id: UUID, friend_id: UUID):
+    first, second = columns
+    return ((first == user_id) & (second == friend_id)) | ((first == friend_id) & (second == user_id))
+
+async def lock_friend_pair(db: AsyncSession, user_id: UUID, friend_id: UUID):
+    """
+    Блокирует пару пользователей до конца транзакции db. Берется перед проверкой
+    и изменением заявок пары: иначе параллельные запросы видят заявки друг
+    друга в состоянии до коммита
+    """
+    # XOR симметричен: один ключ для обоих порядков пары
+    key = (user_id.int ^ friend_id.int) & 0x7FFFFFFF
+    await db.execute(select(func.pg_advisory_xact_lock(FRIEND_PAIR_LOCK_NAMESPACE, key)))
+
+async def add_friendship(db: AsyncSession, user_id: UUID, friend_id: UUID):
+    """
+    Добавляет пару в таблицу смежности (по строке на направление).
+    Коммит остается за вызывающим, чтобы дружба сохранялась вместе со статусом заявки
+    """
+    await db.execute(
+        insert(Friendship)
+        .values([
+            {"user_id": user_id, "friend_id": friend_id},
+            {"user_id": friend_id, "friend_id": user_id},
+        ])
+        .on_conflict_do_nothing()
+    )
+
+async def remove_friendship(db: AsyncSession, user_id: UUID, friend_id: UUID):
+    """
+    Убирает пару из таблицы смежности, если между пользователями не осталось
+    принятой заявки (в любом направлении). Статус заявки меняется раньше в той
+    же транзакции, под lock_friend_pair
+    """
+    accepted = select(FriendRequest.id).where(
+        _pair_condition((FriendRequest.sender_id, FriendRequest.receiver_id), user_id, friend_id),
+        FriendRequest.status == FriendStatus.ACCEPTED
+    ).exists()
+    await db.execute(
+        delete(Friendship).where(
+            _pair_condition((Friendship.user_id, Friendship.friend_id), user_id, friend_id),
+            ~accepted
+        )
+    )
+
+async def sync_friendship_cache(user_id: UUID, friend_id: UUID):
+    """
+    Сбрасывает множества друзей обоих пользователей; вызывается после коммита.
+    Множества не правятся на месте (SADD/SREM): при параллельных изменениях одной
+    пары порядок операций в Redis может не совпасть с порядком коммитов
+    """
+    try:
+        await redis_client.invalidate_friendship(str(user_id), str(friend_id), settings.FRIENDS_CACHE_TTL)
+    except RedisError as e:
+        # Множества могли разойтись с БД: удалять их нечем, поэтому полагаемся на TTL
+        logger.warning(f"Failed to invalidate friend sets for {user_id} and {friend_id}: {e}")
+
+async def _load_friend_ids(db: AsyncSession, user_id: UUID) -> Set[UUID]:
+    """
+    Друзья из БД с прогревом множества. db должна быть основной БД: отставание
+    реплики закрепилось бы в кеше на FRIENDS_CACHE_TTL
+    """
+    try:
+        version = await redis_client.get_friends_version(str(user_id))
+    except RedisError as e:
+        logger.warning(f"Failed to read friends version of {user_id}: {e}")
+        version = None
+
+    result = await db.execute(select(Friendship.friend_id).where(Friendship.user_id == user_id))
+    friend_ids = set(result.scalars().all())
+    if version is None:
+        return friend_ids
+    try:
+        await redis_client.set_friend_ids(
+            str(user_id), [str(friend_id) for friend_id in friend_ids], settings.FRIENDS_CACHE_TTL, version
+        )
+    except RedisError as e:
+        logger.warning(f"Failed to cache friends of {user_id}: {e}")
+    return friend_ids
+
+async def get_friend_ids(db: AsyncSession, user_id: UUID) -> Set[UUID]:
+    """Все друзья пользователя из множества в Redis (при промахе - из БД с прогревом)"""
+    try:
+        cached = await redis_client.get_friend_ids(str(user_id))
+    except RedisError as e:
+        logger.warning(f"Failed to read friends of {user_id}: {e}")
+        cached = None
+    if cached is not None:
+        return {UUID(friend_id) for friend_id in cached}
+    return await _load_friend_ids(db, user_id)
+
+async def are_friends(db: AsyncSession, user_id: UUID, friend_id: UUID) -> bool:
+    try:
+        cached = await redis_client.is_friend(str(user_id), str(friend_id))
+    except RedisError as e:
+        logger.warning(f"Failed to check friendship of {user_id}: {e}")
+        cached = None
+    if cached is not None:
+        return cached
+    return friend_id in await _load_friend_ids(db, user_id)
+
+async def get_friends(
+    db: AsyncSession,
+    user_id: UUID,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple] = None
+):
+    """
+    Страница друзей, недавно добавленные первыми, по индексу
+    (user_id, created_at, friend_id). Возвращает строки (User, created_at)
+    """
+    query = (
+        select(User, Friendship.created_at)
+        .join(Friendship, Friendship.friend_id == User.id)
+        .where(Friendship.user_id == user_id)
+    )
+    condition = after_cursor((Friendship.created_at, Friendship.friend_id), after)
+    if condition is not None:
+        query = query.where(condition)
+    
+    result = await db.execute(
+        query.order_by(Friendship.created_at.desc(), Friendship.friend_id.desc()).offset(skip).limit(limit)
+    )
+    return result.all()
@@ -0,0 +1,96 @@
+import math
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.pagination import after_cursor
+from models.place import Place, GEO_CELLS_PER_DEGREE, GEO_CELL_ROWS, GEO_CELL_COLUMNS
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+def geo_cell(latitude: float, longitude: float) -> int:
+    """Номер ячейки сетки; совпадает с вычисляемой колонкой Place.geo_cell"""
+    row = min(math.floor((latitude + 90) * GEO_CELLS_PER_DEGREE), GEO_CELL_ROWS - 1)
+    column = min(math.floor((longitude + 180) * GEO_CELLS_PER_DEGREE), GEO_CELL_COLUMNS - 1)
+    return row * GEO_CELL_COLUMNS + column
+
+def cell_ranges(latitude: float, longitude: float, radius_km: float) -> List[Tuple[int, int]]:
+    """
+    Диапазоны номеров ячеек, покрывающих круг радиуса radius_km.
+    В каждой строке сетки ячейки идут подряд, поэтому на строку приходится
+    один диапазон (два - если круг пересекает 180-й меридиан)
+    """
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    min_lat = max(latitude - lat_delta, -90.0)
+    max_lat = min(latitude + lat_delta, 90.0)
+
+    # Ширина круга по долготе максимальна на самой удаленной от экватора широте
+    widest_lat = max(abs(min_lat), abs(max_lat))
+    cos_lat = math.cos(math.radians(widest_lat))
+    if cos_lat <= 0 or radius_km / (KM_PER_DEGREE_LAT * cos_lat) >= 180:
+        column_spans = [(0, GEO_CELL_COLUMNS - 1)]
+    else:
+        lon_delta = radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+        first = math.floor((longitude - lon_delta + 180) * GEO_CELLS_PER_DEGREE)
+        last = math.floor((longitude + lon_delta + 180) * GEO_CELLS_PER_DEGREE)
+        if first < 0:
+            column_spans = [(first + GEO_CELL_COLUMNS, GEO_CELL_COLUMNS - 1), (0, last)]
+        elif last >= GEO_CELL_COLUMNS:
+            column_spans = [(first, GEO_CELL_COLUMNS - 1), (0, last - GEO_CELL_COLUMNS)]
+        else:
+            column_spans = [(first, last)]
+
+    first_row = min(math.floor((min_lat + 90) * GEO_CELLS_PER_DEGREE), GEO_CELL_ROWS - 1)
+    last_row = min(math.floor((max_lat + 90) * GEO_CELLS_PER_DEGREE), GEO_CELL_ROWS - 1)
+
+    return [
+        (row * GEO_CELL_COLUMNS + first, row * GEO_CELL_COLUMNS + last)
+        for row in range(first_row, last_row + 1)
+        for first, last in column_spans
+    ]
+
+def distance_km(latitude: float, longitude: float):
+    """SQL-выражение: расстояние по формуле гаверсинусов от точки до места, км"""
+    lat1 = math.radians(latitude)
+    lat2 = func.radians(Place.latitude)
+    d_lat = func.radians(Place.latitude - latitude)
+    d_lon = func.radians(Place.longitude - longitude)
+
+    a = func.power(func.sin(d_lat / 2), 2) + math.cos(lat1) * func.cos(lat2) * func.power(func.sin(d_lon / 2), 2)
+    # least защищает asin от значений чуть больше 1 из-за погрешности округления
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(func.sqrt(a), 1.0))
+
+def within_radius(latitude: float, longitude: float, radius_km: float):
+    """Условие WHERE: отбор ячеек по индексу geo_cell и точная проверка расстояния"""
+    cells = or_(*(Place.geo_cell.between(first, last) for first, last in cell_ranges(latitude, longitude, radius_km)))
+    return and_(cells, distance_km(latitude, longitude) <= radius_km)
+
+async def get_nearby_places(
+    db: AsyncSession,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[float, object]] = None
+):
+    """
+    Публичные места в радиусе radius_km, ближайшие первыми.
+    Возвращает пары (место, расстояние в км); after - курсор (расстояние, id)
+    """
+    distance = distance_km(latitude, longitude)
+    stmt = select(Place, distance).where(
+        Place.is_public == True,
+        within_radius(latitude, longitude, radius_km)
+    )
+
+    condition = after_cursor((distance, Place.id), after, descending=False)
+    if condition is not None:
+        stmt = stmt.where(condition)
+
+    stmt = stmt.order_by(distance, Place.id).offset(skip).limit(limit)
+
+    result = await db.execute(stmt)
+    return result.all()
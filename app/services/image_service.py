@@ -1,43 +1,404 @@
+import asyncio
+import hashlib
+import logging
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
-from PIL import Image
-import secrets
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from PIL import Image, UnidentifiedImageError, features
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.monitoring import (
+    IMAGE_PROCESSING_LATENCY, IMAGE_PROCESSING_QUEUE_DEPTH, IMAGE_REJECTED, IMAGE_VARIANT_REQUESTS,
+    PHOTO_UPLOADS, PHOTO_UPLOAD_LATENCY, PHOTO_DEDUP_SAVED_BYTES
+)
+from models.photo import Photo, PhotoBlob
 from services.minio_service import minio_client
+from services.photo_service import acquire_blob, blob_object_names, lock_blob, register_blob
 
-async def process_and_upload_image(file, user_id: str):
-    # Generate secure random filename
-    file_extension = file.filename.split('.')[-1]
-    random_hex = secrets.token_hex(8)
-    filename = f"{user_id}_{random_hex}.{file_extension}"
-    
-    # Read and process image
-    image = Image.open(BytesIO(await file.read()))
-    
-    # Create thumbnail
-    thumbnail = image.copy()
-    thumbnail.thumbnail((300, 300))
-    
-    # Save images to bytes
-    original_bytes = BytesIO()
-    thumbnail_bytes = BytesIO()
-    
-    image.save(original_bytes, format=image.format)
-    thumbnail.save(thumbnail_bytes, format=image.format)
-    
-    # Upload to MinIO
-    original_bytes.seek(0)
-    thumbnail_bytes.seek(0)
-    
-    original_filename, original_url = await minio_client.upload_image(
-        original_bytes, filename, file.content_type
-    )
-    
-    thumb_filename, thumb_url = await minio_client.upload_image(
-        thumbnail_bytes, f"thumb_{filename}", file.content_type
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (300, 300)
+# Загрузка читается и хешируется кусками этого размера
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Только форматы, которые ожидаем от клиентов: Image.open без ограничения
+# перебирает все плагины Pillow, включая экзотические декодеры
+ALLOWED_IMAGE_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+# Image.MIME заполняется только при загрузке плагинов, а в этом процессе
+# изображения не открываются, поэтому таблица задана явно
+IMAGE_MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+# Content type загрузки -> расширение объекта
+IMAGE_CONTENT_TYPES = {IMAGE_MIME_TYPES[image_format]: ext for image_format, ext in ALLOWED_IMAGE_FORMATS.items()}
+
+# Ширины вариантов: запрошенная округляется вверх до ближайшей, чтобы число
+# производных одного фото было ограничено
+VARIANT_WIDTHS = (160, 320, 640, 1080, 1600)
+# Формат варианта -> (расширение, content type, параметры кодирования)
+VARIANT_FORMATS = {
+    "AVIF": ("avif", "image/avif", {"quality": 55}),
+    "WEBP": ("webp", "image/webp", {"quality": 80, "method": 4}),
+    "JPEG": ("jpg", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+    "PNG": ("png", "image/png", {"optimize": True}),
+}
+# Pillow может быть собран без libavif
+AVIF_SUPPORTED = features.check("avif")
+
+class ImageRejected(Exception):
+    """Изображение не прошло проверки; reason - метка для метрики"""
+    def __init__(self, reason: str, detail: str):
+        super().__init__(reason, detail)
+        self.reason = reason
+        self.detail = detail
+
+def _open_image(data: bytes, max_pixels: int) -> Image.Image:
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        with warnings.catch_warnings():
+            # Предупреждение Pillow о бомбе заменяет явная проверка ниже
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            image = Image.open(BytesIO(data), formats=list(ALLOWED_IMAGE_FORMATS))
+    except Image.DecompressionBombError:
+        raise ImageRejected("too_large", "Image dimensions are too large")
+    except UnidentifiedImageError:
+        raise ImageRejected("invalid", "Unsupported or corrupted image")
+
+    # open читает только заголовок: размеры проверяем до декодирования пикселей
+    width, height = image.size
+    if width * height > max_pixels:
+        image.close()
+        raise ImageRejected("too_large", "Image dimensions are too large")
+    return image
+
+def _resize(image: Image.Image, size: Tuple[int, int]):
+    if image.format == "JPEG":
+        # JPEG декодируется сразу в уменьшенном масштабе (до 1/8),
+        # а не в полном разрешении с последующим ресайзом
+        image.draft(image.mode, size)
+    try:
+        image.thumbnail(size)
+    except (OSError, SyntaxError):
+        raise ImageRejected("invalid", "Unsupported or corrupted image")
+
+def make_variant(data: bytes, width: int, image_format: str, max_pixels: int) -> bytes:
+    """Уменьшает изображение до ширины width (без увеличения) и кодирует в image_format"""
+    with _open_image(data, max_pixels) as image:
+        if image.width > width:
+            _resize(image, (width, max(1, round(image.height * width / image.width))))
+        else:
+            image.load()
+
+        converted = image
+        if image_format != "PNG" and image.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in image.mode or "transparency" in image.info
+            converted = image.convert("RGBA" if has_alpha else "RGB")
+        if image_format == "JPEG" and converted.mode == "RGBA":
+            converted = converted.convert("RGB")
+
+        output = BytesIO()
+        converted.save(output, format=image_format, **VARIANT_FORMATS[image_format][2])
+        return output.getvalue()
+
+def _dhash(image: Image.Image) -> int:
+    """64-битный difference hash как знаковое число (для BIGINT)"""
+    pixels = image.convert("L").resize((9, 8), Image.Resampling.LANCZOS).tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits - (1 << 64) if bits >= 1 << 63 else bits
+
+def make_thumbnail(data: bytes, size: Tuple[int, int], max_pixels: int) -> Tuple[bytes, str, int]:
+    """
+    Проверяет изображение и строит превью. Выполняется в процессе пула,
+    поэтому принимает и возвращает только байты.
+    Возвращает (превью, формат, перцептивный хеш)
+    """
+    with _open_image(data, max_pixels) as image:
+        image_format = image.format
+        _resize(image, size)
+        output = BytesIO()
+        image.save(output, format=image_format)
+        return output.getvalue(), image_format, _dhash(image)
+
+# Декодирование и ресайз держат GIL, поэтому нужен пул процессов, а не потоков.
+# Одновременно обрабатывается не больше IMAGE_PROCESS_WORKERS изображений,
+# остальные ждут слот не дольше IMAGE_PROCESS_QUEUE_TIMEOUT
+_image_executor: Optional[ProcessPoolExecutor] = None
+_image_slots: Optional[asyncio.Semaphore] = None
+_image_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _get_image_executor() -> ProcessPoolExecutor:
+    global _image_executor
+    if _image_executor is None:
+        _image_executor = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+    return _image_executor
+
+def _get_image_slots() -> asyncio.Semaphore:
+    # Семафор привязан к event loop, поэтому создаем его для текущего
+    global _image_slots, _image_slots_loop
+    loop = asyncio.get_running_loop()
+    if _image_slots is None or _image_slots_loop is not loop:
+        _image_slots = asyncio.Semaphore(settings.IMAGE_PROCESS_WORKERS)
+        _image_slots_loop = loop
+    return _image_slots
+
+def _reject(reason: str, status_code: int, detail: str, headers: Optional[dict] = None):
+    IMAGE_REJECTED.labels(reason=reason).inc()
+    raise HTTPException(status_code=status_code, detail=detail, headers=headers)
+
+async def _run_image_job(func, *args):
+    """Выполняет func в пуле процессов, дождавшись свободного слота"""
+    slots = _get_image_slots()
+
+    IMAGE_PROCESSING_QUEUE_DEPTH.inc()
+    try:
+        async with asyncio.timeout(settings.IMAGE_PROCESS_QUEUE_TIMEOUT):
+            await slots.acquire()
+    except TimeoutError:
+        _reject(
+            "busy",
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            "Too many image uploads, try again later",
+            headers={"Retry-After": "1"},
+        )
+    finally:
+        IMAGE_PROCESSING_QUEUE_DEPTH.dec()
+
+    start_time = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_image_executor(), func, *args)
+    except ImageRejected as e:
+        status_code = (
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE if e.reason == "too_large"
+            else status.HTTP_400_BAD_REQUEST
+        )
+        _reject(e.reason, status_code, e.detail)
+    finally:
+        IMAGE_PROCESSING_LATENCY.observe(time.perf_counter() - start_time)
+        slots.release()
+
+async def create_thumbnail(data: bytes) -> Tuple[bytes, str, int]:
+    """make_thumbnail в пуле процессов без блокировки event loop"""
+    return await _run_image_job(make_thumbnail, data, THUMBNAIL_SIZE, settings.MAX_IMAGE_PIXELS)
+
+def shutdown_image_executor():
+    global _image_executor
+    if _image_executor is not None:
+        _image_executor.shutdown(wait=False, cancel_futures=True)
+        _image_executor = None
+
+async def read_upload(file) -> Tuple[bytes, str]:
+    """Читает загрузку кусками, попутно считая SHA-256. Возвращает (данные, hex-хеш)"""
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > settings.MAX_IMAGE_UPLOAD_BYTES:
+            _reject("too_large", status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "Image file is too large")
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
+async def _store_blob(db: AsyncSession, data: bytes, sha256: str, source_name: Optional[str] = None) -> PhotoBlob:
+    """
+    Строит превью и сохраняет новый файл под именами из хеша. source_name -
+    уже загруженный оригинал (прямая загрузка): он копируется на стороне
+    хранилища, а не загружается заново. Вызывается под lock_blob
+    """
+    thumbnail_data, image_format, phash = await create_thumbnail(data)
+
+    # Расширение и content type берем из реального формата, а не от клиента
+    content_type = IMAGE_MIME_TYPES[image_format]
+    blob_name, thumbnail_name = blob_object_names(sha256, ALLOWED_IMAGE_FORMATS[image_format])
+    # Оригинал сохраняем как есть: перекодирование только теряет качество и время
+    if source_name is None or await minio_client.copy_object(source_name, blob_name) is None:
+        await minio_client.put_object(blob_name, data, content_type)
+    await minio_client.put_object(thumbnail_name, thumbnail_data, content_type)
+
+    return await register_blob(
+        db,
+        sha256=sha256,
+        object_name=blob_name,
+        thumbnail_object_name=thumbnail_name,
+        content_type=content_type,
+        size=len(data),
+        phash=phash,
     )
-    
+
+def _count_upload(blob: PhotoBlob, duplicate: bool, start_time: Optional[float] = None):
+    result = "duplicate" if duplicate else "new"
+    PHOTO_UPLOADS.labels(result=result).inc()
+    if duplicate:
+        PHOTO_DEDUP_SAVED_BYTES.inc(blob.size)
+    if start_time is not None:
+        PHOTO_UPLOAD_LATENCY.labels(result=result).observe(time.perf_counter() - start_time)
+
+async def process_and_upload_image(db: AsyncSession, file) -> PhotoBlob:
+    """
+    Сохраняет загрузку, проходящую через API. Повторная загрузка того же
+    содержимого не обрабатывается и не сохраняется заново, а ссылается на
+    существующий файл. Ссылка добавляется в транзакции db: фиксирует вызывающий
+    """
+    start_time = time.perf_counter()
+    data, sha256 = await read_upload(file)
+
+    await lock_blob(db, sha256)
+    blob = await acquire_blob(db, sha256)
+    duplicate = blob is not None
+    if not duplicate:
+        blob = await _store_blob(db, data, sha256)
+    _count_upload(blob, duplicate, start_time)
+    return blob
+
+def blob_photo_fields(blob: PhotoBlob) -> dict:
+    """Поля Photo, указывающие на файлы blob"""
     return {
-        "original_filename": original_filename,
-        "original_url": original_url,
-        "thumbnail_filename": thumb_filename,
-        "thumbnail_url": thumb_url
-    }
\ No newline at end of file
+        "blob_sha256": blob.sha256,
+        "filename": blob.object_name,
+        "original_url": minio_client.object_url(blob.object_name),
+        "thumbnail_url": minio_client.object_url(blob.thumbnail_object_name),
+    }
+
+async def _discard_rejected_upload(photo_id: UUID, object_name: str, reason: str):
+    logger.info(f"Removing rejected upload {object_name}: {reason}")
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Photo).where(Photo.id == photo_id))
+        await db.commit()
+    await minio_client.delete_image(object_name)
+
+async def generate_photo_thumbnail(photo_id: UUID, object_name: str):
+    """
+    Фоновая задача после прямой загрузки: хеширует объект и либо привязывает
+    фото к уже сохраненной копии, либо копирует его под имя из хеша и строит
+    превью. Загруженный объект затем удаляется. Если он оказался не
+    изображением или слишком большим, удаляет и фото, и объект
+    """
+    data = await minio_client.get_object_bytes(object_name, max_bytes=settings.MAX_IMAGE_UPLOAD_BYTES)
+    if data is None:
+        # Фото удалили раньше, чем дошла очередь до обработки
+        return
+    if len(data) > settings.MAX_IMAGE_UPLOAD_BYTES:
+        # Размер проверен при подтверждении; не читаем в память объект больше лимита
+        await _discard_rejected_upload(photo_id, object_name, "Image file is too large")
+        return
+    sha256 = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+
+    async with AsyncSessionLocal() as db:
+        await lock_blob(db, sha256)
+        blob = await acquire_blob(db, sha256)
+        duplicate = blob is not None
+        if not duplicate:
+            try:
+                blob = await _store_blob(db, data, sha256, source_name=object_name)
+            except HTTPException as e:
+                if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+                    # Пул перегружен: фото остается без превью
+                    logger.warning(f"Skipped thumbnail for photo {photo_id}: {e.detail}")
+                    return
+                await _discard_rejected_upload(photo_id, object_name, e.detail)
+                return
+
+        result = await db.execute(update(Photo).where(Photo.id == photo_id).values(**blob_photo_fields(blob)))
+        if result.rowcount == 0:
+            # Фото удалили во время обработки: ссылку не добавляем, а только
+            # что сохраненные объекты удаляем, пока держим блокировку
+            if not duplicate:
+                for name in (blob.object_name, blob.thumbnail_object_name):
+                    await minio_client.delete_image(name)
+            await db.rollback()
+            return
+        await db.commit()
+
+    # Фото теперь ссылается на объекты blob, загруженная копия не нужна.
+    # Варианты, отрисованные до привязки, лежат под id фото: дальше они
+    # берутся по хешу
+    await minio_client.delete_image(object_name)
+    await minio_client.delete_prefix(f"variants/{photo_id}/")
+    _count_upload(blob, duplicate)
+
+def variant_width(width: int) -> int:
+    for bucket in VARIANT_WIDTHS:
+        if width <= bucket:
+            return bucket
+    return VARIANT_WIDTHS[-1]
+
+def negotiate_variant_format(accept: Optional[str], source_name: str) -> str:
+    """
+    Формат варианта по заголовку Accept: AVIF, затем WebP. Без них - JPEG для
+    JPEG-оригиналов и PNG для остальных (там может быть прозрачность)
+    """
+    accepted = {}
+    for part in (accept or "").split(","):
+        media_type, *params = [param.strip() for param in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.lower()] = quality
+
+    if AVIF_SUPPORTED and accepted.get("image/avif", 0) > 0:
+        return "AVIF"
+    if accepted.get("image/webp", 0) > 0:
+        return "WEBP"
+    return "JPEG" if source_name.lower().endswith((".jpg", ".jpeg")) else "PNG"
+
+# Варианты, которые отрисовываются сейчас: ключ объекта -> задача
+_variant_renders: Dict[str, asyncio.Future] = {}
+
+async def _render_variant(source_name: str, key: str, width: int, image_format: str) -> bytes:
+    source = await minio_client.get_object_bytes(source_name)
+    if source is None:
+        raise HTTPException(status_code=404, detail="Photo file not found")
+    data = await _run_image_job(make_variant, source, width, image_format, settings.MAX_IMAGE_PIXELS)
+    await minio_client.put_object(key, data, VARIANT_FORMATS[image_format][1])
+    return data
+
+def _finish_variant_render(key: str, future: asyncio.Future):
+    _variant_renders.pop(key, None)
+    # Ошибку отрисовки забираем явно: ожидавшие могли уже отключиться, и
+    # тогда о ней пишет asyncio ("exception was never retrieved")
+    if not future.cancelled():
+        future.exception()
+
+async def get_photo_variant(photo: Photo, width: int, accept: Optional[str]) -> Tuple[bytes, str]:
+    """
+    Уменьшенная копия фото в лучшем поддерживаемом клиентом формате.
+    Создается при первом запросе и сохраняется в хранилище под детерминированным
+    ключом, поэтому следующие запросы (и другие воркеры) берут готовую
+    """
+    width = variant_width(width)
+    image_format = negotiate_variant_format(accept, photo.filename)
+    extension, content_type, _ = VARIANT_FORMATS[image_format]
+    # Фото с одинаковым содержимым делят и варианты
+    key = f"variants/{photo.blob_sha256 or photo.id}/{width}.{extension}"
+
+    data = await minio_client.get_object_bytes(key)
+    if data is not None:
+        IMAGE_VARIANT_REQUESTS.labels(result="hit").inc()
+        return data, content_type
+
+    # Single-flight: одновременные первые запросы ждут одну отрисовку
+    render = _variant_renders.get(key)
+    if render is None:
+        render = asyncio.ensure_future(_render_variant(photo.filename, key, width, image_format))
+        _variant_renders[key] = render
+        render.add_done_callback(lambda future: _finish_variant_render(key, future))
+        IMAGE_VARIANT_REQUESTS.labels(result="rendered").inc()
+    else:
+        IMAGE_VARIANT_REQUESTS.labels(result="coalesced").inc()
+    # shield: отключившийся клиент не отменяет отрисовку для остальных
+    return await asyncio.shield(render), content_type
@@ -0,0 +1,230 @@
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import DateTime, case, cast, func, select, union_all, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.batching import BatchWriter
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.pagination import after_cursor
+from models.conversation import Conversation
+from models.message import Message
+from models.notification import NotificationType
+from models.user import User
+from schemas.notification import NotificationCreate
+
+# Длина превью последнего сообщения в inbox
+MESSAGE_PREVIEW_LENGTH = 100
+
+def _conversation_id(user_id: UUID, peer_id: UUID):
+    low, high = Conversation.pair(user_id, peer_id)
+    return select(Conversation.id).where(
+        Conversation.user_low_id == low,
+        Conversation.user_high_id == high
+    ).scalar_subquery()
+
+def _message_order(message: Message):
+    # Без явного created_at время ставит БД (одно на транзакцию): такие
+    # сообщения новее заданных явно (импорт, тесты), между собой - по id
+    return (message.created_at is None, message.created_at or datetime.min, message.id)
+
+async def record_messages(db: AsyncSession, messages: Sequence[Message]) -> List[Message]:
+    """
+    Сохраняет пачку сообщений: одним upsert создает или обновляет переписки
+    (последнее сообщение, счетчики непрочитанных), затем вставляет сообщения.
+    Время сообщений берется из часов БД, а не воркера: при расхождении часов
+    воркеров порядок сообщений и курсоры по (created_at, id) не ломаются
+    """
+    if not messages:
+        return []
+    
+    pairs = {}
+    for message in messages:
+        message.id = message.id or uuid4()
+        pair = Conversation.pair(message.sender_id, message.receiver_id)
+        entry = pairs.setdefault(pair, {"last": message, "unread_low": 0, "unread_high": 0})
+        if _message_order(message) > _message_order(entry["last"]):
+            entry["last"] = message
+        if not message.is_read:
+            entry["unread_low" if message.receiver_id == pair[0] else "unread_high"] += 1
+    
+    # Пары в одном порядке, чтобы параллельные пачки не ловили deadlock
+    rows = []
+    for (low, high), entry in sorted(pairs.items()):
+        last = entry["last"]
+        rows.append({
+            "user_low_id": low,
+            "user_high_id": high,
+            "last_message_id": last.id,
+            "last_sender_id": last.sender_id,
+            "last_message_preview": last.content[:MESSAGE_PREVIEW_LENGTH],
+            "last_message_at": last.created_at or func.now(),
+            "unread_low": entry["unread_low"],
+            "unread_high": entry["unread_high"],
+        })
+    
+    stmt = insert(Conversation).values(rows)
+    excluded = stmt.excluded
+    # Сообщения могут приходить не по порядку: last_* обновляем только более новым
+    newer = excluded.last_message_at >= Conversation.last_message_at
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_conversations_pair",
+        set_={
+            "last_message_id": case((newer, excluded.last_message_id), else_=Conversation.last_message_id),
+            "last_sender_id": case((newer, excluded.last_sender_id), else_=Conversation.last_sender_id),
+            "last_message_preview": case((newer, excluded.last_message_preview), else_=Conversation.last_message_preview),
+            "last_message_at": func.greatest(Conversation.last_message_at, excluded.last_message_at),
+            "unread_low": Conversation.unread_low + excluded.unread_low,
+            "unread_high": Conversation.unread_high + excluded.unread_high,
+        }
+    ).returning(
+        Conversation.id,
+        Conversation.user_low_id,
+        Conversation.user_high_id,
+        # now() одинаков в транзакции: то же значение, что в last_message_at выше
+        cast(func.now(), DateTime).label("now"),
+    )
+    
+    result = await db.execute(stmt)
+    conversation_ids = {}
+    for row in result:
+        conversation_ids[(row.user_low_id, row.user_high_id)] = row.id
+        now = row.now
+    for message in messages:
+        message.conversation_id = conversation_ids[Conversation.pair(message.sender_id, message.receiver_id)]
+        message.created_at = message.created_at or now
+    
+    db.add_all(messages)
+    await db.commit()
+    return list(messages)
+
+async def _write_messages(messages: List[Message]) -> List[object]:
+    async with AsyncSessionLocal() as db:
+        try:
+            return await record_messages(db, messages)
+        except IntegrityError:
+            await db.rollback()
+    # Пачку сломал какой-то элемент (например, несуществующий получатель):
+    # пишем по одному, каждый в своей сессии - откат чужой ошибки не должен
+    # сбрасывать состояние уже сохраненных сообщений
+    results = []
+    for message in messages:
+        async with AsyncSessionLocal() as db:
+            try:
+                results.extend(await record_messages(db, [message]))
+            except IntegrityError as e:
+                await db.rollback()
+                results.append(e)
+    return results
+
+# Сообщения из WebSocket копятся несколько миллисекунд и пишутся одним
+# многострочным INSERT с одним коммитом на пачку
+message_writer: BatchWriter[Message, Message] = BatchWriter(
+    "messages",
+    _write_messages,
+    max_delay=settings.MESSAGE_BATCH_DELAY,
+    max_batch_size=settings.MESSAGE_BATCH_MAX_SIZE,
+)
+
+def new_message_notification(message: Message, sender: User) -> NotificationCreate:
+    return NotificationCreate(
+        user_id=message.receiver_id,
+        type=NotificationType.NEW_MESSAGE,
+        title="Новое сообщение",
+        message=f"У вас новое сообщение от {sender.first_name} {sender.last_name}",
+        related_entity_type="message",
+        related_entity_id=message.id,
+        metadata={"preview": message.content[:MESSAGE_PREVIEW_LENGTH]}
+    )
+
+async def mark_conversation_read(db: AsyncSession, user_id: UUID, peer_id: UUID) -> int:
+    """Отмечает прочитанными все входящие сообщения переписки, возвращает их число"""
+    conversation_id = _conversation_id(user_id, peer_id)
+    result = await db.execute(
+        update(Message)
+        .where(
+            Message.conversation_id == conversation_id,
+            Message.receiver_id == user_id,
+            Message.is_read == False
+        )
+        .values(is_read=True)
+    )
+    low, _ = Conversation.pair(user_id, peer_id)
+    unread = Conversation.unread_low if user_id == low else Conversation.unread_high
+    await db.execute(
+        update(Conversation).where(Conversation.id == conversation_id).values({unread: 0})
+    )
+    await db.commit()
+    return result.rowcount
+
+async def mark_message_read(db: AsyncSession, message: Message) -> None:
+    """Отмечает сообщение прочитанным и уменьшает счетчик непрочитанных переписки"""
+    if message.is_read:
+        return
+    message.is_read = True
+    low, _ = Conversation.pair(message.sender_id, message.receiver_id)
+    unread = Conversation.unread_low if message.receiver_id == low else Conversation.unread_high
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == message.conversation_id)
+        .values({unread: func.greatest(unread - 1, 0)})
+    )
+    await db.commit()
+
+async def get_conversation_messages(
+    db: AsyncSession,
+    user_id: UUID,
+    peer_id: UUID,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple] = None
+):
+    """
+    Сообщения переписки, новые первыми, с keyset-пагинацией по (created_at, id)
+    по индексу (conversation_id, created_at, id)
+    """
+    query = select(Message).where(Message.conversation_id == _conversation_id(user_id, peer_id))
+    condition = after_cursor((Message.created_at, Message.id), after)
+    if condition is not None:
+        query = query.where(condition)
+    
+    result = await db.execute(
+        query.order_by(Message.created_at.desc(), Message.id.desc()).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_conversations(
+    db: AsyncSession,
+    user_id: UUID,
+    skip: int = 0,
+    limit: int = 50,
+    after: Optional[Tuple] = None
+):
+    """
+    Inbox пользователя: переписки с последними сообщениями первыми.
+    Пользователь может стоять в паре на любом из двух мест, поэтому каждое
+    место выбирается своим подзапросом по индексу (user_*_id, last_message_at, id)
+    """
+    def side(column):
+        query = select(Conversation.id).where(column == user_id)
+        condition = after_cursor((Conversation.last_message_at, Conversation.id), after)
+        if condition is not None:
+            query = query.where(condition)
+        return query.order_by(Conversation.last_message_at.desc(), Conversation.id.desc()).limit(skip + limit)
+    
+    low = side(Conversation.user_low_id).subquery()
+    high = side(Conversation.user_high_id).subquery()
+    ids = union_all(select(low.c.id), select(high.c.id))
+    
+    result = await db.execute(
+        select(Conversation)
+        .where(Conversation.id.in_(ids))
+        .order_by(Conversation.last_message_at.desc(), Conversation.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.scalars().all()
@@ -1,11 +1,21 @@
 from minio import Minio
+from minio.commonconfig import CopySource
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
+from datetime import timedelta
+from io import BytesIO
+from typing import Optional
+import asyncio
+import logging
 import uuid
 from core.config import settings
 import os
 
+logger = logging.getLogger(__name__)
+
 class MinioClient:
     def __init__(self):
+        self.bucket_name = settings.MINIO_BUCKET
         if os.environ.get("TESTING") == "True":
             self.client = None
             return
@@ -14,63 +24,187 @@ class MinioClient:
             settings.MINIO_ENDPOINT,
             access_key=settings.MINIO_ROOT_USER,
             secret_key=settings.MINIO_ROOT_PASSWORD,
-            secure=settings.MINIO_SECURE
+            secure=settings.MINIO_SECURE,
+            region=settings.MINIO_REGION
         )
-        self.bucket_name = settings.MINIO_BUCKET
-        
+        # Подпись presigned URL включает хост, поэтому ссылки для клиентов
+        # подписываем внешним адресом. Регион задан явно: иначе клиент
+        # запрашивает его у хранилища, а внешний адрес изнутри может быть недоступен
+        self.public_client = self.client
+        if settings.MINIO_PUBLIC_ENDPOINT != settings.MINIO_ENDPOINT:
+            self.public_client = Minio(
+                settings.MINIO_PUBLIC_ENDPOINT,
+                access_key=settings.MINIO_ROOT_USER,
+                secret_key=settings.MINIO_ROOT_PASSWORD,
+                secure=settings.MINIO_PUBLIC_SECURE,
+                region=settings.MINIO_REGION
+            )
+
         # Create bucket if not exists
         self._create_bucket()
-    
+
     def _create_bucket(self):
         if self.client is None:
             return
-        
+
         try:
             if not self.client.bucket_exists(self.bucket_name):
                 self.client.make_bucket(self.bucket_name)
                 print(f"Bucket {self.bucket_name} created successfully")
         except S3Error as err:
             print(f"Error creating bucket: {err}")
-    
+
+    def object_url(self, object_name: str) -> str:
+        """Постоянный (неподписанный) URL объекта"""
+        scheme = "https" if settings.MINIO_PUBLIC_SECURE else "http"
+        return f"{scheme}://{settings.MINIO_PUBLIC_ENDPOINT}/{self.bucket_name}/{object_name}"
+
+    def object_name_from_url(self, url: Optional[str]) -> Optional[str]:
+        """Имя объекта по его URL; старые фото хранят только URL превью"""
+        if not url:
+            return None
+        _, separator, object_name = url.partition(f"/{self.bucket_name}/")
+        if not separator or not object_name:
+            return None
+        return object_name
+
     async def upload_image(self, file_data, file_name, content_type):
         if self.client is None:
             # В тестовом режиме возвращаем заглушку
             unique_filename = f"test_{uuid.uuid4()}.{file_name.split('.')[-1]}"
             return unique_filename, f"http://test-minio/{unique_filename}"
-        
+
+        # Generate unique filename
+        file_extension = file_name.split('.')[-1]
+        unique_filename = f"{uuid.uuid4()}.{file_extension}"
+        # Известная длина позволяет загрузить небольшой файл одним PUT,
+        # а большой - частями параллельно
+        length = file_data.getbuffer().nbytes if isinstance(file_data, BytesIO) else -1
+
         try:
-            # Generate unique filename
-            file_extension = file_name.split('.')[-1]
-            unique_filename = f"{uuid.uuid4()}.{file_extension}"
-            
-            # Upload file
-            self.client.put_object(
+            # Клиент minio синхронный: сетевые вызовы выполняем в пуле потоков
+            await asyncio.to_thread(
+                self.client.put_object,
                 self.bucket_name,
                 unique_filename,
                 file_data,
-                length=-1,
-                part_size=10*1024*1024,
+                length=length,
+                part_size=settings.MINIO_PART_SIZE,
+                num_parallel_uploads=settings.MINIO_PARALLEL_UPLOADS,
                 content_type=content_type
             )
-            
-            # Generate URL
-            url = self.client.presigned_get_object(
-                self.bucket_name, 
-                unique_filename
-            )
-            
-            return unique_filename, url.split('?')[0]  # Return filename and base URL
-            
         except S3Error as err:
             print(f"Error uploading file: {err}")
             raise
-    
+
+        return unique_filename, self.object_url(unique_filename)
+
+    async def presigned_upload_url(self, object_name: str, expires: timedelta) -> str:
+        """URL для загрузки объекта клиентом напрямую в хранилище (PUT)"""
+        if self.client is None:
+            return f"http://test-minio/upload/{object_name}"
+        return await asyncio.to_thread(
+            self.public_client.presigned_put_object, self.bucket_name, object_name, expires
+        )
+
+    async def get_object_size(self, object_name: str) -> Optional[int]:
+        """Размер объекта в байтах или None, если объекта нет"""
+        if self.client is None:
+            return None
+        try:
+            stat = await asyncio.to_thread(self.client.stat_object, self.bucket_name, object_name)
+        except S3Error as err:
+            if err.code == "NoSuchKey":
+                return None
+            raise
+        return stat.size
+
+    async def copy_object(self, source_name: str, object_name: str) -> Optional[int]:
+        """
+        Копирует объект на стороне хранилища (без передачи через API).
+        Возвращает размер копии или None, если исходного объекта нет
+        """
+        if self.client is None:
+            return None
+
+        def copy():
+            try:
+                self.client.copy_object(
+                    self.bucket_name, object_name, CopySource(self.bucket_name, source_name)
+                )
+            except S3Error as err:
+                if err.code == "NoSuchKey":
+                    return None
+                raise
+            # Размер копии, а не источника: источник могли перезаписать во время копирования
+            return self.client.stat_object(self.bucket_name, object_name).size
+
+        return await asyncio.to_thread(copy)
+
+    async def get_object_bytes(self, object_name: str, max_bytes: Optional[int] = None) -> Optional[bytes]:
+        """
+        Содержимое объекта или None, если объекта нет. С max_bytes читает не больше
+        max_bytes + 1 байт: длина результата больше max_bytes означает, что объект
+        больше лимита, и целиком он в память не загружается
+        """
+        if self.client is None:
+            return None
+
+        def read():
+            try:
+                response = self.client.get_object(self.bucket_name, object_name)
+            except S3Error as err:
+                if err.code == "NoSuchKey":
+                    return None
+                raise
+            try:
+                if max_bytes is None:
+                    return response.read()
+                return response.read(max_bytes + 1)
+            finally:
+                response.close()
+                response.release_conn()
+
+        return await asyncio.to_thread(read)
+
+    async def put_object(self, object_name: str, data: bytes, content_type: str) -> str:
+        """Сохраняет объект под заданным именем (в отличие от upload_image) и возвращает его URL"""
+        if self.client is None:
+            return f"http://test-minio/{object_name}"
+        await asyncio.to_thread(
+            self.client.put_object,
+            self.bucket_name,
+            object_name,
+            BytesIO(data),
+            length=len(data),
+            part_size=settings.MINIO_PART_SIZE,
+            num_parallel_uploads=settings.MINIO_PARALLEL_UPLOADS,
+            content_type=content_type
+        )
+        return self.object_url(object_name)
+
     async def delete_image(self, file_name):
+        if self.client is None:
+            return
         try:
-            self.client.remove_object(self.bucket_name, file_name)
+            await asyncio.to_thread(self.client.remove_object, self.bucket_name, file_name)
         except S3Error as err:
             print(f"Error deleting file: {err}")
             raise
 
+    async def delete_prefix(self, prefix: str):
+        """Удаляет все объекты с заданным префиксом (например, варианты одного фото)"""
+        if self.client is None:
+            return
+
+        def remove():
+            objects = self.client.list_objects(self.bucket_name, prefix=prefix, recursive=True)
+            delete_list = (DeleteObject(obj.object_name) for obj in objects)
+            # remove_objects ленивый: ошибки приходят только при обходе результата
+            for error in self.client.remove_objects(self.bucket_name, delete_list):
+                logger.warning(f"Failed to delete {error.name} with prefix {prefix}: {error.message}")
+
+        await asyncio.to_thread(remove)
+
 # Create global MinIO client instance
-minio_client = MinioClient()
\ No newline at end of file
+minio_client = MinioClient()
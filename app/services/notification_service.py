@@ -1,25 +1,104 @@
+import asyncio
+import logging
+from redis import RedisError
+from collections import Counter
+from sqlalchemy import func, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from models.notification import Notification, NotificationType
 from schemas.notification import NotificationCreate
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 from uuid import UUID
+from core.batching import BatchWriter
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.monitoring import UNREAD_COUNTER_REQUESTS, UNREAD_COUNTER_CORRECTIONS
+from core.pagination import after_cursor
+from services.redis_service import redis_client
+
+logger = logging.getLogger(__name__)
+
+async def _change_unread_counter(user_id: UUID, delta: int):
+    # Ошибку Redis не пробрасываем: БД - источник истины, расхождение исправит сверка
+    try:
+        await redis_client.change_unread_notifications(str(user_id), delta)
+    except RedisError as e:
+        logger.warning(f"Failed to update unread counter for {user_id}: {e}")
+
+async def _change_unread_counters(deltas: Dict[UUID, int]):
+    try:
+        await redis_client.change_unread_notifications_many(
+            {str(user_id): delta for user_id, delta in deltas.items()}
+        )
+    except RedisError as e:
+        logger.warning(f"Failed to update unread counters for {len(deltas)} users: {e}")
+
+async def _set_unread_counter(user_id: UUID, count: int):
+    try:
+        await redis_client.set_unread_notifications(str(user_id), count, settings.UNREAD_COUNTER_TTL)
+    except RedisError as e:
+        logger.warning(f"Failed to set unread counter for {user_id}: {e}")
+
+async def _count_unread(db: AsyncSession, user_ids: Iterable[UUID]) -> Dict[UUID, int]:
+    result = await db.execute(
+        select(Notification.user_id, func.count(Notification.id))
+        .where(Notification.user_id.in_(list(user_ids)), Notification.is_read == False)
+        .group_by(Notification.user_id)
+    )
+    return dict(result.all())
+
+def _notification_row(notification_data: NotificationCreate) -> dict:
+    # В модели поле называется metadata_info: metadata занято декларативной базой
+    row = notification_data.model_dump(exclude={"metadata"})
+    row["metadata_info"] = notification_data.metadata
+    return row
+
+async def create_notifications(
+    db: AsyncSession,
+    notifications_data: Sequence[NotificationCreate]
+) -> List[Notification]:
+    """Создает уведомления одним многострочным INSERT ... RETURNING в одной транзакции"""
+    if not notifications_data:
+        return []
+    result = await db.scalars(
+        insert(Notification).returning(Notification, sort_by_parameter_order=True),
+        [_notification_row(notification_data) for notification_data in notifications_data]
+    )
+    notifications = result.all()
+    await db.commit()
+    await _change_unread_counters(Counter(notification.user_id for notification in notifications))
+    return notifications
 
 async def create_notification(
     db: AsyncSession,
     notification_data: NotificationCreate
 ):
-    db_notification = Notification(**notification_data.dict())
-    db.add(db_notification)
-    await db.commit()
-    await db.refresh(db_notification)
-    return db_notification
+    notifications = await create_notifications(db, [notification_data])
+    return notifications[0]
+
+async def _write_notifications(notifications_data: List[NotificationCreate]) -> List[Notification]:
+    async with AsyncSessionLocal() as db:
+        return await create_notifications(db, notifications_data)
+
+# Уведомления от эндпоинтов копятся несколько миллисекунд и пишутся одной пачкой
+# в своей транзакции, не удлиняя транзакцию запроса
+notification_writer: BatchWriter[NotificationCreate, Notification] = BatchWriter(
+    "notifications",
+    _write_notifications,
+    max_delay=settings.NOTIFICATION_BATCH_DELAY,
+    max_batch_size=settings.NOTIFICATION_BATCH_MAX_SIZE,
+)
+
+def enqueue_notification(notification_data: NotificationCreate) -> None:
+    """Ставит уведомление в буфер записи, не дожидаясь вставки"""
+    notification_writer.add(notification_data)
 
 async def get_user_notifications(
     db: AsyncSession,
     user_id: UUID,
     skip: int = 0,
     limit: int = 50,
-    unread_only: bool = False
+    unread_only: bool = False,
+    after: Optional[Tuple] = None
 ):
     from sqlalchemy import select
     query = select(Notification).where(Notification.user_id == user_id)
@@ -27,7 +106,12 @@ async def get_user_notifications(
     if unread_only:
         query = query.where(Notification.is_read == False)
     
-    query = query.order_by(Notification.created_at.desc()).offset(skip).limit(limit)
+    # Keyset-пагинация по индексу (user_id, created_at, id)
+    condition = after_cursor((Notification.created_at, Notification.id), after)
+    if condition is not None:
+        query = query.where(condition)
+    
+    query = query.order_by(Notification.created_at.desc(), Notification.id.desc()).offset(skip).limit(limit)
     
     result = await db.execute(query)
     notifications = result.scalars().all()
@@ -38,21 +122,30 @@ async def mark_notification_as_read(
     notification_id: UUID,
     user_id: UUID
 ):
-    from sqlalchemy import select
+    from sqlalchemy import select, update
+    # Условие is_read в самом UPDATE: из параллельных запросов строку меняет
+    # только один, и счетчик уменьшается один раз
     result = await db.execute(
-        select(Notification).where(
-            (Notification.id == notification_id) &
-            (Notification.user_id == user_id)
+        update(Notification)
+        .where(
+            Notification.id == notification_id,
+            Notification.user_id == user_id,
+            Notification.is_read.is_(False)
         )
+        .values(is_read=True)
+        .returning(Notification.id)
     )
-    notification = result.scalars().first()
-    
-    if notification:
-        notification.is_read = True
-        await db.commit()
-        await db.refresh(notification)
+    was_unread = result.first() is not None
+    await db.commit()
+    if was_unread:
+        await _change_unread_counter(user_id, -1)
     
-    return notification
+    result = await db.execute(
+        select(Notification)
+        .where(Notification.id == notification_id, Notification.user_id == user_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
 
 async def mark_all_notifications_as_read(
     db: AsyncSession,
@@ -61,7 +154,61 @@ async def mark_all_notifications_as_read(
     from sqlalchemy import update
     await db.execute(
         update(Notification)
-        .where(Notification.user_id == user_id)
+        .where(Notification.user_id == user_id, Notification.is_read == False)
         .values(is_read=True)
     )
-    await db.commit()
\ No newline at end of file
+    await db.commit()
+    await _set_unread_counter(user_id, 0)
+
+async def get_unread_count(db: AsyncSession, user_id: UUID) -> int:
+    """
+    Число непрочитанных уведомлений из счетчика в Redis. Если счетчика нет
+    (истек или Redis недоступен), считает по БД и прогревает счетчик
+    """
+    try:
+        count = await redis_client.get_unread_notifications(str(user_id))
+    except RedisError as e:
+        logger.warning(f"Failed to read unread counter for {user_id}: {e}")
+        UNREAD_COUNTER_REQUESTS.labels(result="error").inc()
+        return (await _count_unread(db, [user_id])).get(user_id, 0)
+    
+    if count is not None:
+        UNREAD_COUNTER_REQUESTS.labels(result="hit").inc()
+        return count
+    
+    UNREAD_COUNTER_REQUESTS.labels(result="miss").inc()
+    count = (await _count_unread(db, [user_id])).get(user_id, 0)
+    await _set_unread_counter(user_id, count)
+    return count
+
+async def reconcile_unread_counters(db: AsyncSession) -> int:
+    """
+    Сверяет все прогретые счетчики с БД пачками и исправляет разошедшиеся
+    (например, после ошибок Redis). Возвращает число исправленных счетчиков
+    """
+    corrected = 0
+    async for counters in redis_client.scan_unread_notifications():
+        actual = await _count_unread(db, [UUID(user_id) for user_id in counters])
+        drifted = {}
+        for user_id, count in counters.items():
+            actual_count = actual.get(UUID(user_id), 0)
+            if actual_count != count:
+                drifted[user_id] = (count, actual_count)
+        # Не SET: изменение счетчика между чтением и исправлением потерялось бы
+        corrected += await redis_client.correct_unread_notifications(drifted, settings.UNREAD_COUNTER_TTL)
+    
+    UNREAD_COUNTER_CORRECTIONS.inc(corrected)
+    return corrected
+
+async def run_unread_counter_reconciler(session_maker, interval: float):
+    """Фоновая задача: периодическая сверка счетчиков до отмены"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_maker() as db:
+                corrected = await reconcile_unread_counters(db)
+            if corrected:
+                logger.info(f"Reconciled {corrected} unread notification counters")
+        except Exception:
+            # Ошибка одного прохода не должна останавливать задачу
+            logger.exception("Unread counter reconciliation failed")
\ No newline at end of file
@@ -0,0 +1,129 @@
+import logging
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import Row, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.photo import Photo, PhotoBlob
+from services.minio_service import minio_client
+
+logger = logging.getLogger(__name__)
+
+def blob_object_names(sha256: str, extension: str):
+    """Имена объектов оригинала и превью по хешу содержимого"""
+    prefix = f"blobs/{sha256[:2]}/{sha256}"
+    return f"{prefix}.{extension}", f"{prefix}_thumb.{extension}"
+
+# Первый ключ pg_advisory_xact_lock: отделяет блокировки файлов от других advisory-блокировок
+BLOB_LOCK_NAMESPACE = 1
+
+async def lock_blob(db: AsyncSession, sha256: str):
+    """
+    Блокирует содержимое с этим хешем до конца транзакции db. Берется перед
+    acquire_blob при сохранении и перед удалением объектов: иначе удаление
+    последней ссылки может стереть объекты, которые параллельная загрузка
+    того же файла только что записала под теми же именами
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(BLOB_LOCK_NAMESPACE, int(sha256[:7], 16))))
+
+async def acquire_blob(db: AsyncSession, sha256: str) -> Optional[PhotoBlob]:
+    """Добавляет ссылку на уже сохраненный файл; None, если такого содержимого еще нет"""
+    result = await db.execute(
+        update(PhotoBlob)
+        .where(PhotoBlob.sha256 == sha256)
+        .values(ref_count=PhotoBlob.ref_count + 1)
+        .returning(PhotoBlob)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+async def register_blob(db: AsyncSession, **values) -> PhotoBlob:
+    """
+    Сохраняет новый файл с одной ссылкой. Если параллельная загрузка успела
+    сохранить то же содержимое, добавляет ссылку на ее запись и возвращает ее
+    """
+    stmt = insert(PhotoBlob).values(ref_count=1, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PhotoBlob.sha256],
+        set_={"ref_count": PhotoBlob.ref_count + 1}
+    ).returning(PhotoBlob)
+    result = await db.execute(stmt.execution_options(populate_existing=True))
+    return result.scalars().one()
+
+async def release_blob(db: AsyncSession, sha256: str, count: int = 1) -> Optional[PhotoBlob]:
+    """
+    Убирает count ссылок на файл. Возвращает запись, если ссылок не осталось и ее
+    объекты нужно удалить из хранилища (после коммита, см. delete_blob_objects)
+    """
+    result = await db.execute(
+        update(PhotoBlob)
+        .where(PhotoBlob.sha256 == sha256)
+        .values(ref_count=PhotoBlob.ref_count - count)
+        .returning(PhotoBlob)
+        .execution_options(populate_existing=True)
+    )
+    blob = result.scalars().first()
+    if blob is None or blob.ref_count > 0:
+        return None
+    await db.execute(delete(PhotoBlob).where(PhotoBlob.sha256 == sha256, PhotoBlob.ref_count <= 0))
+    return blob
+
+async def delete_blob_objects(db: AsyncSession, blob: PhotoBlob):
+    """Удаляет объекты освобожденного файла в отдельной транзакции db"""
+    await lock_blob(db, blob.sha256)
+    try:
+        # Тот же файл мог быть загружен заново после удаления записи: тогда
+        # объекты (по тем же именам) снова используются и удалять их нельзя
+        result = await db.execute(select(PhotoBlob.sha256).where(PhotoBlob.sha256 == blob.sha256))
+        if result.first() is not None:
+            return
+        for object_name in (blob.object_name, blob.thumbnail_object_name):
+            await minio_client.delete_image(object_name)
+        await minio_client.delete_prefix(f"variants/{blob.sha256}/")
+    finally:
+        # Блокировка снимается вместе с транзакцией
+        await db.commit()
+
+async def detach_photos(db: AsyncSession, *criteria) -> Tuple[List[PhotoBlob], Sequence[Row]]:
+    """
+    Удаляет записи фото по условию и их ссылки на файлы в транзакции db
+    (фиксирует вызывающий). Возвращает освободившиеся blob и удаленные фото
+    для delete_photo_objects
+    """
+    result = await db.execute(
+        delete(Photo)
+        .where(*criteria)
+        .returning(Photo.id, Photo.filename, Photo.thumbnail_url, Photo.blob_sha256)
+    )
+    photos = result.all()
+    references = Counter(photo.blob_sha256 for photo in photos if photo.blob_sha256)
+    released = []
+    # Одинаковый порядок блокировки строк в параллельных транзакциях
+    for sha256 in sorted(references):
+        blob = await release_blob(db, sha256, references[sha256])
+        if blob is not None:
+            released.append(blob)
+    return released, photos
+
+async def delete_photo_objects(db: AsyncSession, released: List[PhotoBlob], photos: Sequence[Row]):
+    """Удаляет из хранилища файлы фото, отвязанных detach_photos (после коммита)"""
+    for blob in released:
+        await delete_blob_objects(db, blob)
+    for photo in photos:
+        if photo.blob_sha256 is None:
+            # Фото без blob (до дедупликации) владеет своим объектом единолично
+            await minio_client.delete_image(photo.filename)
+            thumbnail_name = minio_client.object_name_from_url(photo.thumbnail_url)
+            if thumbnail_name is not None:
+                await minio_client.delete_image(thumbnail_name)
+        # Под id фото лежат варианты фото без blob, а также отрисованные до
+        # привязки прямой загрузки к blob
+        await minio_client.delete_prefix(f"variants/{photo.id}/")
+
+async def delete_photo(db: AsyncSession, photo: Photo):
+    """Удаляет фото и, если это была последняя ссылка, его файлы"""
+    released, photos = await detach_photos(db, Photo.id == photo.id)
+    await db.commit()
+    await delete_photo_objects(db, released, photos)
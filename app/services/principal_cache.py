@@ -0,0 +1,123 @@
+import logging
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+import redis
+from sqlalchemy import DateTime
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from core.cache import TTLCache
+from core.config import settings
+from core.monitoring import PRINCIPAL_CACHE_REQUESTS
+from models.user import User
+from services.redis_service import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Секреты не кешируем: для аутентификации по токену они не нужны.
+# search_vector загружается отложенно и тоже не нужен
+_EXCLUDED_COLUMNS = {"password_hash", "password_salt", "oauth_data", "search_vector"}
+_CACHED_COLUMNS = [
+    column for column in User.__table__.columns if column.key not in _EXCLUDED_COLUMNS
+]
+
+
+def _to_payload(user: User) -> dict:
+    payload = {}
+    for column in _CACHED_COLUMNS:
+        value = getattr(user, column.key)
+        if isinstance(value, UUID):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        payload[column.key] = value
+    return payload
+
+
+def _from_payload(payload: dict) -> User:
+    values = {}
+    for column in _CACHED_COLUMNS:
+        value = payload.get(column.key)
+        if value is not None:
+            if isinstance(column.type, PG_UUID):
+                value = UUID(value)
+            elif isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+        values[column.key] = value
+
+    user = User(**values)
+    # Объект считается загруженным из БД и "чистым", без ожидающих изменений
+    make_transient_to_detached(user)
+    return user
+
+
+class PrincipalCache:
+    """
+    Двухуровневый кеш пользователей для get_current_user:
+    in-process TTL/LRU и Redis. Хранит только словари значений колонок,
+    ORM-объект создается заново для каждой сессии.
+    """
+
+    def __init__(self):
+        self.local = TTLCache(
+            maxsize=settings.PRINCIPAL_CACHE_LOCAL_MAXSIZE,
+            ttl=settings.PRINCIPAL_CACHE_LOCAL_TTL,
+        )
+        self.redis_ttl = settings.PRINCIPAL_CACHE_REDIS_TTL
+
+    async def get(self, db: AsyncSession, user_id: UUID) -> Optional[User]:
+        """Пользователь из кеша, привязанный к сессии db, или None при промахе"""
+        payload = self.local.get(user_id)
+        if payload is not None:
+            PRINCIPAL_CACHE_REQUESTS.labels(tier="local", result="hit").inc()
+        else:
+            PRINCIPAL_CACHE_REQUESTS.labels(tier="local", result="miss").inc()
+            payload = await self._get_from_redis(user_id)
+            if payload is None:
+                return None
+            self.local.set(user_id, payload)
+
+        # merge без загрузки не делает SELECT и переиспользует объект,
+        # если он уже есть в identity map сессии
+        return await db.merge(_from_payload(payload), load=False)
+
+    async def set(self, user: User) -> None:
+        payload = _to_payload(user)
+        self.local.set(user.id, payload)
+
+        if self.redis_ttl <= 0:
+            return
+        try:
+            await redis_client.set_principal(str(user.id), payload, self.redis_ttl)
+        except redis.RedisError as e:
+            logger.debug(f"Failed to store principal in Redis: {e}")
+
+    async def invalidate(self, user_id: UUID) -> None:
+        """Вызывается после изменения полей, важных для аутентификации"""
+        self.local.pop(user_id)
+
+        if self.redis_ttl <= 0:
+            return
+        try:
+            await redis_client.delete_principal(str(user_id))
+        except redis.RedisError as e:
+            logger.warning(f"Failed to invalidate principal {user_id} in Redis: {e}")
+
+    async def _get_from_redis(self, user_id: UUID) -> Optional[dict]:
+        if self.redis_ttl <= 0:
+            return None
+        try:
+            payload = await redis_client.get_principal(str(user_id))
+        except redis.RedisError as e:
+            logger.debug(f"Failed to read principal from Redis: {e}")
+            PRINCIPAL_CACHE_REQUESTS.labels(tier="redis", result="error").inc()
+            return None
+
+        PRINCIPAL_CACHE_REQUESTS.labels(tier="redis", result="hit" if payload else "miss").inc()
+        return payload
+
+
+principal_cache = PrincipalCache()
@@ -1,39 +1,272 @@
 import json
-import redis
+import zlib
+import redis.asyncio as redis
 from core.config import settings
-from typing import Optional, Any
+from typing import Optional, Any, Dict, Iterable, List, Set, Tuple
+
+# Сколько ключей удаляем одной командой UNLINK при инвалидации
+INVALIDATE_BATCH_SIZE = 500
+
+# Первый байт закешированного payload: готовый JSON или JSON, сжатый zlib
+_PAYLOAD_RAW = b"j"
+_PAYLOAD_ZLIB = b"z"
+
+def encode_payload(payload: bytes, compress_min_bytes: int) -> bytes:
+    """Упаковывает сериализованный ответ, сжимая большие страницы"""
+    if 0 < compress_min_bytes <= len(payload):
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            return _PAYLOAD_ZLIB + compressed
+    return _PAYLOAD_RAW + payload
+
+def decode_payload(data: bytes) -> bytes:
+    header, body = data[:1], data[1:]
+    if header == _PAYLOAD_ZLIB:
+        return zlib.decompress(body)
+    if header == _PAYLOAD_RAW:
+        return body
+    raise ValueError(f"Unknown cached payload format: {header!r}")
+
+# Меняет счетчик, только если он уже прогрет: отсутствующий ключ означает
+# "значение неизвестно, спроси БД", и INCRBY не должен создавать его с нуля
+_CHANGE_COUNTER_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if value < 0 then
+    redis.call('SET', KEYS[1], 0, 'KEEPTTL')
+    value = 0
+end
+return value
+"""
+
+# Исправляет счетчик, только если он не менялся с момента чтения (ARGV[1]):
+# инкремент, пришедший во время сверки, не затирается, а счетчик
+# проверяется снова при следующем проходе
+_CORRECT_COUNTER_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+UNREAD_NOTIFICATIONS_PREFIX = "unread:notifications:"
+
+# Множество друзей пользователя. Служебный элемент отмечает, что множество
+# загружено из БД целиком: SADD по отсутствующему ключу создаст множество без
+# него, и такое множество считается непрогретым
+FRIENDS_PREFIX = "friends:"
+FRIENDS_LOADED_MARKER = b"*"
+# Версия множества друзей: растет при каждом изменении дружбы пользователя
+FRIENDS_VERSION_PREFIX = "friends_version:"
+
+# Записывает множество, загруженное из БД, только если с начала загрузки
+# дружба пользователя не менялась (версия та же): иначе загрузка, начатая до
+# изменения, вернула бы в кеш устаревший состав
+_SET_FRIENDS_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('SADD', KEYS[1], ARGV[3])
+for i = 4, #ARGV, 1000 do
+    redis.call('SADD', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+def _search_key(search_type: str, query: str, params: dict) -> str:
+    return f"search:{search_type}:{query}:{json.dumps(params, sort_keys=True)}"
 
 class RedisClient:
-    def __init__(self):
-        self.client = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            password=settings.REDIS_PASSWORD,
-            decode_responses=True
-        )
-    
-    async def get_cached_search(self, search_type: str, query: str, params: dict) -> Optional[Any]:
-        cache_key = f"search:{search_type}:{query}:{json.dumps(params, sort_keys=True)}"
-        cached = self.client.get(cache_key)
+    def __init__(self, client: Optional[redis.Redis] = None):
+        # client можно передать явно (например, fakeredis в тестах)
+        if client is None:
+            pool = redis.ConnectionPool(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                password=settings.REDIS_PASSWORD or None,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT
+            )
+            client = redis.Redis(connection_pool=pool)
+        self.client = client
+        self._change_counter = client.register_script(_CHANGE_COUNTER_SCRIPT)
+        self._correct_counter = client.register_script(_CORRECT_COUNTER_SCRIPT)
+        self._set_friends = client.register_script(_SET_FRIENDS_SCRIPT)
+
+    async def close(self):
+        """Закрывает соединения пула (вызывается при остановке приложения)"""
+        await self.client.aclose(close_connection_pool=True)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Читает несколько JSON-значений за один запрос (MGET)"""
+        if not keys:
+            return []
+        values = await self.client.mget(keys)
+        return [json.loads(value) if value else None for value in values]
+
+    async def set_many(self, items: Dict[str, Any], ttl: int):
+        """Записывает несколько JSON-значений с TTL одним пайплайном"""
+        if not items:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.setex(key, ttl, json.dumps(value))
+            await pipe.execute()
+
+    async def delete_matching(self, pattern: str, batch_size: int = INVALIDATE_BATCH_SIZE) -> int:
+        """
+        Удаляет ключи по шаблону инкрементально: SCAN вместо блокирующего KEYS
+        и UNLINK пачками, чтобы освобождение памяти шло в фоне на стороне Redis
+        """
+        deleted = 0
+        batch = []
+        async for key in self.client.scan_iter(match=pattern, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                deleted += await self.client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += await self.client.unlink(*batch)
+        return deleted
+
+    async def get_cached_search_payload(self, search_type: str, query: str, params: dict) -> Optional[bytes]:
+        """Готовый JSON ответа из кеша (без десериализации) или None"""
+        cached = await self.client.get(_search_key(search_type, query, params))
         if cached:
-            return json.loads(cached)
+            return decode_payload(cached)
         return None
-    
-    async def set_cached_search(self, search_type: str, query: str, params: dict, results: Any, ttl: int = 300):
-        cache_key = f"search:{search_type}:{query}:{json.dumps(params, sort_keys=True)}"
-        self.client.setex(cache_key, ttl, json.dumps(results))
-    
-    async def invalidate_search_cache(self, search_type: str = None, query: str = None):
+
+    async def set_cached_search_payload(self, search_type: str, query: str, params: dict, payload: bytes, ttl: int = 300):
+        data = encode_payload(payload, settings.SEARCH_CACHE_COMPRESS_MIN_BYTES)
+        await self.client.setex(_search_key(search_type, query, params), ttl, data)
+
+    async def invalidate_search_cache(self, search_type: str = None, query: str = None) -> int:
         if search_type and query:
             pattern = f"search:{search_type}:{query}:*"
         elif search_type:
             pattern = f"search:{search_type}:*"
         else:
             pattern = "search:*"
-        
-        keys = self.client.keys(pattern)
+
+        return await self.delete_matching(pattern)
+
+    async def get_principal(self, user_id: str) -> Optional[dict]:
+        cached = await self.client.get(f"principal:{user_id}")
+        if cached:
+            return json.loads(cached)
+        return None
+
+    async def set_principal(self, user_id: str, payload: dict, ttl: int):
+        await self.client.setex(f"principal:{user_id}", ttl, json.dumps(payload))
+
+    async def delete_principal(self, user_id: str):
+        await self.client.unlink(f"principal:{user_id}")
+
+    async def get_unread_notifications(self, user_id: str) -> Optional[int]:
+        value = await self.client.get(f"{UNREAD_NOTIFICATIONS_PREFIX}{user_id}")
+        return int(value) if value is not None else None
+
+    async def set_unread_notifications(self, user_id: str, count: int, ttl: int):
+        await self.client.setex(f"{UNREAD_NOTIFICATIONS_PREFIX}{user_id}", ttl, count)
+
+    async def change_unread_notifications(self, user_id: str, delta: int) -> Optional[int]:
+        """Сдвигает прогретый счетчик на delta (не ниже нуля); None, если счетчика нет"""
+        # client явно: self.client могут подменить после создания скрипта
+        return await self._change_counter(
+            keys=[f"{UNREAD_NOTIFICATIONS_PREFIX}{user_id}"], args=[delta], client=self.client
+        )
+
+    async def change_unread_notifications_many(self, deltas: Dict[str, int]):
+        """Сдвигает несколько прогретых счетчиков одним пайплайном"""
+        if not deltas:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            for user_id, delta in deltas.items():
+                await self._change_counter(
+                    keys=[f"{UNREAD_NOTIFICATIONS_PREFIX}{user_id}"], args=[delta], client=pipe
+                )
+            await pipe.execute()
+
+    async def correct_unread_notifications(self, corrections: Dict[str, Tuple[int, int]], ttl: int) -> int:
+        """
+        Исправляет счетчики {user_id: (прочитанное значение, верное значение)}
+        одним пайплайном. Измененные после чтения пропускаются.
+        Возвращает число исправленных
+        """
+        if not corrections:
+            return 0
+        async with self.client.pipeline(transaction=False) as pipe:
+            for user_id, (expected, count) in corrections.items():
+                await self._correct_counter(
+                    keys=[f"{UNREAD_NOTIFICATIONS_PREFIX}{user_id}"], args=[expected, count, ttl], client=pipe
+                )
+            return sum(await pipe.execute())
+
+    async def scan_unread_notifications(self, batch_size: int = INVALIDATE_BATCH_SIZE):
+        """Итерирует пачки {user_id: count} всех прогретых счетчиков"""
+        keys = []
+        async for key in self.client.scan_iter(match=f"{UNREAD_NOTIFICATIONS_PREFIX}*", count=batch_size):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                yield await self._read_counters(keys)
+                keys = []
         if keys:
-            self.client.delete(*keys)
+            yield await self._read_counters(keys)
+
+    async def _read_counters(self, keys: List[bytes]) -> Dict[str, int]:
+        values = await self.client.mget(keys)
+        prefix_length = len(UNREAD_NOTIFICATIONS_PREFIX)
+        # Ключ мог истечь между SCAN и MGET
+        return {
+            key.decode()[prefix_length:]: int(value)
+            for key, value in zip(keys, values) if value is not None
+        }
+
+    async def is_friend(self, user_id: str, friend_id: str) -> Optional[bool]:
+        """Проверка дружбы одним SMISMEMBER; None, если множество не прогрето"""
+        is_member, loaded = await self.client.smismember(
+            f"{FRIENDS_PREFIX}{user_id}", [friend_id, FRIENDS_LOADED_MARKER]
+        )
+        return bool(is_member) if loaded else None
+
+    async def get_friend_ids(self, user_id: str) -> Optional[Set[str]]:
+        members = await self.client.smembers(f"{FRIENDS_PREFIX}{user_id}")
+        if FRIENDS_LOADED_MARKER not in members:
+            return None
+        members.discard(FRIENDS_LOADED_MARKER)
+        return {member.decode() for member in members}
+
+    async def get_friends_version(self, user_id: str) -> str:
+        """Версия множества друзей; читается до загрузки из БД и передается в set_friend_ids"""
+        version = await self.client.get(f"{FRIENDS_VERSION_PREFIX}{user_id}")
+        return version.decode() if version is not None else ""
+
+    async def set_friend_ids(self, user_id: str, friend_ids: Iterable[str], ttl: int, version: str) -> bool:
+        """Сохраняет множество, если версия не изменилась; False - множество устарело и не записано"""
+        return bool(await self._set_friends(
+            keys=[f"{FRIENDS_PREFIX}{user_id}", f"{FRIENDS_VERSION_PREFIX}{user_id}"],
+            args=[version, ttl, FRIENDS_LOADED_MARKER, *friend_ids],
+            client=self.client,
+        ))
+
+    async def invalidate_friendship(self, user_id: str, friend_id: str, ttl: int):
+        """
+        Сбрасывает множества обоих пользователей и повышает их версии, чтобы
+        параллельная загрузка из БД не записала состав до изменения
+        """
+        async with self.client.pipeline(transaction=True) as pipe:
+            for owner in (user_id, friend_id):
+                pipe.incr(f"{FRIENDS_VERSION_PREFIX}{owner}")
+                # Версия должна жить дольше любой загрузки, а не вечно
+                pipe.expire(f"{FRIENDS_VERSION_PREFIX}{owner}", ttl)
+                pipe.delete(f"{FRIENDS_PREFIX}{owner}")
+            await pipe.execute()
 
 # Create global Redis client instance
-redis_client = RedisClient()
\ No newline at end of file
+redis_client = RedisClient()
@@ -1,85 +1,167 @@
+import logging
 from sqlalchemy.ext.asyncio import AsyncSession  # Добавляем импорт
 from sqlalchemy import select, func, or_
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from uuid import UUID
+from pydantic import TypeAdapter
+from redis import RedisError
+from core.config import settings
+from core.pagination import after_cursor, decode_cursor, paginate
 from services.redis_service import redis_client
+from services.geo_service import within_radius
 
 from models import User, Place
+from schemas.user import UserResponse
+from schemas.place import PlaceResponse
 
-async def search_users(
-    db: AsyncSession,
+logger = logging.getLogger(__name__)
+
+# Ответы кешируются уже сериализованными по схемам ответа: в кеш не попадают
+# лишние колонки (password_hash, oauth_data), а попадание отдается клиенту как есть
+_users_adapter = TypeAdapter(List[UserResponse])
+_places_adapter = TypeAdapter(List[PlaceResponse])
+
+def serialize_users(users) -> bytes:
+    return _users_adapter.dump_json(_users_adapter.validate_python(users, from_attributes=True))
+
+def serialize_places(places) -> bytes:
+    return _places_adapter.dump_json(_places_adapter.validate_python(places, from_attributes=True))
+
+async def _get_cached_payload(search_type: str, query: str, params: dict) -> Optional[bytes]:
+    try:
+        return await redis_client.get_cached_search_payload(search_type, query, params)
+    except RedisError as e:
+        logger.debug(f"Failed to read search cache: {e}")
+        return None
+
+async def _set_cached_payload(search_type: str, query: str, params: dict, payload: bytes):
+    try:
+        await redis_client.set_cached_search_payload(
+            search_type, query, params, payload, ttl=settings.SEARCH_CACHE_TTL
+        )
+    except RedisError as e:
+        logger.debug(f"Failed to store search cache: {e}")
+
+def _search_users_query(
     query: str,
-    skip: int = 0,
-    limit: int = 50,
-    current_user_id: Optional[UUID] = None
+    skip: int,
+    limit: int,
+    current_user_id: Optional[UUID],
+    after: Optional[Tuple[float, UUID]]
 ):
-    # Проверяем кеш
-    params = {"skip": skip, "limit": limit, "current_user_id": str(current_user_id) if current_user_id else None}
-    cached = await redis_client.get_cached_search("users", query, params)
-    if cached:
-        return cached
-    
+    """SELECT (User, rank) для поиска пользователей"""
     search_query = func.plainto_tsquery('russian', query)
+    rank = func.ts_rank_cd(User.search_vector, search_query)
     
-    stmt = select(User).where(
+    stmt = select(User, rank).where(
         User.search_vector.op('@@')(search_query)
-    ).offset(skip).limit(limit)
-    
-    result = await db.execute(stmt)
-    users = result.scalars().all()
+    )
     
     # Если пользователь аутентифицирован, исключаем его из результатов
     if current_user_id:
-        users = [user for user in users if user.id != current_user_id]
-        
-    await redis_client.set_cached_search("users", query, params, users)
-    return users
+        stmt = stmt.where(User.id != current_user_id)
+    
+    condition = after_cursor((rank, User.id), after)
+    if condition is not None:
+        stmt = stmt.where(condition)
+    
+    # Отбор по GIN-индексу, сортировка по релевантности с учетом весов полей
+    return stmt.order_by(rank.desc(), User.id.desc()).offset(skip).limit(limit)
 
-async def search_places(
-    db: AsyncSession,
+def _search_places_query(
     query: str,
-    latitude: Optional[float] = None,
-    longitude: Optional[float] = None,
-    radius_km: Optional[float] = None,
-    skip: int = 0,
-    limit: int = 50
+    latitude: Optional[float],
+    longitude: Optional[float],
+    radius_km: Optional[float],
+    skip: int,
+    limit: int,
+    after: Optional[Tuple[float, UUID]]
 ):
+    """SELECT (Place, rank) для поиска мест"""
     search_query = func.plainto_tsquery('russian', query)
+    rank = func.ts_rank_cd(Place.search_vector, search_query)
     
-    stmt = select(Place).where(
-        Place.search_vector.op('@@')(search_query) &
+    stmt = select(Place, rank).where(
+        Place.search_vector.op('@@')(search_query),
         Place.is_public == True
     )
     
     # Если указаны координаты, добавляем фильтр по расстоянию
-    if latitude and longitude and radius_km:
-        # Преобразуем км в градусы (примерно 1km = 0.009 градусов)
-        radius_deg = radius_km * 0.009
-        stmt = stmt.where(
-            (Place.latitude.between(latitude - radius_deg, latitude + radius_deg)) &
-            (Place.longitude.between(longitude - radius_deg, longitude + radius_deg))
-        )
+    if latitude is not None and longitude is not None and radius_km:
+        stmt = stmt.where(within_radius(latitude, longitude, radius_km))
     
-    stmt = stmt.offset(skip).limit(limit)
+    condition = after_cursor((rank, Place.id), after)
+    if condition is not None:
+        stmt = stmt.where(condition)
     
-    result = await db.execute(stmt)
-    places = result.scalars().all()
-    return places
+    return stmt.order_by(rank.desc(), Place.id.desc()).offset(skip).limit(limit)
 
-async def global_search(
+def _pack_page(payload: bytes, next_cursor: Optional[str]) -> bytes:
+    # Курсор (base64url, без переводов строк) хранится в кеше перед JSON страницы
+    return (next_cursor or "").encode() + b"\n" + payload
+
+def _unpack_page(data: bytes) -> Tuple[bytes, Optional[str]]:
+    cursor, payload = data.split(b"\n", 1)
+    return payload, cursor.decode() or None
+
+async def search_users_payload(
+    db: AsyncSession,
+    query: str,
+    skip: int = 0,
+    limit: int = 50,
+    current_user_id: Optional[UUID] = None,
+    cursor: Optional[str] = None
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Поиск пользователей, сериализованный в JSON List[UserResponse], с кешем в Redis.
+    Возвращает (payload, курсор следующей страницы)
+    """
+    params = {"skip": skip, "limit": limit, "current_user_id": str(current_user_id) if current_user_id else None, "cursor": cursor}
+    cached = await _get_cached_payload("users", query, params)
+    if cached is not None:
+        return _unpack_page(cached)
+
+    after = decode_cursor(cursor, (float, UUID)) if cursor else None
+    result = await db.execute(_search_users_query(query, skip, limit + 1, current_user_id, after))
+    rows, next_cursor = paginate(result.all(), limit, lambda row: (row[1], row[0].id))
+    payload = serialize_users([user for user, _ in rows])
+    await _set_cached_payload("users", query, params, _pack_page(payload, next_cursor))
+    return payload, next_cursor
+
+async def search_places_payload(
+    db: AsyncSession,
+    query: str,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius_km: Optional[float] = None,
+    skip: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Поиск мест, сериализованный в JSON List[PlaceResponse], с кешем в Redis.
+    Возвращает (payload, курсор следующей страницы)
+    """
+    params = {"lat": latitude, "lng": longitude, "radius_km": radius_km, "skip": skip, "limit": limit, "cursor": cursor}
+    cached = await _get_cached_payload("places", query, params)
+    if cached is not None:
+        return _unpack_page(cached)
+
+    after = decode_cursor(cursor, (float, UUID)) if cursor else None
+    result = await db.execute(_search_places_query(query, latitude, longitude, radius_km, skip, limit + 1, after))
+    rows, next_cursor = paginate(result.all(), limit, lambda row: (row[1], row[0].id))
+    payload = serialize_places([place for place, _ in rows])
+    await _set_cached_payload("places", query, params, _pack_page(payload, next_cursor))
+    return payload, next_cursor
+
+async def global_search_payload(
     db: AsyncSession,
     query: str,
     current_user_id: Optional[UUID] = None,
     skip: int = 0,
     limit: int = 50
-):
-    # Ищем пользователей
-    users = await search_users(db, query, skip, limit, current_user_id)
-    
-    # Ищем места
-    places = await search_places(db, query, skip=skip, limit=limit)
-    
-    return {
-        "users": users,
-        "places": places
-    }
\ No newline at end of file
+) -> bytes:
+    """JSON-ответ глобального поиска ({"users", "places"}), собранный из закешированных частей"""
+    users, _ = await search_users_payload(db, query, skip, limit, current_user_id)
+    places, _ = await search_places_payload(db, query, skip=skip, limit=limit)
+    return b'{"users":' + users + b',"places":' + places + b'}'
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set, Tuple
+from uuid import UUID
+
+class TypingState:
+    """
+    Кто кому сейчас печатает, для получателей на этом воркере.
+    Отправители хранятся множествами, а каждая отметка истекает через ttl,
+    если клиент не прислал is_typing=false. Изменения по получателю копятся
+    и отправляются одним кадром не чаще раза в flush_interval
+    """
+    def __init__(
+        self,
+        ttl: float,
+        flush_interval: float,
+        send: Callable[[UUID, dict], None],
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._send = send
+        self._clock = clock
+        self._typing: Dict[UUID, Set[UUID]] = {}
+        # Сроки отметок в порядке истечения: TTL общий, а обновленная отметка
+        # переносится в конец, поэтому истекшие всегда в начале
+        self._deadlines: "OrderedDict[Tuple[UUID, UUID], float]" = OrderedDict()
+        self._dirty: Set[UUID] = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def typing_users(self, receiver_id: UUID) -> Set[UUID]:
+        return self._typing.get(receiver_id, set())
+
+    def update(self, receiver_id: UUID, sender_id: UUID, is_typing: bool):
+        key = (receiver_id, sender_id)
+        self._deadlines.pop(key, None)
+        senders = self._typing.get(receiver_id)
+        if is_typing:
+            self._deadlines[key] = self._clock() + self.ttl
+            if senders is None:
+                senders = self._typing[receiver_id] = set()
+            if sender_id not in senders:
+                senders.add(sender_id)
+                self._dirty.add(receiver_id)
+        elif senders is not None and sender_id in senders:
+            self._remove(receiver_id, sender_id)
+        self._schedule()
+
+    def forget_receiver(self, receiver_id: UUID):
+        """Получатель ушел с воркера; его сроки в _deadlines отбросятся при истечении"""
+        self._typing.pop(receiver_id, None)
+        self._dirty.discard(receiver_id)
+
+    def flush(self):
+        """Снимает истекшие отметки и отправляет по кадру каждому измененному получателю"""
+        self._timer = None
+        now = self._clock()
+        while self._deadlines:
+            (receiver_id, sender_id), deadline = next(iter(self._deadlines.items()))
+            if deadline > now:
+                break
+            self._deadlines.popitem(last=False)
+            if sender_id in self._typing.get(receiver_id, ()):
+                self._remove(receiver_id, sender_id)
+        
+        dirty, self._dirty = self._dirty, set()
+        for receiver_id in dirty:
+            self._send(receiver_id, {
+                "type": "typing",
+                "typing_users": [str(sender_id) for sender_id in self._typing.get(receiver_id, ())]
+            })
+        self._schedule()
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _remove(self, receiver_id: UUID, sender_id: UUID):
+        senders = self._typing[receiver_id]
+        senders.discard(sender_id)
+        if not senders:
+            del self._typing[receiver_id]
+        self._dirty.add(receiver_id)
+
+    def _schedule(self):
+        # Таймер тикает, только пока есть что отправить или чему истекать
+        if self._timer is None and (self._dirty or self._deadlines):
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
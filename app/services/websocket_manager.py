@@ -1,51 +1,235 @@
-from fastapi import WebSocket
-from typing import Dict, List
-import json
+import asyncio
+import logging
+from collections import deque
+from fastapi import WebSocket, status
+from redis import RedisError
+from typing import Deque, Dict, Optional, Set
 from uuid import UUID
 
+from core.cache import TTLCache
+from core.config import settings
+from core.monitoring import (
+    WS_CONNECTIONS,
+    WS_SEND_QUEUE_FRAMES,
+    WS_DROPPED_FRAMES,
+    WS_SLOW_CONSUMER_DISCONNECTS,
+)
+from models.message import Message
+from services.typing_state import TypingState
+from services.ws_backplane import Backplane, create_backplane
+
+logger = logging.getLogger(__name__)
+
+# Кадры, которые можно потерять без последствий: следующий их заменит
+DROPPABLE_FRAME_TYPES = {"typing"}
+
+class ClientConnection:
+    """
+    Один сокет пользователя с ограниченной очередью исходящих кадров.
+    Очередь разбирает своя задача-писатель, поэтому медленный клиент
+    не задерживает того, кто ему пишет
+    """
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: UUID,
+        max_queue: int,
+        slow_consumer_policy: str,
+        closing_tasks: Set[asyncio.Task],
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.slow_consumer_policy = slow_consumer_policy
+        self.closed = False
+        # Задачи закрытия сокетов держит менеджер: на задачу без ссылок
+        # event loop хранит только слабую, и ее может собрать GC
+        self._closing_tasks = closing_tasks
+        self._frames: Deque[dict] = deque()
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._drain())
+
+    def send(self, frame: dict) -> bool:
+        """Ставит кадр в очередь без ожидания; False, если кадр отброшен"""
+        if self.closed:
+            return False
+        frame_type = frame.get("type")
+        
+        # Сначала теряем typing: они отбрасываются уже при половине очереди
+        if frame_type in DROPPABLE_FRAME_TYPES and len(self._frames) >= self.max_queue // 2:
+            WS_DROPPED_FRAMES.labels(type=frame_type, reason="backpressure").inc()
+            return False
+        
+        if len(self._frames) >= self.max_queue and not self._evict_droppable():
+            WS_DROPPED_FRAMES.labels(type=frame_type, reason="overflow").inc()
+            if self.slow_consumer_policy == "disconnect":
+                WS_SLOW_CONSUMER_DISCONNECTS.inc()
+                logger.info(f"Disconnecting slow WebSocket consumer {self.user_id}")
+                self.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return False
+        
+        self._frames.append(frame)
+        WS_SEND_QUEUE_FRAMES.inc()
+        self._ready.set()
+        return True
+
+    def close(self, code: Optional[int] = None):
+        """Останавливает писателя; с code закрывает и сам сокет"""
+        if self.closed:
+            return
+        self.closed = True
+        WS_SEND_QUEUE_FRAMES.dec(len(self._frames))
+        self._frames.clear()
+        self._writer.cancel()
+        if code is not None:
+            task = asyncio.create_task(self._close_socket(code))
+            self._closing_tasks.add(task)
+            task.add_done_callback(self._closing_tasks.discard)
+
+    async def wait_closed(self):
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+
+    def _evict_droppable(self) -> bool:
+        for index, queued in enumerate(self._frames):
+            if queued.get("type") in DROPPABLE_FRAME_TYPES:
+                del self._frames[index]
+                WS_SEND_QUEUE_FRAMES.dec()
+                WS_DROPPED_FRAMES.labels(type=queued["type"], reason="evicted").inc()
+                return True
+        return False
+
+    async def _drain(self):
+        while True:
+            await self._ready.wait()
+            while self._frames:
+                frame = self._frames.popleft()
+                WS_SEND_QUEUE_FRAMES.dec()
+                try:
+                    async with asyncio.timeout(settings.WS_SEND_TIMEOUT):
+                        await self.websocket.send_json(frame)
+                except TimeoutError:
+                    WS_SLOW_CONSUMER_DISCONNECTS.inc()
+                    logger.info(f"WebSocket send to {self.user_id} timed out")
+                    self.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                    return
+                except Exception:
+                    # Клиент ушел: цикл приема получит WebSocketDisconnect и уберет соединение
+                    self.close()
+                    return
+            self._ready.clear()
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception as e:
+            # Клиент мог уйти сам раньше, чем мы закрыли сокет
+            logger.debug(f"Failed to close WebSocket of {self.user_id}: {e}")
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[UUID, WebSocket] = {}
-        self.typing_users: Dict[UUID, List[UUID]] = {}
+    """
+    Сокеты пользователей, подключенных к этому воркеру (у пользователя их может
+    быть несколько, по одному на устройство). События отправляются через
+    backplane в канал получателя, поэтому доходят до него, к какому бы
+    воркеру он ни был подключен
+    """
+    def __init__(self, backplane: Optional[Backplane] = None):
+        self.backplane = backplane or create_backplane()
+        self.active_connections: Dict[UUID, Set[ClientConnection]] = {}
+        # Незавершенные закрытия сокетов (см. ClientConnection.close)
+        self._closing_tasks: Set[asyncio.Task] = set()
+        self.typing = TypingState(
+            settings.WS_TYPING_TTL, settings.WS_TYPING_FLUSH_INTERVAL, self._send_local
+        )
+        # Последнее опубликованное состояние набора по паре (отправитель, получатель):
+        # повторное is_typing=true по каждой клавише не уходит в backplane
+        self._published_typing = TTLCache(maxsize=100_000, ttl=settings.WS_TYPING_TTL / 3)
 
-    async def connect(self, websocket: WebSocket, user_id: UUID):
+    async def connect(self, websocket: WebSocket, user_id: UUID) -> ClientConnection:
         await websocket.accept()
-        self.active_connections[user_id] = websocket
-
-    def disconnect(self, websocket: WebSocket, user_id: UUID):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        # Remove from typing users
-        for receiver_id, typing_list in self.typing_users.items():
-            if user_id in typing_list:
-                typing_list.remove(user_id)
-
-    async def send_personal_message(self, message: str, receiver_id: UUID, sender_id: UUID):
-        if receiver_id in self.active_connections:
-            websocket = self.active_connections[receiver_id]
-            await websocket.send_json({
-                "type": "chat_message",
-                "message": message,
-                "sender_id": str(sender_id),
-                "timestamp": "now"  # You might want to use actual timestamp
-            })
+        connection = ClientConnection(
+            websocket, user_id, settings.WS_SEND_QUEUE_SIZE, settings.WS_SLOW_CONSUMER_POLICY,
+            self._closing_tasks
+        )
+        connections = self.active_connections.setdefault(user_id, set())
+        connections.add(connection)
+        WS_CONNECTIONS.inc()
+        if len(connections) == 1:
+            await self.backplane.subscribe(user_id, self.deliver)
+        return connection
+
+    async def disconnect(self, connection: ClientConnection):
+        user_id = connection.user_id
+        connection.close()
+        connections = self.active_connections.get(user_id)
+        if connections is None or connection not in connections:
+            return
+        connections.discard(connection)
+        WS_CONNECTIONS.dec()
+        if connections:
+            return
+        del self.active_connections[user_id]
+        await self.backplane.unsubscribe(user_id, self.deliver)
+        # Отметки набора этого пользователя у других получателей истекут сами
+        self.typing.forget_receiver(user_id)
+
+    async def send_personal_message(self, message: Message):
+        """Push сохраненного сообщения получателю"""
+        await self._publish(message.receiver_id, {
+            "type": "chat_message",
+            "id": str(message.id),
+            "message": message.content,
+            "sender_id": str(message.sender_id),
+            "timestamp": message.created_at.isoformat()
+        })
 
     async def broadcast_typing(self, receiver_id: UUID, sender_id: UUID, is_typing: bool):
-        if receiver_id in self.active_connections:
-            websocket = self.active_connections[receiver_id]
-            
-            if is_typing:
-                if receiver_id not in self.typing_users:
-                    self.typing_users[receiver_id] = []
-                if sender_id not in self.typing_users[receiver_id]:
-                    self.typing_users[receiver_id].append(sender_id)
-            else:
-                if receiver_id in self.typing_users and sender_id in self.typing_users[receiver_id]:
-                    self.typing_users[receiver_id].remove(sender_id)
-            
-            await websocket.send_json({
-                "type": "typing",
-                "user_id": str(sender_id),
-                "is_typing": is_typing,
-                "typing_users": [str(uid) for uid in self.typing_users.get(receiver_id, [])]
-            })
\ No newline at end of file
+        # Состояние набора хранится на воркере получателя, см. deliver
+        key = (sender_id, receiver_id)
+        if self._published_typing.get(key) == is_typing:
+            return
+        self._published_typing.set(key, is_typing)
+        await self._publish(receiver_id, {
+            "type": "typing",
+            "user_id": str(sender_id),
+            "is_typing": is_typing
+        })
+
+    async def _publish(self, receiver_id: UUID, event: dict):
+        # Живая доставка - best effort: сообщение уже сохранено, клиент дочитает его из истории
+        try:
+            await self.backplane.publish(receiver_id, event)
+        except (RedisError, OSError) as e:
+            logger.warning(f"Failed to publish {event['type']} to {receiver_id}: {e}")
+
+    async def deliver(self, receiver_id: UUID, event: dict):
+        """Ставит событие из backplane в очереди всех локальных сокетов получателя"""
+        if receiver_id not in self.active_connections:
+            return
+        
+        if event["type"] == "typing":
+            # Кадр уйдет при ближайшей отправке накопленных изменений
+            self.typing.update(receiver_id, UUID(event["user_id"]), event["is_typing"])
+            return
+        if event["type"] == "chat_message":
+            # Отправленное сообщение завершает набор
+            self.typing.update(receiver_id, UUID(event["sender_id"]), False)
+        self._send_local(receiver_id, event)
+
+    def _send_local(self, receiver_id: UUID, frame: dict):
+        for connection in list(self.active_connections.get(receiver_id, ())):
+            connection.send(frame)
+
+    async def close(self):
+        self.typing.close()
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections):
+                connection.close()
+        if self._closing_tasks:
+            await asyncio.gather(*self._closing_tasks, return_exceptions=True)
+        await self.backplane.close()
+
+# Один менеджер на воркер
+manager = ConnectionManager()
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional
+from uuid import UUID
+
+from redis import RedisError
+from redis.asyncio.client import PubSub
+
+from core.config import settings
+from services.redis_service import RedisClient, redis_client
+
+logger = logging.getLogger(__name__)
+
+# Обработчик события для пользователя, подключенного к этому воркеру
+EventHandler = Callable[[UUID, dict], Awaitable[None]]
+
+# Канал пользователя: воркер подписан только на каналы своих соединений,
+# поэтому стоимость доставки не зависит от общего числа подключений
+WS_CHANNEL_PREFIX = "ws:user:"
+
+
+class Backplane(ABC):
+    """
+    Доставка событий WebSocket между воркерами: событие публикуется в канал
+    получателя и приходит тем воркерам, где у него открыт сокет
+    """
+
+    @abstractmethod
+    async def publish(self, user_id: UUID, event: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def subscribe(self, user_id: UUID, handler: EventHandler) -> None:
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, user_id: UUID, handler: EventHandler) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryBackplane(Backplane):
+    """Доставка внутри процесса: один воркер или тесты (несколько менеджеров на одном объекте)"""
+
+    def __init__(self):
+        self._handlers: Dict[UUID, List[EventHandler]] = {}
+
+    async def publish(self, user_id: UUID, event: dict) -> None:
+        # Копия как после сериализации: получатель не делит объект с отправителем
+        event = json.loads(json.dumps(event))
+        for handler in list(self._handlers.get(user_id, ())):
+            await handler(user_id, event)
+
+    async def subscribe(self, user_id: UUID, handler: EventHandler) -> None:
+        handlers = self._handlers.setdefault(user_id, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    async def unsubscribe(self, user_id: UUID, handler: EventHandler) -> None:
+        handlers = self._handlers.get(user_id, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self._handlers.pop(user_id, None)
+
+
+class RedisBackplane(Backplane):
+    """
+    Redis pub/sub с каналом на пользователя. Воркер держит одно pub/sub
+    соединение и подписывается на каналы при подключении пользователей
+    """
+
+    def __init__(self, redis: RedisClient = redis_client):
+        self._redis = redis
+        self._handlers: Dict[UUID, EventHandler] = {}
+        self._pubsub: Optional[PubSub] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def publish(self, user_id: UUID, event: dict) -> None:
+        await self._redis.client.publish(f"{WS_CHANNEL_PREFIX}{user_id}", json.dumps(event))
+
+    async def subscribe(self, user_id: UUID, handler: EventHandler) -> None:
+        self._handlers[user_id] = handler
+        if self._pubsub is None:
+            self._pubsub = self._redis.client.pubsub()
+        await self._pubsub.subscribe(f"{WS_CHANNEL_PREFIX}{user_id}")
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def unsubscribe(self, user_id: UUID, handler: EventHandler) -> None:
+        if self._handlers.get(user_id) is not handler:
+            return
+        del self._handlers[user_id]
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(f"{WS_CHANNEL_PREFIX}{user_id}")
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self._handlers.clear()
+
+    async def _read(self):
+        prefix_length = len(WS_CHANNEL_PREFIX)
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except RedisError as e:
+                logger.warning(f"WebSocket backplane read failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            user_id = UUID(message["channel"].decode()[prefix_length:])
+            handler = self._handlers.get(user_id)
+            if handler is None:
+                continue
+            try:
+                await handler(user_id, json.loads(message["data"]))
+            except Exception:
+                logger.exception(f"Failed to deliver WebSocket event to {user_id}")
+
+
+def create_backplane(kind: str = None) -> Backplane:
+    kind = kind or settings.WS_BACKPLANE
+    if kind == "redis":
+        return RedisBackplane()
+    if kind == "memory":
+        return InMemoryBackplane()
+    raise ValueError(f"Unknown WS_BACKPLANE: {kind}")
@@ -15,6 +15,8 @@ logging.getLogger("sqlalchemy.pool").setLevel(logging.WARNING)
 
 # Устанавливаем флаг тестирования
 os.environ["TESTING"] = "True"
+# Ленивая загрузка связей в тестах - ошибка, а не скрытый N+1
+os.environ["DB_STRICT_LAZY_LOAD"] = "True"
 
 # Устанавливаем переменные окружения, если они не заданы
 if not os.getenv("DB_HOST"):
@@ -38,7 +40,7 @@ if not os.getenv("SECRET_KEY"):
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app
-from core.database import Base, get_db
+from core.database import Base, get_db, get_read_db
 
 # Тестовая база данных
 # Тестовая база данных
@@ -94,6 +96,7 @@ def client(db_session):
     async def override_get_db():
         yield db_session
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
@@ -1,8 +1,24 @@
 import pytest
+from datetime import timedelta
 from fastapi import status
+from fakeredis import aioredis
+from jose import JWTError
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from models.collection import Collection, CollectionRoute
+from models.conversation import Conversation
+from models.friend import FriendRequest, FriendStatus, Friendship
+from models.message import Message
+from models.notification import Notification, NotificationType
+from models.photo import Photo
+from models.place import Place
+from models.reaction import Reaction
+from models.review import Review
+from models.route import Route
 from models.user import User
-from services.auth_service import hash_password, generate_salt
+from services import auth_service
+from services.auth_service import hash_password, generate_salt, create_access_token, decode_access_token
+from services.redis_service import redis_client
 
 # @pytest.mark.asyncio
 # async def test_register_user(client, db_session: AsyncSession):
@@ -82,4 +98,68 @@ async def test_login_user(client, db_session: AsyncSession):
 #     login_data = {"login": "wrong@example.com", "password": "WrongPassword"}
 #     response = client.post("/api/v1/auth/login", json=login_data)
     
-#     assert response.status_code == status.HTTP_401_UNAUTHORIZED
\ No newline at end of file
+#     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+def test_decode_access_token_cache():
+    """Проверенные claims кешируются не дольше exp токена, ошибки не кешируются"""
+    auth_service._decoded_tokens.clear()
+
+    token = create_access_token(data={"sub": "user"}, expires_delta=timedelta(minutes=5))
+    payload = decode_access_token(token)
+    assert payload["sub"] == "user"
+    assert decode_access_token(token) is payload
+
+    # Истекший токен отклоняется и не попадает в кеш
+    expired_token = create_access_token(data={"sub": "expired"}, expires_delta=timedelta(seconds=-1))
+    with pytest.raises(JWTError):
+        decode_access_token(expired_token)
+    assert len(auth_service._decoded_tokens) == 1
+
+    with pytest.raises(JWTError):
+        decode_access_token(token[:-2] + "xx")
+    assert len(auth_service._decoded_tokens) == 1
+
+@pytest.mark.asyncio
+async def test_delete_account_with_activity(client, db_session: AsyncSession, monkeypatch):
+    """Удаление аккаунта удаляет зависимые строки, у внешних ключей которых нет ON DELETE"""
+    monkeypatch.setattr(redis_client, "client", aioredis.FakeRedis())
+    user = User(email="gone@example.com", username="gone")
+    other = User(email="stays@example.com", username="stays")
+    db_session.add_all([user, other])
+    await db_session.commit()
+
+    low_id, high_id = Conversation.pair(user.id, other.id)
+    conversation = Conversation(user_low_id=low_id, user_high_id=high_id)
+    place = Place(name="Парк", latitude=55.75, longitude=37.61, created_by=user.id)
+    db_session.add_all([conversation, place])
+    await db_session.commit()
+    # Отзыв и фото другого пользователя на месте удаляемого
+    review = Review(place_id=place.id, user_id=other.id, rating=5)
+    db_session.add_all([
+        Message(conversation_id=conversation.id, sender_id=user.id, receiver_id=other.id, content="привет"),
+        Notification(user_id=user.id, type=NotificationType.SYSTEM, title="t", message="m"),
+        Photo(place_id=place.id, user_id=other.id, filename="photo.jpg", original_url="http://storage/photo.jpg"),
+        FriendRequest(sender_id=user.id, receiver_id=other.id, status=FriendStatus.ACCEPTED),
+        Friendship(user_id=user.id, friend_id=other.id),
+        Friendship(user_id=other.id, friend_id=user.id),
+        review,
+    ])
+    await db_session.commit()
+    route = Route(name="Маршрут", created_by=user.id)
+    collection = Collection(name="Хочу", type="want_to_visit", user_id=other.id)
+    db_session.add_all([Reaction(review_id=review.id, user_id=other.id, type="like"), route, collection])
+    await db_session.commit()
+    db_session.add(CollectionRoute(collection_id=collection.id, route_id=route.id))
+    await db_session.commit()
+
+    other_id = other.id
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': str(user.id)})}"}
+    response = client.delete("/api/v1/auth/delete-account", headers=headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    db_session.expire_all()
+    for model in (
+        Message, Notification, Place, Review, Reaction, Photo, FriendRequest, Friendship, Conversation, Route, CollectionRoute
+    ):
+        assert (await db_session.execute(select(model))).scalars().all() == []
+    assert (await db_session.execute(select(User.id))).scalars().all() == [other_id]
+    assert len((await db_session.execute(select(Collection))).scalars().all()) == 1
@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.batching import BatchWriter
+from models.notification import NotificationType
+from models.user import User
+from schemas.notification import NotificationCreate, NotificationResponse
+from services.notification_service import create_notifications
+
+@pytest.mark.asyncio
+async def test_writer_coalesces_items():
+    batches = []
+
+    async def flush_batch(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    writer = BatchWriter("test", flush_batch, max_delay=0.01, max_batch_size=3)
+    results = await asyncio.gather(*(writer.submit(i) for i in range(5)))
+
+    assert results == [0, 10, 20, 30, 40]
+    # Первые три ушли по размеру пачки, остальные - по таймеру
+    assert batches == [[0, 1, 2], [3, 4]]
+
+    writer.add(5)
+    writer.add(6)
+    await writer.flush()
+    assert batches[-1] == [5, 6]
+
+@pytest.mark.asyncio
+async def test_writer_propagates_errors():
+    async def flush_batch(items):
+        raise RuntimeError("db is down")
+
+    writer = BatchWriter("test", flush_batch, max_delay=0.01, max_batch_size=10)
+    writer.add(1)
+    with pytest.raises(RuntimeError):
+        await writer.submit(2)
+
+@pytest.mark.asyncio
+async def test_bulk_create_notifications(db_session: AsyncSession):
+    users = [User(email=f"u{i}@example.com", username=f"u{i}") for i in range(3)]
+    db_session.add_all(users)
+    await db_session.commit()
+
+    notifications = await create_notifications(db_session, [
+        NotificationCreate(user_id=user.id, type=NotificationType.SYSTEM, title=f"n{i}", message="m", metadata={"i": i})
+        for i, user in enumerate(users)
+    ])
+
+    assert [notification.user_id for notification in notifications] == [user.id for user in users]
+    assert [notification.metadata_info for notification in notifications] == [{"i": 0}, {"i": 1}, {"i": 2}]
+    assert all(notification.is_read is False for notification in notifications)
+    assert NotificationResponse.model_validate(notifications[1]).metadata == {"i": 1}
@@ -0,0 +1,128 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.batching import BatchWriter
+from models.conversation import Conversation
+from models.message import Message
+from models.user import User
+from services import message_service
+from services.message_service import (
+    get_conversation_messages,
+    get_conversations,
+    mark_conversation_read,
+    mark_message_read,
+    record_messages,
+)
+
+@pytest.mark.asyncio
+async def test_record_messages_maintains_conversation(db_session: AsyncSession):
+    """Одна строка на пару, последнее сообщение и счетчики непрочитанных"""
+    me = User(email="me@example.com", username="me")
+    peer = User(email="peer@example.com", username="peer")
+    db_session.add_all([me, peer])
+    await db_session.flush()
+
+    start = datetime(2026, 1, 1)
+    await record_messages(db_session, [
+        Message(sender_id=me.id, receiver_id=peer.id, content="привет", created_at=start),
+        Message(sender_id=peer.id, receiver_id=me.id, content="и тебе", created_at=start + timedelta(seconds=1)),
+    ])
+    # Запоздавшее сообщение не должно затереть последнее
+    late = Message(sender_id=me.id, receiver_id=peer.id, content="старое", created_at=start - timedelta(seconds=1))
+    await record_messages(db_session, [late])
+
+    conversations = (await db_session.execute(select(Conversation))).scalars().all()
+    assert len(conversations) == 1
+    conversation = conversations[0]
+    await db_session.refresh(conversation)
+    assert (conversation.user_low_id, conversation.user_high_id) == Conversation.pair(me.id, peer.id)
+    assert conversation.last_message_preview == "и тебе"
+    assert conversation.last_sender_id == peer.id
+    assert conversation.unread_for(me.id) == 1
+    assert conversation.unread_for(peer.id) == 2
+
+    await mark_message_read(db_session, late)
+    await db_session.refresh(conversation)
+    assert conversation.unread_for(peer.id) == 1
+
+    assert await mark_conversation_read(db_session, peer.id, me.id) == 1
+    await db_session.refresh(conversation)
+    assert conversation.unread_for(peer.id) == 0
+    assert conversation.unread_for(me.id) == 1
+
+    messages = await get_conversation_messages(db_session, peer.id, me.id)
+    assert [message.content for message in messages] == ["и тебе", "привет", "старое"]
+
+@pytest.mark.asyncio
+async def test_record_messages_uses_database_clock(db_session: AsyncSession, monkeypatch):
+    """Время сообщения ставит БД: часы воркера (здесь - сбитые на год) не используются"""
+    class SkewedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) - timedelta(days=365)
+
+    monkeypatch.setattr(message_service, "datetime", SkewedDatetime)
+    me = User(email="me@example.com", username="me")
+    peer = User(email="peer@example.com", username="peer")
+    db_session.add_all([me, peer])
+    await db_session.flush()
+
+    first = Message(sender_id=me.id, receiver_id=peer.id, content="первое")
+    second = Message(sender_id=peer.id, receiver_id=me.id, content="второе")
+    await record_messages(db_session, [first, second])
+    database_now = await db_session.scalar(select(func.localtimestamp()))
+
+    assert first.created_at == second.created_at
+    assert abs(database_now - first.created_at) < timedelta(minutes=1)
+    conversation = (await db_session.execute(select(Conversation))).scalars().one()
+    await db_session.refresh(conversation)
+    assert conversation.last_message_at == first.created_at
+    # Равное время: последним считается сообщение с большим id, как в курсорах
+    assert conversation.last_message_id == max(first.id, second.id)
+
+@pytest.mark.asyncio
+async def test_inbox_orders_by_last_message(db_session: AsyncSession):
+    me = User(email="me@example.com", username="me")
+    peers = [User(email=f"p{i}@example.com", username=f"p{i}") for i in range(5)]
+    db_session.add_all([me, *peers])
+    await db_session.flush()
+
+    start = datetime(2026, 1, 1)
+    await record_messages(db_session, [
+        Message(sender_id=peer.id, receiver_id=me.id, content=f"от {i}", created_at=start + timedelta(minutes=i))
+        for i, peer in enumerate(peers)
+    ])
+
+    first = await get_conversations(db_session, me.id, limit=3)
+    last = first[-1]
+    second = await get_conversations(db_session, me.id, limit=3, after=(last.last_message_at, last.id))
+    inbox = [conversation.peer_of(me.id) for conversation in first + second]
+    assert inbox == [peer.id for peer in reversed(peers)]
+    assert all(conversation.unread_for(me.id) == 1 for conversation in first + second)
+
+@pytest.mark.asyncio
+async def test_message_writer_isolates_bad_rows(db_session: AsyncSession, async_session_maker, monkeypatch):
+    """Одна пачка - один коммит; сообщение несуществующему получателю не ломает остальные"""
+    monkeypatch.setattr(message_service, "AsyncSessionLocal", async_session_maker)
+    me = User(email="me@example.com", username="me")
+    peer = User(email="peer@example.com", username="peer")
+    db_session.add_all([me, peer])
+    await db_session.commit()
+
+    writer = BatchWriter("test_messages", message_service._write_messages, max_delay=0.01, max_batch_size=100)
+    results = await asyncio.gather(
+        writer.submit(Message(sender_id=me.id, receiver_id=peer.id, content="раз")),
+        writer.submit(Message(sender_id=me.id, receiver_id=uuid4(), content="никому")),
+        writer.submit(Message(sender_id=peer.id, receiver_id=me.id, content="два")),
+        return_exceptions=True
+    )
+
+    assert isinstance(results[1], IntegrityError)
+    assert [result.content for result in (results[0], results[2])] == ["раз", "два"]
+    messages = await get_conversation_messages(db_session, me.id, peer.id)
+    assert sorted(message.content for message in messages) == ["два", "раз"]
@@ -0,0 +1,82 @@
+import pytest
+from types import SimpleNamespace
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from core.database import get_engine_options, get_connect_args, InstrumentedQueuePool
+from tests.conftest import TEST_DATABASE_URL
+
+def make_config(**overrides):
+    config = dict(
+        DB_POOL_MODE="queue",
+        DB_POOL_SIZE=2,
+        DB_MAX_OVERFLOW=1,
+        DB_POOL_RECYCLE=60,
+        DB_POOL_PRE_PING=True,
+        DB_POOL_TIMEOUT=1.0,
+        DB_ENGINE_PROFILE="direct",
+        DB_PREPARED_STATEMENT_NAMES="unique",
+        DB_PREPARED_STATEMENT_CACHE_SIZE=100,
+    )
+    config.update(overrides)
+    return SimpleNamespace(**config)
+
+def test_engine_options_null_pool():
+    options = get_engine_options(make_config(DB_POOL_MODE="null"))
+    assert options["poolclass"] is NullPool
+
+def test_engine_options_unknown_mode():
+    with pytest.raises(ValueError):
+        get_engine_options(make_config(DB_POOL_MODE="bogus"))
+
+def test_connect_args_pgbouncer_profile():
+    unique = get_connect_args(make_config(DB_ENGINE_PROFILE="pgbouncer"))
+    assert unique["statement_cache_size"] == 0
+    assert unique["prepared_statement_cache_size"] == 100
+    assert unique["prepared_statement_name_func"]() != unique["prepared_statement_name_func"]()
+
+    disabled = get_connect_args(make_config(
+        DB_ENGINE_PROFILE="pgbouncer", DB_PREPARED_STATEMENT_NAMES="disabled"
+    ))
+    assert disabled["prepared_statement_cache_size"] == 0
+    assert disabled["prepared_statement_name_func"]() == ""
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("names", ["unique", "disabled"])
+async def test_pgbouncer_profile_executes_statements(names):
+    """Профиль pgbouncer совместим и с прямым подключением к PostgreSQL"""
+    config = make_config(DB_ENGINE_PROFILE="pgbouncer", DB_PREPARED_STATEMENT_NAMES=names)
+    engine = create_async_engine(TEST_DATABASE_URL, **get_engine_options(config))
+    try:
+        for _ in range(3):
+            async with engine.connect() as conn:
+                result = await conn.execute(text("SELECT CAST(:value AS integer)"), {"value": 42})
+                assert result.scalar() == 42
+    finally:
+        await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_queue_pool_metrics():
+    """Пул переиспользует соединения и публикует метрики"""
+    options = get_engine_options(make_config(), pool_label="test")
+    assert issubclass(options["poolclass"], InstrumentedQueuePool)
+
+    engine = create_async_engine(TEST_DATABASE_URL, **options)
+    labels = {"pool": "test"}
+    acquired_before = REGISTRY.get_sample_value("db_pool_acquire_duration_seconds_count", labels) or 0
+
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            assert REGISTRY.get_sample_value("db_pool_checked_out_connections", labels) == 1
+
+        assert REGISTRY.get_sample_value("db_pool_checked_out_connections", labels) == 0
+        assert REGISTRY.get_sample_value("db_pool_size", labels) == 2
+        assert REGISTRY.get_sample_value("db_pool_acquire_duration_seconds_count", labels) == acquired_before + 1
+
+        # Соединение вернулось в пул, а не закрылось
+        assert engine.sync_engine.pool.checkedin() == 1
+    finally:
+        await engine.dispose()
@@ -0,0 +1,132 @@
+import pytest
+from fakeredis import aioredis
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.endpoints.friends import send_friend_request, update_friend_request
+from models.friend import FriendRequest, FriendStatus, Friendship
+from models.user import User
+from schemas.friend import FriendRequestCreate, FriendRequestUpdate
+from services.redis_service import redis_client
+from services.friend_service import (
+    add_friendship,
+    are_friends,
+    get_friend_ids,
+    get_friends,
+    remove_friendship,
+    sync_friendship_cache,
+)
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = aioredis.FakeRedis()
+    monkeypatch.setattr(redis_client, "client", client)
+    return client
+
+@pytest.mark.asyncio
+async def test_friendship_is_symmetric_and_cached(db_session: AsyncSession, fake_redis):
+    me, friend, stranger = (User(email=f"{name}@example.com", username=name) for name in ("me", "friend", "stranger"))
+    db_session.add_all([me, friend, stranger])
+    await db_session.commit()
+
+    await add_friendship(db_session, me.id, friend.id)
+    await db_session.commit()
+
+    # Первое обращение прогревает множество из БД, дальше ответ из Redis
+    assert await are_friends(db_session, friend.id, me.id)
+    assert await redis_client.is_friend(str(friend.id), str(me.id)) is True
+    assert await redis_client.is_friend(str(friend.id), str(stranger.id)) is False
+    assert await get_friend_ids(db_session, me.id) == {friend.id}
+
+    await remove_friendship(db_session, me.id, friend.id)
+    await db_session.commit()
+    await sync_friendship_cache(me.id, friend.id)
+    # Изменение сбрасывает множества обоих, следующее чтение загружает их заново
+    assert await redis_client.is_friend(str(me.id), str(friend.id)) is None
+    assert not await are_friends(db_session, friend.id, me.id)
+    assert await get_friend_ids(db_session, me.id) == set()
+
+@pytest.mark.asyncio
+async def test_stale_friend_load_is_not_cached(db_session: AsyncSession, fake_redis, monkeypatch):
+    """Загрузка, начатая до изменения дружбы, не записывает устаревший состав в кеш"""
+    me, friend = (User(email=f"{name}@example.com", username=name) for name in ("me", "friend"))
+    db_session.add_all([me, friend])
+    await db_session.commit()
+
+    get_version = redis_client.get_friends_version
+
+    async def version_then_concurrent_accept(user_id):
+        version = await get_version(user_id)
+        # Заявку приняли, пока загрузка читала (еще старый) список из БД
+        await sync_friendship_cache(me.id, friend.id)
+        return version
+
+    monkeypatch.setattr(redis_client, "get_friends_version", version_then_concurrent_accept)
+    assert not await are_friends(db_session, me.id, friend.id)
+    assert await redis_client.is_friend(str(me.id), str(friend.id)) is None
+
+    monkeypatch.setattr(redis_client, "get_friends_version", get_version)
+    await add_friendship(db_session, me.id, friend.id)
+    await db_session.commit()
+    assert await are_friends(db_session, me.id, friend.id)
+    assert await redis_client.is_friend(str(me.id), str(friend.id)) is True
+    assert await fake_redis.ttl(f"friends:{me.id}") > 0
+
+@pytest.mark.asyncio
+async def test_friend_list_pages(db_session: AsyncSession):
+    me = User(email="me@example.com", username="me")
+    friends = [User(email=f"f{i}@example.com", username=f"f{i}") for i in range(7)]
+    db_session.add_all([me, *friends])
+    await db_session.commit()
+    for friend in friends:
+        await add_friendship(db_session, me.id, friend.id)
+    await db_session.commit()
+
+    seen, after = [], None
+    while True:
+        page = await get_friends(db_session, me.id, limit=3, after=after)
+        seen.extend(row.User.id for row in page)
+        if len(page) < 3:
+            break
+        after = (page[-1].created_at, page[-1].User.id)
+
+    assert sorted(seen) == sorted(friend.id for friend in friends)
+    assert [row.User.id for row in await get_friends(db_session, friends[0].id)] == [me.id]
+
+@pytest.mark.asyncio
+async def test_reverse_request_rejected(db_session: AsyncSession, monkeypatch):
+    """Встречная заявка отклоняется: пару не связывают две заявки"""
+    monkeypatch.setattr("api.endpoints.friends.enqueue_notification", lambda notification: None)
+    me, friend = (User(email=f"{name}@example.com", username=name) for name in ("me", "friend"))
+    db_session.add_all([me, friend])
+    await db_session.commit()
+
+    await send_friend_request(FriendRequestCreate(receiver_id=friend.id), db_session, me)
+    for sender, receiver in ((me, friend), (friend, me)):
+        with pytest.raises(HTTPException) as exc_info:
+            await send_friend_request(FriendRequestCreate(receiver_id=receiver.id), db_session, sender)
+        assert exc_info.value.status_code == 400
+
+@pytest.mark.asyncio
+async def test_unaccept_keeps_friendship_of_other_accepted_request(db_session: AsyncSession, fake_redis, monkeypatch):
+    """Пара остается друзьями, пока между ними есть другая принятая заявка"""
+    monkeypatch.setattr("api.endpoints.friends.enqueue_notification", lambda notification: None)
+    me, friend = (User(email=f"{name}@example.com", username=name) for name in ("me", "friend"))
+    db_session.add_all([me, friend])
+    await db_session.commit()
+    # Две принятые встречные заявки (созданные до запрета встречных заявок)
+    mine = FriendRequest(sender_id=me.id, receiver_id=friend.id, status=FriendStatus.ACCEPTED)
+    theirs = FriendRequest(sender_id=friend.id, receiver_id=me.id, status=FriendStatus.ACCEPTED)
+    db_session.add_all([mine, theirs])
+    await add_friendship(db_session, me.id, friend.id)
+    await db_session.commit()
+
+    declined = FriendRequestUpdate(status=FriendStatus.DECLINED)
+    await update_friend_request(theirs.id, declined, db_session, me)
+    assert await are_friends(db_session, me.id, friend.id)
+    assert len((await db_session.execute(select(Friendship))).scalars().all()) == 2
+
+    await update_friend_request(mine.id, declined, db_session, friend)
+    assert not await are_friends(db_session, me.id, friend.id)
+    assert (await db_session.execute(select(Friendship))).scalars().all() == []
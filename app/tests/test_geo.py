@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user import User
+from models.place import Place, GEO_CELL_COLUMNS
+from services.geo_service import geo_cell, cell_ranges, get_nearby_places
+
+def test_cell_ranges_cover_antimeridian():
+    ranges = cell_ranges(0.0, 179.99, radius_km=20)
+    columns = {first % GEO_CELL_COLUMNS for first, _ in ranges} | {last % GEO_CELL_COLUMNS for _, last in ranges}
+
+    assert 0 in columns
+    assert GEO_CELL_COLUMNS - 1 in columns
+    for lat, lon in [(0.1, 179.95), (-0.1, -179.95)]:
+        assert any(first <= geo_cell(lat, lon) <= last for first, last in ranges)
+
+@pytest.mark.asyncio
+async def test_nearby_places_filtered_and_ordered(db_session: AsyncSession):
+    user = User(email="geo@example.com", username="geouser")
+    db_session.add(user)
+    await db_session.flush()
+
+    # Красная площадь и места вокруг нее
+    center = (55.7539, 37.6208)
+    places = {
+        "near": (55.7520, 37.6175),      # ~0.3 км
+        "middle": (55.7601, 37.6186),    # ~0.7 км
+        "far": (55.7000, 37.5000),       # ~9.5 км
+        "corner": (55.7800, 37.6600),    # ~3.8 км, внутри bbox 4 км, но вне круга
+        "other_cell": (55.8040, 37.6208),  # ~5.6 км, другая строка сетки
+    }
+    for name, (lat, lon) in places.items():
+        db_session.add(Place(name=name, latitude=lat, longitude=lon, created_by=user.id, is_public=True))
+    db_session.add(Place(name="private", latitude=55.7539, longitude=37.6208, created_by=user.id, is_public=False))
+    await db_session.commit()
+
+    cells = (await db_session.execute(select(Place.name, Place.geo_cell, Place.latitude, Place.longitude))).all()
+    for name, cell, lat, lon in cells:
+        assert cell == geo_cell(lat, lon), name
+
+    nearby = await get_nearby_places(db_session, *center, radius_km=3.5)
+    assert [place.name for place, _ in nearby] == ["near", "middle"]
+
+    nearby = await get_nearby_places(db_session, *center, radius_km=6)
+    assert [place.name for place, _ in nearby] == ["near", "middle", "corner", "other_cell"]
+    distances = [distance for _, distance in nearby]
+    assert distances == sorted(distances)
+
+    nearby = await get_nearby_places(db_session, *center, radius_km=6, skip=1, limit=2)
+    assert [place.name for place, _ in nearby] == ["middle", "corner"]
+
+    # Следующая страница по курсору (расстояние, id) последнего места
+    place, distance = nearby[0]
+    nearby = await get_nearby_places(db_session, *center, radius_km=6, limit=2, after=(distance, place.id))
+    assert [place.name for place, _ in nearby] == ["corner", "other_cell"]
@@ -0,0 +1,403 @@
+import asyncio
+import pytest
+from io import BytesIO
+from fastapi import BackgroundTasks, HTTPException, UploadFile
+from PIL import Image
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.endpoints.places import (
+    confirm_photo_upload, create_photo_upload_url, delete_place_photo, get_photo_variant_image, upload_place_photo
+)
+from core.config import settings
+from models.photo import Photo, PhotoBlob
+from models.place import Place
+from models.user import User
+from schemas.photo import PhotoConfirm, PhotoUploadRequest
+from services import image_service
+from services.image_service import (
+    ImageRejected, get_photo_variant, make_thumbnail, make_variant, negotiate_variant_format, process_and_upload_image, variant_width
+)
+from services.photo_service import acquire_blob, blob_object_names, delete_blob_objects, lock_blob, register_blob
+
+def _image_bytes(size, image_format="JPEG", mode="RGB") -> bytes:
+    output = BytesIO()
+    Image.new(mode, size, "red").save(output, format=image_format)
+    return output.getvalue()
+
+def test_thumbnail_keeps_format_and_fits_box():
+    """Превью в формате оригинала и в пределах 300x300, в том числе через draft для JPEG"""
+    for image_format in ("JPEG", "PNG"):
+        thumbnail, detected, _ = make_thumbnail(_image_bytes((2400, 1600), image_format), (300, 300), 10_000_000)
+        assert detected == image_format
+        with Image.open(BytesIO(thumbnail)) as image:
+            assert image.format == image_format
+            assert image.size == (300, 200)
+
+def test_thumbnail_rejects_bombs_and_garbage():
+    """Размеры проверяются по заголовку до декодирования; неизвестные форматы отклоняются"""
+    with pytest.raises(ImageRejected) as exc_info:
+        make_thumbnail(_image_bytes((2000, 2000), "PNG", mode="1"), (300, 300), 1_000_000)
+    assert exc_info.value.reason == "too_large"
+
+    with pytest.raises(ImageRejected) as exc_info:
+        make_thumbnail(_image_bytes((100, 100), "BMP"), (300, 300), 1_000_000)
+    assert exc_info.value.reason == "invalid"
+
+    with pytest.raises(ImageRejected) as exc_info:
+        make_thumbnail(b"not an image", (300, 300), 1_000_000)
+    assert exc_info.value.reason == "invalid"
+
+@pytest.mark.asyncio
+async def test_upload_rejects_oversized_file(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_IMAGE_UPLOAD_BYTES", 1000)
+    upload = UploadFile(BytesIO(b"x" * 1001), filename="big.jpg")
+    with pytest.raises(HTTPException) as exc_info:
+        await process_and_upload_image(None, upload)
+    assert exc_info.value.status_code == 413
+
+class FakeStorage:
+    """Хранилище объектов в памяти вместо MinIO"""
+    def __init__(self):
+        self.objects = {}
+        self.puts = []
+        self.deletes = []
+
+    async def presigned_upload_url(self, object_name, expires):
+        return f"http://storage/{object_name}?expires={int(expires.total_seconds())}"
+
+    async def get_object_size(self, object_name):
+        data = self.objects.get(object_name)
+        return None if data is None else len(data)
+
+    async def get_object_bytes(self, object_name, max_bytes=None):
+        data = self.objects.get(object_name)
+        if data is None or max_bytes is None:
+            return data
+        return data[:max_bytes + 1]
+
+    async def copy_object(self, source_name, object_name):
+        data = self.objects.get(source_name)
+        if data is None:
+            return None
+        self.objects[object_name] = data
+        return len(data)
+
+    async def put_object(self, object_name, data, content_type):
+        self.puts.append(object_name)
+        self.objects[object_name] = data
+        return self.object_url(object_name)
+
+    async def upload_image(self, file_data, file_name, content_type):
+        self.objects[file_name] = file_data.getvalue()
+        return file_name, self.object_url(file_name)
+
+    async def delete_image(self, file_name):
+        self.objects.pop(file_name, None)
+        self.deletes.append(file_name)
+
+    async def delete_prefix(self, prefix):
+        for object_name in [name for name in self.objects if name.startswith(prefix)]:
+            await self.delete_image(object_name)
+
+    def object_url(self, object_name):
+        return f"http://storage/{object_name}"
+
+    def object_name_from_url(self, url):
+        return url.removeprefix("http://storage/") if url else None
+
+async def _owner_and_place(db_session):
+    owner = User(email="owner@example.com", username="owner")
+    db_session.add(owner)
+    await db_session.commit()
+    place = Place(name="Парк", latitude=55.75, longitude=37.61, created_by=owner.id)
+    db_session.add(place)
+    await db_session.commit()
+    return owner, place
+
+@pytest.mark.asyncio
+async def test_duplicate_uploads_share_blob(db_session: AsyncSession, monkeypatch):
+    """
+    Оригинал сохраняется без перекодирования под именем из SHA-256; повторная
+    загрузка того же файла не обрабатывается заново и ссылается на те же объекты
+    """
+    storage = FakeStorage()
+    monkeypatch.setattr("api.endpoints.places.minio_client", storage)
+    monkeypatch.setattr(image_service, "minio_client", storage)
+    monkeypatch.setattr("services.photo_service.minio_client", storage)
+    monkeypatch.setattr(image_service, "UPLOAD_CHUNK_SIZE", 1000)
+    owner, place = await _owner_and_place(db_session)
+    data = _image_bytes((1200, 900))
+
+    def upload():
+        # Имя и тип от клиента не влияют на сохраненный файл
+        return UploadFile(BytesIO(data), filename="photo.exe", headers={"content-type": "text/plain"})
+
+    try:
+        first = await upload_place_photo(place.id, upload(), db_session, owner)
+        second = await upload_place_photo(place.id, upload(), db_session, owner)
+    finally:
+        image_service.shutdown_image_executor()
+
+    blob = (await db_session.execute(select(PhotoBlob))).scalars().one()
+    assert blob.ref_count == 2 and blob.size == len(data) and blob.phash is not None
+    assert blob.object_name == f"blobs/{blob.sha256[:2]}/{blob.sha256}.jpg"
+    assert storage.puts == [blob.object_name, blob.thumbnail_object_name]
+    assert storage.objects[blob.object_name] == data
+    assert Image.open(BytesIO(storage.objects[blob.thumbnail_object_name])).size == (300, 225)
+    for photo in (first, second):
+        assert photo.blob_sha256 == blob.sha256
+        assert photo.original_url == f"http://storage/{blob.object_name}"
+
+    # Файлы удаляются вместе с последней ссылкой
+    await delete_place_photo(place.id, first.id, db_session, owner)
+    await db_session.refresh(blob)
+    assert blob.ref_count == 1 and storage.deletes == []
+    variant_name = f"variants/{blob.sha256}/640.webp"
+    storage.objects[variant_name] = b"variant"
+    await delete_place_photo(place.id, second.id, db_session, owner)
+    assert (await db_session.execute(select(PhotoBlob))).scalars().all() == []
+    assert storage.deletes == [blob.object_name, blob.thumbnail_object_name, variant_name]
+
+@pytest.mark.asyncio
+async def test_direct_upload_flow(db_session: AsyncSession, async_session_maker, monkeypatch):
+    """upload-url -> PUT в хранилище -> confirm; превью и проверка файла в фоне"""
+    storage = FakeStorage()
+    monkeypatch.setattr("api.endpoints.places.minio_client", storage)
+    monkeypatch.setattr(image_service, "minio_client", storage)
+    monkeypatch.setattr(image_service, "AsyncSessionLocal", async_session_maker)
+    owner = User(email="owner@example.com", username="owner")
+    other = User(email="other@example.com", username="other")
+    db_session.add_all([owner, other])
+    await db_session.commit()
+    place = Place(name="Парк", latitude=55.75, longitude=37.61, created_by=owner.id)
+    db_session.add(place)
+    await db_session.commit()
+
+    async def upload(user, data):
+        ticket = await create_photo_upload_url(place.id, PhotoUploadRequest(content_type="image/jpeg"), db_session, user)
+        assert ticket.upload_url.startswith(f"http://storage/{ticket.object_name}")
+        assert ticket.object_name.endswith(".jpg")
+        storage.objects[ticket.object_name] = data
+        return ticket.object_name
+
+    data = _image_bytes((1200, 900))
+    object_name = await upload(owner, data)
+
+    # Чужую загрузку подтвердить нельзя
+    with pytest.raises(HTTPException) as exc_info:
+        await confirm_photo_upload(place.id, PhotoConfirm(object_name=object_name), BackgroundTasks(), db_session, other)
+    assert exc_info.value.status_code == 400
+
+    background_tasks = BackgroundTasks()
+    try:
+        photo = await confirm_photo_upload(
+            place.id, PhotoConfirm(object_name=object_name, description="вид"), background_tasks, db_session, owner
+        )
+        # Объект перенесен под ключ сервера: запись по выданной ссылке его не меняет
+        staged_name = photo.filename
+        assert staged_name == f"photos/{photo.id}.jpg"
+        assert photo.original_url == f"http://storage/{staged_name}"
+        assert photo.thumbnail_url is None
+        assert object_name not in storage.objects
+        with pytest.raises(HTTPException) as exc_info:
+            await confirm_photo_upload(place.id, PhotoConfirm(object_name=object_name), BackgroundTasks(), db_session, owner)
+        assert exc_info.value.status_code == 404
+
+        # Не изображение: фоновая проверка удаляет и запись, и объект
+        garbage_name = await upload(owner, b"not an image")
+        garbage_tasks = BackgroundTasks()
+        await confirm_photo_upload(place.id, PhotoConfirm(object_name=garbage_name), garbage_tasks, db_session, owner)
+
+        await background_tasks()
+        await garbage_tasks()
+
+        # Повторная прямая загрузка того же файла привязывается к первой копии
+        duplicate_name = await upload(owner, data)
+        duplicate_tasks = BackgroundTasks()
+        duplicate = await confirm_photo_upload(
+            place.id, PhotoConfirm(object_name=duplicate_name), duplicate_tasks, db_session, owner
+        )
+        await duplicate_tasks()
+    finally:
+        image_service.shutdown_image_executor()
+
+    missing_name = f"uploads/{place.id}/{owner.id}/missing.jpg"
+    with pytest.raises(HTTPException) as exc_info:
+        await confirm_photo_upload(place.id, PhotoConfirm(object_name=missing_name), BackgroundTasks(), db_session, owner)
+    assert exc_info.value.status_code == 404
+
+    db_session.expire_all()
+    photos = (await db_session.execute(select(Photo).order_by(Photo.created_at))).scalars().all()
+    assert {stored.id for stored in photos} == {photo.id, duplicate.id}
+    blob = (await db_session.execute(select(PhotoBlob))).scalars().one()
+    assert blob.object_name == f"blobs/{blob.sha256[:2]}/{blob.sha256}.jpg" and blob.ref_count == 2
+    assert storage.objects[blob.object_name] == data
+    # Фото ссылаются на копию под именем из хеша, загруженные объекты удалены
+    assert all(stored.filename == blob.object_name for stored in photos)
+    assert all(stored.original_url == f"http://storage/{blob.object_name}" for stored in photos)
+    assert staged_name not in storage.objects
+    assert all(stored.thumbnail_url == f"http://storage/{blob.thumbnail_object_name}" for stored in photos)
+    assert Image.open(BytesIO(storage.objects[blob.thumbnail_object_name])).size == (300, 225)
+    assert garbage_name not in storage.objects
+    assert duplicate_name not in storage.objects
+    assert f"photos/{duplicate.id}.jpg" not in storage.objects
+
+def test_variant_format_and_width_negotiation():
+    assert [variant_width(width) for width in (1, 160, 161, 700, 5000)] == [160, 160, 320, 1080, 1600]
+    assert negotiate_variant_format("image/avif,image/webp,*/*", "a.jpg") == "AVIF"
+    assert negotiate_variant_format("image/avif;q=0, image/webp", "a.jpg") == "WEBP"
+    assert negotiate_variant_format("image/*", "a.jpg") == "JPEG"
+    assert negotiate_variant_format(None, "a.png") == "PNG"
+
+def test_variant_resizes_and_reencodes():
+    """Вариант уменьшается по ширине с сохранением пропорций и не увеличивается"""
+    for image_format in ("AVIF", "WEBP", "JPEG"):
+        variant = make_variant(_image_bytes((2000, 1000), "PNG", mode="RGBA"), 640, image_format, 10_000_000)
+        with Image.open(BytesIO(variant)) as image:
+            assert image.format == image_format
+            assert image.size == (640, 320)
+    with Image.open(BytesIO(make_variant(_image_bytes((100, 50)), 640, "WEBP", 10_000_000))) as image:
+        assert image.size == (100, 50)
+
+@pytest.mark.asyncio
+async def test_variant_renders_once(db_session: AsyncSession, monkeypatch):
+    """Одновременные первые запросы рендерят вариант один раз, дальше он берется из хранилища"""
+    storage = FakeStorage()
+    monkeypatch.setattr(image_service, "minio_client", storage)
+    monkeypatch.setattr("services.photo_service.minio_client", storage)
+    owner = User(email="owner@example.com", username="owner")
+    db_session.add(owner)
+    await db_session.commit()
+    place = Place(name="Парк", latitude=55.75, longitude=37.61, created_by=owner.id)
+    db_session.add(place)
+    await db_session.commit()
+    photo = Photo(
+        place_id=place.id, user_id=owner.id, filename="uploads/photo.jpg", original_url="http://storage/uploads/photo.jpg",
+        thumbnail_url="http://storage/uploads/thumb_photo.jpg"
+    )
+    private = Photo(place_id=place.id, user_id=owner.id, filename="uploads/private.jpg", original_url="x", is_public=False)
+    db_session.add_all([photo, private])
+    await db_session.commit()
+    storage.objects[photo.filename] = _image_bytes((2000, 1500))
+    storage.objects["uploads/thumb_photo.jpg"] = b"thumbnail"
+
+    async def request(accept):
+        return await get_photo_variant_image(place.id, photo.id, 500, accept, db_session)
+
+    try:
+        # Одна сессия БД не допускает параллельных запросов, поэтому гонку
+        # первых обращений воспроизводим на уровне сервиса
+        variants = await asyncio.gather(*(get_photo_variant(photo, 500, "image/webp,*/*") for _ in range(5)))
+        assert storage.puts == [f"variants/{photo.id}/640.webp"]
+        assert len(set(variants)) == 1
+
+        response = await request("image/webp")
+        assert storage.puts == [f"variants/{photo.id}/640.webp"]
+        assert (response.body, response.media_type) == variants[0]
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert response.headers["vary"] == "Accept"
+        assert Image.open(BytesIO(response.body)).size == (640, 480)
+
+        jpeg = await request("image/*")
+        assert jpeg.media_type == "image/jpeg"
+        assert storage.puts == [f"variants/{photo.id}/640.webp", f"variants/{photo.id}/640.jpg"]
+    finally:
+        image_service.shutdown_image_executor()
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_photo_variant_image(place.id, private.id, 500, None, db_session)
+    assert exc_info.value.status_code == 404
+
+    # Фото без blob удаляет вместе с оригиналом свое превью и варианты
+    await delete_place_photo(place.id, photo.id, db_session, owner)
+    assert storage.objects == {}
+
+@pytest.mark.asyncio
+async def test_confirm_rejects_object_swapped_after_size_check(db_session: AsyncSession, monkeypatch):
+    """Размер перепроверяется у серверной копии: подмена после stat не проходит"""
+    storage = FakeStorage()
+    monkeypatch.setattr("api.endpoints.places.minio_client", storage)
+    monkeypatch.setattr(settings, "MAX_IMAGE_UPLOAD_BYTES", 100)
+    owner, place = await _owner_and_place(db_session)
+    ticket = await create_photo_upload_url(place.id, PhotoUploadRequest(content_type="image/jpeg"), db_session, owner)
+    storage.objects[ticket.object_name] = b"x" * 10
+
+    copy_object = storage.copy_object
+    async def swap_then_copy(source_name, object_name):
+        storage.objects[source_name] = b"x" * 1000
+        return await copy_object(source_name, object_name)
+    monkeypatch.setattr(storage, "copy_object", swap_then_copy)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await confirm_photo_upload(place.id, PhotoConfirm(object_name=ticket.object_name), BackgroundTasks(), db_session, owner)
+    assert exc_info.value.status_code == 413
+    assert storage.objects == {}
+    assert (await db_session.execute(select(Photo))).scalars().first() is None
+
+@pytest.mark.asyncio
+async def test_blob_objects_kept_for_concurrent_upload(db_session: AsyncSession, async_session_maker, monkeypatch):
+    """
+    Удаление объектов последней ссылки ждет параллельную загрузку того же
+    содержимого и не стирает объекты, которые она записала под теми же именами
+    """
+    storage = FakeStorage()
+    monkeypatch.setattr("services.photo_service.minio_client", storage)
+    sha256 = "ab" * 32
+    object_name, thumbnail_name = blob_object_names(sha256, "jpg")
+    released = PhotoBlob(sha256=sha256, object_name=object_name, thumbnail_object_name=thumbnail_name)
+    storage.objects.update({object_name: b"original", thumbnail_name: b"thumbnail"})
+
+    async with async_session_maker() as upload_db:
+        # Загрузка нашла, что записи нет, и сохраняет файл заново
+        await lock_blob(upload_db, sha256)
+        assert await acquire_blob(upload_db, sha256) is None
+        await register_blob(
+            upload_db, sha256=sha256, object_name=object_name, thumbnail_object_name=thumbnail_name,
+            content_type="image/jpeg", size=8
+        )
+
+        cleanup = asyncio.create_task(delete_blob_objects(db_session, released))
+        await asyncio.sleep(0.2)
+        assert not cleanup.done()
+        await upload_db.commit()
+
+    await cleanup
+    assert storage.deletes == []
+
+    # Без параллельной загрузки объекты удаляются
+    await db_session.execute(delete(PhotoBlob))
+    await db_session.commit()
+    await delete_blob_objects(db_session, released)
+    assert storage.objects == {}
+
+@pytest.mark.asyncio
+async def test_variants_rendered_before_blob_link_are_deleted(db_session: AsyncSession, async_session_maker, monkeypatch):
+    """Варианты, отрисованные до привязки прямой загрузки к blob, не остаются в хранилище"""
+    storage = FakeStorage()
+    monkeypatch.setattr("api.endpoints.places.minio_client", storage)
+    monkeypatch.setattr(image_service, "minio_client", storage)
+    monkeypatch.setattr("services.photo_service.minio_client", storage)
+    monkeypatch.setattr(image_service, "AsyncSessionLocal", async_session_maker)
+    owner, place = await _owner_and_place(db_session)
+    ticket = await create_photo_upload_url(place.id, PhotoUploadRequest(content_type="image/jpeg"), db_session, owner)
+    storage.objects[ticket.object_name] = _image_bytes((1200, 900))
+
+    background_tasks = BackgroundTasks()
+    try:
+        photo = await confirm_photo_upload(place.id, PhotoConfirm(object_name=ticket.object_name), background_tasks, db_session, owner)
+        await get_photo_variant(photo, 500, "image/webp")
+        assert f"variants/{photo.id}/640.webp" in storage.objects
+
+        await background_tasks()
+        assert not any(name.startswith(f"variants/{photo.id}/") for name in storage.objects)
+        await db_session.refresh(photo)
+        assert photo.blob_sha256 is not None
+        await get_photo_variant(photo, 500, "image/webp")
+    finally:
+        image_service.shutdown_image_executor()
+
+    # Отрисовка, начатая до привязки, может дописать вариант под id уже после нее
+    storage.objects[f"variants/{photo.id}/640.jpg"] = b"variant"
+    await delete_place_photo(place.id, photo.id, db_session, owner)
+    assert storage.objects == {}
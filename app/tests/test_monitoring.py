@@ -0,0 +1,52 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from core.monitoring import PrometheusMiddleware, UNMATCHED_ENDPOINT, metrics_endpoint
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def _metrics_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(PrometheusMiddleware)
+
+    @app.get("/monitoring-test/items/{item_id}")
+    async def get_item(item_id: str):
+        if item_id == "missing":
+            raise HTTPException(status_code=404, detail="Item not found")
+        return {"id": item_id, "payload": "x" * 1000}
+
+    app.add_route("/monitoring-test/metrics", metrics_endpoint)
+    return app
+
+def test_requests_labeled_by_route_template():
+    """Пути с разными id попадают в один ряд шаблона, несовпавшие - в общий"""
+    endpoint = "/monitoring-test/items/{item_id}"
+    before_ok = _sample("http_requests_total", method="GET", endpoint=endpoint, http_status="200")
+    before_missing = _sample("http_requests_total", method="GET", endpoint=endpoint, http_status="404")
+    before_unmatched = _sample("http_requests_total", method="GET", endpoint=UNMATCHED_ENDPOINT, http_status="404")
+    before_size = _sample("http_response_size_bytes_sum", method="GET", endpoint=endpoint)
+    before_metrics = _sample(
+        "http_requests_total", method="GET", endpoint="/monitoring-test/metrics", http_status="200"
+    )
+
+    with TestClient(_metrics_app()) as client:
+        for item_id in ("a", "b", "c"):
+            assert client.get(f"/monitoring-test/items/{item_id}").status_code == 200
+        assert client.get("/monitoring-test/items/missing").status_code == 404
+        assert client.get("/monitoring-test/no-such-route/123").status_code == 404
+        assert client.get("/monitoring-test/metrics").status_code == 200
+
+    assert _sample("http_requests_total", method="GET", endpoint=endpoint, http_status="200") == before_ok + 3
+    assert _sample("http_requests_total", method="GET", endpoint=endpoint, http_status="404") == before_missing + 1
+    assert _sample(
+        "http_requests_total", method="GET", endpoint=UNMATCHED_ENDPOINT, http_status="404"
+    ) == before_unmatched + 1
+    assert _sample(
+        "http_requests_total", method="GET", endpoint="/monitoring-test/metrics", http_status="200"
+    ) == before_metrics + 1
+    assert _sample("http_response_size_bytes_sum", method="GET", endpoint=endpoint) > before_size + 3000
+    # Сырые пути не становятся метками
+    assert _sample("http_requests_total", method="GET", endpoint="/monitoring-test/items/a", http_status="200") == 0
+    assert _sample("http_requests_in_progress", method="GET") == 0
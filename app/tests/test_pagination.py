@@ -0,0 +1,85 @@
+import pytest
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.pagination import encode_cursor, decode_cursor, paginate
+from models.user import User
+from models.message import Message
+from models.notification import Notification, NotificationType
+from services.message_service import get_conversation_messages, record_messages
+from services.notification_service import get_user_notifications
+
+def test_cursor_roundtrip():
+    values = (datetime(2026, 1, 2, 3, 4, 5, 678901), uuid4())
+    cursor = encode_cursor(values)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, (datetime, UUID)) == values
+
+    for broken in ("not-a-cursor", encode_cursor([1]), encode_cursor(["yesterday", "id"])):
+        with pytest.raises(HTTPException) as exc_info:
+            decode_cursor(broken, (datetime, UUID))
+        assert exc_info.value.status_code == 400
+
+def test_paginate_returns_cursor_only_when_more_rows():
+    items, cursor = paginate([1, 2, 3], 3, lambda item: (item,))
+    assert items == [1, 2, 3] and cursor is None
+
+    items, cursor = paginate([1, 2, 3, 4], 3, lambda item: (item,))
+    assert items == [1, 2, 3]
+    assert decode_cursor(cursor, (int,)) == (3,)
+
+@pytest.mark.asyncio
+async def test_conversation_pages_are_stable(db_session: AsyncSession):
+    """Страницы по курсору не теряют и не дублируют сообщения, даже с равным created_at"""
+    me = User(email="me@example.com", username="me")
+    peer = User(email="peer@example.com", username="peer")
+    other = User(email="other@example.com", username="other")
+    db_session.add_all([me, peer, other])
+    await db_session.flush()
+
+    start = datetime(2026, 1, 1)
+    messages = []
+    for i in range(25):
+        sender, receiver = (me, peer) if i % 2 else (peer, me)
+        messages.append(Message(sender_id=sender.id, receiver_id=receiver.id, content=f"m{i}", created_at=start + timedelta(minutes=i // 3)))
+    messages.append(Message(sender_id=other.id, receiver_id=me.id, content="other", created_at=start))
+    await record_messages(db_session, messages)
+
+    seen, after = [], None
+    while True:
+        page = await get_conversation_messages(db_session, me.id, peer.id, limit=8 + 1, after=after)
+        page, cursor = paginate(page, 8, lambda message: (message.created_at, message.id))
+        seen.extend(page)
+        if cursor is None:
+            break
+        after = decode_cursor(cursor, (datetime, UUID))
+
+    assert len(seen) == 25
+    assert len({message.id for message in seen}) == 25
+    keys = [(message.created_at, message.id) for message in seen]
+    assert keys == sorted(keys, reverse=True)
+
+    # Совместимость: offset поверх того же порядка
+    offset_page = await get_conversation_messages(db_session, me.id, peer.id, skip=8, limit=8)
+    assert [message.id for message in offset_page] == [message.id for message in seen[8:16]]
+
+@pytest.mark.asyncio
+async def test_notification_cursor(db_session: AsyncSession):
+    user = User(email="n@example.com", username="nuser")
+    db_session.add(user)
+    await db_session.flush()
+    for i in range(5):
+        db_session.add(Notification(
+            user_id=user.id, type=NotificationType.SYSTEM, title=f"n{i}", message="m",
+            created_at=datetime(2026, 1, 1) + timedelta(seconds=i)
+        ))
+    await db_session.commit()
+
+    first = await get_user_notifications(db_session, user.id, limit=2)
+    assert [n.title for n in first] == ["n4", "n3"]
+
+    rest = await get_user_notifications(db_session, user.id, limit=10, after=(first[-1].created_at, first[-1].id))
+    assert [n.title for n in rest] == ["n2", "n1", "n0"]
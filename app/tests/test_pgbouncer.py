@@ -0,0 +1,87 @@
+import asyncio
+import os
+import pytest
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from main import app
+from core.config import settings
+from core.database import get_db, get_read_db, get_engine_options
+from models.user import User
+from services.auth_service import create_access_token
+
+# Тест запускается против PgBouncer в режиме transaction pooling
+# (сервис pgbouncer в compose/docker-compose.test.yml).
+# Замеры пропускной способности - benchmarks/bench_pgbouncer.py
+PGBOUNCER_HOST = os.getenv("PGBOUNCER_HOST")
+PGBOUNCER_PORT = os.getenv("PGBOUNCER_PORT", "6432")
+
+pytestmark = pytest.mark.skipif(not PGBOUNCER_HOST, reason="PGBOUNCER_HOST is not set")
+
+REQUESTS = 200
+CONCURRENCY = 20
+
+def make_engine(**overrides):
+    config = settings.model_copy(update=overrides)
+    return create_async_engine(config.DATABASE_URI, **get_engine_options(config))
+
+async def run_workload(engine, token: str, peer_id):
+    """Гоняет смесь запросов к messages/notifications; каждый должен вернуть 200"""
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    headers = {"Authorization": f"Bearer {token}"}
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async def one(i: int):
+                async with semaphore:
+                    if i % 4 == 0:
+                        response = await client.post(
+                            f"/api/v1/messages/{peer_id}",
+                            json={"receiver_id": str(peer_id), "content": f"message {i}"},
+                            headers=headers,
+                        )
+                    elif i % 4 == 1:
+                        response = await client.get(f"/api/v1/messages/{peer_id}", headers=headers)
+                    elif i % 4 == 2:
+                        response = await client.get("/api/v1/notifications/", headers=headers)
+                    else:
+                        response = await client.get("/api/v1/notifications/unread-count", headers=headers)
+                    assert response.status_code == 200, response.text
+
+            await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+    finally:
+        app.dependency_overrides.clear()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("names", ["unique", "disabled"])
+async def test_workload_through_pgbouncer(db_session, names):
+    sender = User(email="sender@example.com", username="sender", first_name="S", last_name="Ender")
+    receiver = User(email="receiver@example.com", username="receiver", first_name="R", last_name="Eceiver")
+    db_session.add_all([sender, receiver])
+    await db_session.commit()
+
+    token = create_access_token(data={"sub": str(sender.id)})
+
+    bouncer_engine = make_engine(
+        DB_HOST=PGBOUNCER_HOST,
+        DB_PORT=PGBOUNCER_PORT,
+        DB_ENGINE_PROFILE="pgbouncer",
+        DB_PREPARED_STATEMENT_NAMES=names,
+    )
+
+    try:
+        # Без профиля pgbouncer здесь падали бы ошибки
+        # "prepared statement ... does not exist"
+        await run_workload(bouncer_engine, token, receiver.id)
+    finally:
+        await bouncer_engine.dispose()
@@ -0,0 +1,50 @@
+import pytest
+from fastapi import status
+from prometheus_client import REGISTRY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user import User
+from services.auth_service import create_access_token
+from services.principal_cache import principal_cache, _to_payload, _from_payload
+
+def local_hits() -> float:
+    return REGISTRY.get_sample_value(
+        "principal_cache_requests_total", {"tier": "local", "result": "hit"}
+    ) or 0
+
+@pytest.mark.asyncio
+async def test_payload_roundtrip_skips_secrets(db_session: AsyncSession):
+    user = User(email="cache@example.com", username="cacheuser", password_hash="hash", password_salt="salt")
+    db_session.add(user)
+    await db_session.commit()
+
+    payload = _to_payload(user)
+    assert "password_hash" not in payload
+    assert "oauth_data" not in payload
+
+    restored = _from_payload(payload)
+    assert restored.id == user.id
+    assert restored.created_at == user.created_at
+    assert "password_hash" not in restored.__dict__
+
+@pytest.mark.asyncio
+async def test_current_user_served_from_cache(client, db_session: AsyncSession):
+    """Повторный запрос с тем же токеном не ходит в БД за пользователем"""
+    user = User(email="me@example.com", username="meuser", first_name="Me")
+    db_session.add(user)
+    await db_session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': str(user.id)})}"}
+
+    response = client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    hits_before = local_hits()
+    response = client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["username"] == "meuser"
+    assert local_hits() == hits_before + 1
+
+    # Удаление аккаунта инвалидирует кеш
+    response = client.delete("/api/v1/auth/delete-account", headers=headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert principal_cache.local.get(user.id) is None
@@ -0,0 +1,103 @@
+import logging
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+from sqlalchemy import select, text
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from core.config import settings
+from core.database import instrument_engine, normalize_statement
+from core.monitoring import PrometheusMiddleware
+from models.place import Place
+from models.review import Review
+from models.user import User
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_normalize_statement():
+    """Метка - операция и первая таблица, без значений и имен колонок"""
+    assert normalize_statement("SELECT users.id, users.email FROM users WHERE users.id = $1") == "select users"
+    assert normalize_statement('INSERT INTO photo_blobs (sha256) VALUES ($1)') == "insert photo_blobs"
+    assert normalize_statement('UPDATE "places" SET name=$1 WHERE places.id = $2') == "update places"
+    assert normalize_statement("DELETE FROM reviews WHERE reviews.id = $1") == "delete reviews"
+    assert normalize_statement("SELECT count(*) FROM (SELECT places.id FROM places) AS anon_1") == "select places"
+    assert normalize_statement("select 1") == "select"
+    assert normalize_statement("  /* comment */ select 1") == "other"
+
+@pytest.mark.asyncio
+async def test_queries_counted_per_request(async_engine, async_session_maker):
+    """Каждый HTTP-запрос получает свой счетчик SQL-запросов под меткой шаблона маршрута"""
+    instrument_engine(async_engine.sync_engine)
+    app = FastAPI()
+    app.add_middleware(PrometheusMiddleware)
+
+    @app.get("/query-metrics-test/{count}")
+    async def run_queries(count: int):
+        async with async_session_maker() as session:
+            for _ in range(count):
+                await session.execute(text("SELECT 1"))
+        return {"count": count}
+
+    endpoint = "/query-metrics-test/{count}"
+    before_sum = _sample("db_queries_per_request_sum", endpoint=endpoint)
+    before_count = _sample("db_queries_per_request_count", endpoint=endpoint)
+    before_latency = _sample("db_statement_duration_seconds_count", statement="select")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.get("/query-metrics-test/3")).status_code == 200
+        assert (await client.get("/query-metrics-test/0")).status_code == 200
+
+    assert _sample("db_queries_per_request_count", endpoint=endpoint) == before_count + 2
+    assert _sample("db_queries_per_request_sum", endpoint=endpoint) == before_sum + 3
+    assert _sample("db_statement_duration_seconds_count", statement="select") >= before_latency + 3
+
+@pytest.mark.asyncio
+async def test_slow_query_logged_with_explain(async_engine, db_session: AsyncSession, monkeypatch, caplog):
+    """Медленный запрос пишется в лог с параметрами и планом, транзакция остается рабочей"""
+    instrument_engine(async_engine.sync_engine)
+    monkeypatch.setattr(settings, "DB_SLOW_QUERY_SECONDS", 1e-9)
+    monkeypatch.setattr(settings, "DB_SLOW_QUERY_EXPLAIN", True)
+    before = _sample("db_slow_queries_total", statement="select users")
+
+    with caplog.at_level(logging.WARNING, logger="core.database"):
+        result = await db_session.execute(select(User).where(User.username == "slow-query-user"))
+        assert result.scalars().first() is None
+
+    assert _sample("db_slow_queries_total", statement="select users") == before + 1
+    message = next(record.getMessage() for record in caplog.records if "Slow query" in record.getMessage())
+    assert "FROM users" in message
+    assert "slow-query-user" in message
+    assert "Plan:" in message
+
+    # EXPLAIN шел в точке сохранения той же транзакции: сессия продолжает работать
+    db_session.add(User(email="slow@example.com", username="slow"))
+    await db_session.commit()
+
+@pytest.mark.asyncio
+async def test_strict_mode_rejects_lazy_loads(db_session: AsyncSession):
+    """В тестах ленивая загрузка связи падает; явная selectinload работает"""
+    assert settings.DB_STRICT_LAZY_LOAD
+    user = User(email="lazy@example.com", username="lazy")
+    db_session.add(user)
+    await db_session.commit()
+    place = Place(name="Парк", latitude=55.75, longitude=37.61, created_by=user.id)
+    db_session.add(place)
+    await db_session.commit()
+    db_session.add(Review(place_id=place.id, user_id=user.id, rating=5))
+    await db_session.commit()
+    db_session.expunge_all()
+
+    place = (await db_session.execute(select(Place))).scalars().one()
+    with pytest.raises(InvalidRequestError, match="Lazy load from Place"):
+        # run_sync - та же среда, где ORM молча догружает связи (flush, каскады)
+        await db_session.run_sync(lambda session: place.reviews)
+
+    db_session.expunge_all()
+    place = (await db_session.execute(select(Place).options(selectinload(Place.reviews)))).scalars().one()
+    assert [review.rating for review in place.reviews] == [5]
@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+import core.database as database
+from core.config import settings
+
+def test_read_uri_falls_back_to_primary_credentials():
+    config = settings.model_copy(update={"DB_READ_HOST": "replica", "DB_READ_PORT": ""})
+    assert config.DATABASE_READ_URI == config.DATABASE_URI.replace(f"@{settings.DB_HOST}:", "@replica:")
+    assert settings.model_copy(update={"DB_READ_HOST": ""}).DATABASE_READ_URI is None
+
+@pytest.mark.asyncio
+async def test_reads_stick_to_primary_after_write(async_engine, monkeypatch):
+    """После коммита в основную БД чтения того же клиента идут мимо реплики"""
+    replica_sessions = sessionmaker(async_engine, class_=AsyncSession)
+    monkeypatch.setattr(database, "read_engine", async_engine)
+    monkeypatch.setattr(database, "AsyncReadSessionLocal", replica_sessions)
+    monkeypatch.setattr(database, "_recent_writers", database.TTLCache(maxsize=10, ttl=60))
+
+    assert database.get_read_sessionmaker("writer") is replica_sessions
+
+    primary_sessions = sessionmaker(
+        async_engine, class_=AsyncSession, sync_session_class=database.PrimarySession
+    )
+    async with primary_sessions() as session:
+        session.info["sticky_key"] = "writer"
+        await session.execute(text("SELECT 1"))
+        await session.commit()
+
+    assert database.get_read_sessionmaker("writer") is database.AsyncSessionLocal
+    assert database.get_read_sessionmaker("someone-else") is replica_sessions
+    assert database.get_read_sessionmaker(None) is replica_sessions
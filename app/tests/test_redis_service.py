@@ -0,0 +1,29 @@
+import pytest
+from fakeredis import aioredis
+
+from services.redis_service import RedisClient
+
+@pytest.fixture
+async def redis_client():
+    client = RedisClient(client=aioredis.FakeRedis())
+    yield client
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_get_and_set_many(redis_client):
+    await redis_client.set_many({"a": {"value": 1}, "b": [2]}, ttl=60)
+
+    assert await redis_client.get_many(["a", "missing", "b"]) == [{"value": 1}, None, [2]]
+    assert 0 < await redis_client.client.ttl("a") <= 60
+
+@pytest.mark.asyncio
+async def test_invalidate_search_cache_in_batches(redis_client):
+    """Инвалидация удаляет все ключи шаблона, в том числе больше одной пачки"""
+    await redis_client.set_many({f"search:users:q{i}:{{}}": [] for i in range(1200)}, ttl=60)
+    await redis_client.set_many({"search:places:q:{}": [], "principal:1": {}}, ttl=60)
+
+    assert await redis_client.invalidate_search_cache("users") == 1200
+    assert await redis_client.client.exists("search:places:q:{}", "principal:1") == 2
+
+    assert await redis_client.invalidate_search_cache() == 1
+    assert await redis_client.client.exists("principal:1") == 1
@@ -0,0 +1,67 @@
+import json
+import pytest
+from fakeredis import aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user import User
+from models.place import Place
+from services.redis_service import redis_client
+from services.search_service import search_users_payload, search_places_payload
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    monkeypatch.setattr(redis_client, "client", aioredis.FakeRedis())
+
+async def _users(db, query, **params):
+    payload, _ = await search_users_payload(db, query, **params)
+    return json.loads(payload)
+
+async def _places(db, query, **params):
+    payload, _ = await search_places_payload(db, query, **params)
+    return json.loads(payload)
+
+@pytest.mark.asyncio
+async def test_search_users_ranked_by_weight(db_session: AsyncSession):
+    me = User(email="me@example.com", username="anna", first_name="Анна")
+    by_username = User(email="a@example.com", username="anna_k", first_name="Мария")
+    by_name = User(email="b@example.com", username="maria", first_name="Анна", last_name="Иванова")
+    other = User(email="c@example.com", username="petr", first_name="Петр")
+    db_session.add_all([me, by_username, by_name, other])
+    await db_session.commit()
+    db_session.expunge_all()
+
+    users = await _users(db_session, "анна", current_user_id=me.id)
+    assert [user["username"] for user in users] == ["maria"]
+
+    users = await _users(db_session, "anna", current_user_id=me.id)
+    assert [user["username"] for user in users] == ["anna_k"]
+    assert "search_vector" not in users[0]
+
+@pytest.mark.asyncio
+async def test_search_places_ranked_by_weight(db_session: AsyncSession):
+    user = User(email="places@example.com", username="placesuser")
+    db_session.add(user)
+    await db_session.flush()
+
+    db_session.add_all([
+        Place(name="Кофейня на углу", latitude=55.75, longitude=37.61, created_by=user.id),
+        Place(name="Парк Горького", description="Рядом есть кофейни", latitude=55.73, longitude=37.60, created_by=user.id),
+        Place(name="Библиотека", tags=["кофейня", "книги"], latitude=55.76, longitude=37.62, created_by=user.id),
+        Place(name="Закрытая кофейня", latitude=55.75, longitude=37.61, created_by=user.id, is_public=False),
+        Place(name="Музей", address="Кофейный переулок", latitude=55.70, longitude=37.50, created_by=user.id),
+    ])
+    await db_session.commit()
+
+    # Вес: название > теги > описание > адрес
+    places = await _places(db_session, "кофейня")
+    assert [place["name"] for place in places] == ["Кофейня на углу", "Библиотека", "Парк Горького", "Музей"]
+
+    # Фильтр по радиусу сочетается с полнотекстовым поиском
+    places = await _places(db_session, "кофейня", latitude=55.76, longitude=37.62, radius_km=0.5)
+    assert [place["name"] for place in places] == ["Библиотека"]
+
+def test_search_places_rejects_bad_radius(client):
+    """Радиус проверяется так же, как в GET /places: без него сетка ячеек не ограничена"""
+    for radius in ("0", "-1", "100000"):
+        response = client.get("/api/v1/search/places", params={"q": "кофейня", "lat": 55.7, "lng": 37.6, "radius_km": radius})
+        assert response.status_code == 422
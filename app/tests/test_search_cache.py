@@ -0,0 +1,59 @@
+import json
+import pytest
+from fakeredis import FakeServer, aioredis
+from fastapi import status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user import User
+from services.auth_service import create_access_token
+from services.redis_service import RedisClient, redis_client, encode_payload, decode_payload
+from services.principal_cache import principal_cache, _to_payload
+from services.search_service import serialize_users, _pack_page
+
+def test_payload_compression_threshold():
+    small = b'[{"id":1}]'
+    large = json.dumps([{"username": f"user{i}", "bio": "x" * 50} for i in range(100)]).encode()
+
+    assert encode_payload(small, compress_min_bytes=1024) == b"j" + small
+    encoded = encode_payload(large, compress_min_bytes=1024)
+    assert encoded[:1] == b"z"
+    assert len(encoded) < len(large)
+
+    assert decode_payload(encode_payload(small, 1024)) == small
+    assert decode_payload(encoded) == large
+
+@pytest.mark.asyncio
+async def test_serialized_users_skip_secrets(db_session: AsyncSession):
+    user = User(email="anna@example.com", username="anna", password_hash="hash", oauth_data={"token": "t"})
+    db_session.add(user)
+    await db_session.commit()
+
+    data = json.loads(serialize_users([user]))
+    assert data[0]["username"] == "anna"
+    assert data[0]["id"] == str(user.id)
+    assert "password_hash" not in data[0]
+    assert "oauth_data" not in data[0]
+
+@pytest.mark.asyncio
+async def test_search_hit_served_from_cache(client, db_session: AsyncSession, monkeypatch):
+    """Попадание в кеш отдается готовым JSON без запроса в БД"""
+    # Отдельные клиенты на общем сервере: TestClient работает в своем event loop
+    server = FakeServer()
+    monkeypatch.setattr(redis_client, "client", aioredis.FakeRedis(server=server))
+    writer = RedisClient(client=aioredis.FakeRedis(server=server))
+    user = User(email="me@example.com", username="meuser")
+    db_session.add(user)
+    await db_session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': str(user.id)})}"}
+    # Пользователь берется из кеша, так что запрос вообще не обращается к БД
+    principal_cache.local.set(user.id, _to_payload(user))
+
+    payload = serialize_users([user])
+    params = {"skip": 0, "limit": 50, "current_user_id": str(user.id), "cursor": None}
+    await writer.set_cached_search_payload("users", "anna", params, _pack_page(payload, "next"))
+
+    response = client.get("/api/v1/search/users?q=anna", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == payload
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["X-Next-Cursor"] == "next"
@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from fakeredis import aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.notification import NotificationType
+from models.user import User
+from schemas.notification import NotificationCreate
+from services import notification_service
+from services.redis_service import redis_client
+from services.notification_service import (
+    create_notification,
+    get_unread_count,
+    mark_all_notifications_as_read,
+    mark_notification_as_read,
+    reconcile_unread_counters,
+)
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = aioredis.FakeRedis()
+    monkeypatch.setattr(redis_client, "client", client)
+    return client
+
+def _notification(user: User, title: str) -> NotificationCreate:
+    return NotificationCreate(user_id=user.id, type=NotificationType.SYSTEM, title=title, message="m")
+
+@pytest.mark.asyncio
+async def test_counter_follows_notifications(db_session: AsyncSession, fake_redis):
+    user = User(email="n@example.com", username="nuser")
+    db_session.add(user)
+    await db_session.commit()
+
+    # Непрогретый счетчик не создается инкрементом
+    first = await create_notification(db_session, _notification(user, "first"))
+    assert await redis_client.get_unread_notifications(str(user.id)) is None
+
+    assert await get_unread_count(db_session, user.id) == 1
+    assert await redis_client.get_unread_notifications(str(user.id)) == 1
+
+    await create_notification(db_session, _notification(user, "second"))
+    assert await get_unread_count(db_session, user.id) == 2
+
+    await mark_notification_as_read(db_session, first.id, user.id)
+    await mark_notification_as_read(db_session, first.id, user.id)
+    assert await get_unread_count(db_session, user.id) == 1
+
+    await mark_all_notifications_as_read(db_session, user.id)
+    assert await redis_client.get_unread_notifications(str(user.id)) == 0
+
+    # Счетчик не уходит в минус
+    assert await redis_client.change_unread_notifications(str(user.id), -1) == 0
+
+@pytest.mark.asyncio
+async def test_concurrent_mark_read_decrements_once(db_session: AsyncSession, async_session_maker, fake_redis):
+    """Два одновременных запроса на прочтение одного уведомления уменьшают счетчик один раз"""
+    user = User(email="twice@example.com", username="twice")
+    db_session.add(user)
+    await db_session.commit()
+    first = await create_notification(db_session, _notification(user, "first"))
+    await create_notification(db_session, _notification(user, "second"))
+    assert await get_unread_count(db_session, user.id) == 2
+
+    async def mark_read():
+        async with async_session_maker() as session:
+            return await mark_notification_as_read(session, first.id, user.id)
+
+    results = await asyncio.gather(mark_read(), mark_read())
+    assert all(notification.is_read for notification in results)
+    assert await redis_client.get_unread_notifications(str(user.id)) == 1
+
+@pytest.mark.asyncio
+async def test_reconciliation_fixes_drift(db_session: AsyncSession, fake_redis):
+    users = [User(email=f"u{i}@example.com", username=f"u{i}") for i in range(3)]
+    db_session.add_all(users)
+    await db_session.commit()
+    await create_notification(db_session, _notification(users[0], "n"))
+
+    await redis_client.set_unread_notifications(str(users[0].id), 5, 60)
+    await redis_client.set_unread_notifications(str(users[1].id), 0, 60)
+    await redis_client.set_unread_notifications(str(users[2].id), 2, 60)
+
+    assert await reconcile_unread_counters(db_session) == 2
+    assert await redis_client.get_unread_notifications(str(users[0].id)) == 1
+    assert await redis_client.get_unread_notifications(str(users[1].id)) == 0
+    assert await redis_client.get_unread_notifications(str(users[2].id)) == 0
+    assert await fake_redis.ttl(f"unread:notifications:{users[0].id}") > 0
+
+@pytest.mark.asyncio
+async def test_reconciliation_keeps_concurrent_changes(db_session: AsyncSession, fake_redis, monkeypatch):
+    """Счетчик, изменившийся во время сверки, не перезаписывается устаревшим значением"""
+    user = User(email="race@example.com", username="race")
+    db_session.add(user)
+    await db_session.commit()
+    await redis_client.set_unread_notifications(str(user.id), 5, 60)
+
+    count_unread = notification_service._count_unread
+
+    async def count_with_concurrent_increment(db, user_ids):
+        actual = await count_unread(db, user_ids)
+        # Новое уведомление учтено в Redis уже после подсчета в БД
+        await redis_client.change_unread_notifications(str(user.id), 1)
+        return actual
+
+    monkeypatch.setattr(notification_service, "_count_unread", count_with_concurrent_increment)
+    assert await reconcile_unread_counters(db_session) == 0
+    assert await redis_client.get_unread_notifications(str(user.id)) == 6
+
+    monkeypatch.setattr(notification_service, "_count_unread", count_unread)
+    assert await reconcile_unread_counters(db_session) == 1
+    assert await redis_client.get_unread_notifications(str(user.id)) == 0
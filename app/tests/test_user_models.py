@@ -1,6 +1,11 @@
 import pytest
+from fastapi import HTTPException
+from core.config import settings
 from models.user import User
-from services.auth_service import verify_password, hash_password, generate_salt
+from services import auth_service
+from services.auth_service import (
+    verify_password, hash_password, generate_salt, verify_password_async, hash_password_async
+)
 
 # Тест хеширования паролей
 @pytest.mark.asyncio
@@ -29,4 +34,31 @@ async def test_user_creation():
     assert user.username == "testuser"
     assert user.is_verified is False
     assert user.is_active is True
-    assert user.is_superuser is False
\ No newline at end of file
+    assert user.is_superuser is False
+# Тест хеширования паролей в пуле потоков
+@pytest.mark.asyncio
+async def test_password_hashing_async():
+    password = "TestPassword123"
+    salt = generate_salt()
+    hashed = await hash_password_async(password, salt)
+
+    assert await verify_password_async(password, hashed, salt)
+    assert not await verify_password_async("WrongPassword", hashed, salt)
+
+# При занятом пуле запрос ждет слот не дольше дедлайна и получает 503
+@pytest.mark.asyncio
+async def test_password_hashing_queue_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "PASSWORD_HASH_QUEUE_TIMEOUT", 0.05)
+    slots = auth_service._get_password_slots()
+
+    for _ in range(settings.PASSWORD_HASH_WORKERS):
+        await slots.acquire()
+    try:
+        with pytest.raises(HTTPException) as exc_info:
+            await verify_password_async("password", "hash", "salt")
+    finally:
+        for _ in range(settings.PASSWORD_HASH_WORKERS):
+            slots.release()
+
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == "1"
@@ -0,0 +1,212 @@
+import asyncio
+import pytest
+from datetime import datetime
+from sqlalchemy import select
+from uuid import uuid4
+from fakeredis import FakeServer, aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.websockets import WebSocketDisconnect
+
+from fastapi import status
+
+from core.config import settings
+from models.message import Message
+from models.user import User
+from services.auth_service import create_access_token
+from services.principal_cache import principal_cache, _to_payload
+from services.redis_service import RedisClient, redis_client
+from services.typing_state import TypingState
+from services.websocket_manager import ConnectionManager, manager
+from services.ws_backplane import InMemoryBackplane, RedisBackplane
+
+def chat(sender_id, receiver_id, content):
+    return Message(id=uuid4(), sender_id=sender_id, receiver_id=receiver_id, content=content, created_at=datetime.now())
+
+class FakeWebSocket:
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.closed_with = None
+        # Медленный клиент: отправка не завершается, пока не откроем
+        self.unblocked = asyncio.Event()
+        if not blocked:
+            self.unblocked.set()
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        await self.unblocked.wait()
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+@pytest.mark.asyncio
+async def test_delivery_across_workers():
+    """Отправитель и получатель подключены к разным воркерам с общим backplane"""
+    backplane = InMemoryBackplane()
+    worker_a, worker_b = ConnectionManager(backplane), ConnectionManager(backplane)
+    alice, bob = uuid4(), uuid4()
+    alice_socket, bob_socket = FakeWebSocket(), FakeWebSocket()
+    await worker_a.connect(alice_socket, alice)
+    bob_connection = await worker_b.connect(bob_socket, bob)
+
+    await worker_a.send_personal_message(chat(alice, bob, "привет"))
+    await worker_a.broadcast_typing(bob, alice, True)
+    worker_b.typing.flush()
+    await asyncio.sleep(0)
+
+    assert [frame["type"] for frame in bob_socket.sent] == ["chat_message", "typing"]
+    assert bob_socket.sent[0]["message"] == "привет"
+    assert bob_socket.sent[0]["sender_id"] == str(alice)
+    assert bob_socket.sent[1] == {"type": "typing", "typing_users": [str(alice)]}
+    assert alice_socket.sent == []
+
+    await worker_b.disconnect(bob_connection)
+    await worker_a.send_personal_message(chat(alice, bob, "ты тут?"))
+    await asyncio.sleep(0)
+    assert len(bob_socket.sent) == 2
+    assert bob not in worker_b.active_connections
+
+@pytest.mark.asyncio
+async def test_multiple_devices_and_slow_consumer(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", 4)
+    worker = ConnectionManager(InMemoryBackplane())
+    alice, bob = uuid4(), uuid4()
+    phone, laptop = FakeWebSocket(blocked=True), FakeWebSocket()
+    phone_connection = await worker.connect(phone, bob)
+    await worker.connect(laptop, bob)
+
+    # Писатель телефона забрал первый кадр и завис на его отправке
+    await worker.send_personal_message(chat(alice, bob, "m0"))
+    await asyncio.sleep(0)
+    for i in range(1, 3):
+        await worker.send_personal_message(chat(alice, bob, f"m{i}"))
+    # Очереди заполнены наполовину: typing уже отбрасываются
+    await worker.broadcast_typing(bob, alice, True)
+    worker.typing.flush()
+    await worker.send_personal_message(chat(alice, bob, "m3"))
+    await worker.send_personal_message(chat(alice, bob, "m4"))
+    await asyncio.sleep(0)
+
+    assert not phone_connection.closed
+    assert [frame["message"] for frame in laptop.sent] == ["m0", "m1", "m2", "m3", "m4"]
+
+    # Переполнение очереди сообщениями - клиент не справляется, отключаем
+    await worker.send_personal_message(chat(alice, bob, "m5"))
+    await asyncio.sleep(0)
+    assert phone_connection.closed
+    assert phone.closed_with == status.WS_1013_TRY_AGAIN_LATER
+    assert len(laptop.sent) == 6
+
+    await worker.disconnect(phone_connection)
+    assert len(worker.active_connections[bob]) == 1
+
+    # Задача закрытия сокета удерживается менеджером до завершения
+    await worker.close()
+    assert not worker._closing_tasks
+
+@pytest.mark.asyncio
+async def test_typing_is_coalesced_and_expires():
+    now = [0.0]
+    frames = []
+    typing = TypingState(ttl=6, flush_interval=0.25, send=lambda receiver, frame: frames.append((receiver, frame)), clock=lambda: now[0])
+    bob, alice, carol = uuid4(), uuid4(), uuid4()
+
+    # Поток событий по клавишам между отправками дает один кадр
+    for _ in range(20):
+        typing.update(bob, alice, True)
+    typing.update(bob, carol, True)
+    typing.update(bob, carol, False)
+    typing.flush()
+    assert frames == [(bob, {"type": "typing", "typing_users": [str(alice)]})]
+
+    # Без изменений кадров нет, а отметка без is_typing=false истекает
+    now[0] = 5
+    typing.update(bob, alice, True)
+    typing.flush()
+    assert len(frames) == 1
+    now[0] = 10.5
+    typing.flush()
+    assert len(frames) == 1
+    now[0] = 11
+    typing.flush()
+    assert frames[-1] == (bob, {"type": "typing", "typing_users": []})
+    assert typing.typing_users(bob) == set()
+    typing.close()
+
+@pytest.mark.asyncio
+async def test_repeated_typing_is_published_once():
+    backplane = InMemoryBackplane()
+    worker = ConnectionManager(backplane)
+    bob, alice = uuid4(), uuid4()
+    published = []
+
+    async def record(user_id, event):
+        published.append(event)
+
+    await backplane.subscribe(bob, record)
+    for _ in range(10):
+        await worker.broadcast_typing(bob, alice, True)
+    await worker.broadcast_typing(bob, alice, False)
+    assert [event["is_typing"] for event in published] == [True, False]
+
+@pytest.mark.asyncio
+async def test_redis_backplane_routes_by_user_channel():
+    server = FakeServer()
+    publisher = RedisBackplane(RedisClient(client=aioredis.FakeRedis(server=server)))
+    subscriber = RedisBackplane(RedisClient(client=aioredis.FakeRedis(server=server)))
+    bob, carol = uuid4(), uuid4()
+    received = asyncio.Queue()
+
+    async def handler(user_id, event):
+        await received.put((user_id, event))
+
+    await subscriber.subscribe(bob, handler)
+    await publisher.publish(carol, {"type": "chat_message", "message": "не тебе"})
+    await publisher.publish(bob, {"type": "chat_message", "message": "тебе"})
+
+    user_id, event = await asyncio.wait_for(received.get(), timeout=5)
+    assert user_id == bob
+    assert event["message"] == "тебе"
+    assert received.empty()
+
+    await subscriber.close()
+    await publisher.close()
+
+@pytest.mark.asyncio
+async def test_websocket_endpoint(client, db_session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(manager, "backplane", InMemoryBackplane())
+    monkeypatch.setattr(redis_client, "client", aioredis.FakeRedis())
+    alice = User(email="alice@example.com", username="alice")
+    bob = User(email="bob@example.com", username="bob")
+    db_session.add_all([alice, bob])
+    await db_session.commit()
+    # Пользователи берутся из кеша, так что сокеты не обращаются к БД
+    for user in (alice, bob):
+        principal_cache.local.set(user.id, _to_payload(user))
+
+    def url(user):
+        return f"/api/v1/ws/ws?token={create_access_token(data={'sub': str(user.id)})}"
+
+    with client.websocket_connect(url(bob)) as bob_socket, client.websocket_connect(url(alice)) as alice_socket:
+        alice_socket.send_json({"type": "chat_message", "receiver_id": str(bob.id), "message": "привет", "client_id": "c1"})
+        ack = alice_socket.receive_json()
+        assert ack["type"] == "ack"
+        assert ack["client_id"] == "c1"
+        frame = bob_socket.receive_json()
+        assert frame["type"] == "chat_message"
+        assert frame["id"] == ack["id"]
+        assert frame["message"] == "привет"
+        assert frame["sender_id"] == str(alice.id)
+
+        alice_socket.send_json({"type": "typing", "receiver_id": "not-a-uuid", "is_typing": True})
+        assert alice_socket.receive_json()["type"] == "error"
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/v1/ws/ws?token=broken") as socket:
+            socket.receive_json()
+
+    # Сообщение из сокета сохранено в истории переписки
+    stored = (await db_session.execute(select(Message))).scalars().all()
+    assert [(str(message.id), message.content) for message in stored] == [(ack["id"], "привет")]